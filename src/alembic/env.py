@@ -9,7 +9,7 @@ from sqlalchemy.ext.asyncio import async_engine_from_config
 from alembic import context
 
 from book_management import Base
-from book_management.models import Author, Book
+from book_management.models import Author, Book, ExportJob, ImportJob
 from auth.models import User
 
 
@@ -0,0 +1,28 @@
+"""Add export job compression
+
+Revision ID: 1f6d8a2b4e07
+Revises: 9b3e5f7a2c18
+Create Date: 2026-10-18 22:15:37.902114
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "1f6d8a2b4e07"
+down_revision: Union[str, None] = "9b3e5f7a2c18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("export_jobs", sa.Column("compression", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("export_jobs", "compression")
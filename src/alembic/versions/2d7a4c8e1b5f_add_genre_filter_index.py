@@ -0,0 +1,36 @@
+"""Add genre filter index
+
+Revision ID: 2d7a4c8e1b5f
+Revises: 9b3e6d1f4a28
+Create Date: 2026-10-18 15:21:07.418265
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "2d7a4c8e1b5f"
+down_revision: Union[str, None] = "9b3e6d1f4a28"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # genre alone or with a year range; the author filters use `ix_books_author_id_id`
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_books_genre_published_year_id")
+        op.create_index(
+            "ix_books_genre_published_year_id",
+            "books",
+            ["genre", "published_year", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_books_genre_published_year_id", table_name="books", postgresql_concurrently=True)
@@ -0,0 +1,49 @@
+"""Add import jobs
+
+Revision ID: 4c8f2e6a1d93
+Revises: 7e5b1c3d9a64
+Create Date: 2026-10-18 19:06:44.180352
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "4c8f2e6a1d93"
+down_revision: Union[str, None] = "7e5b1c3d9a64"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "import_jobs",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("status", sa.String(), server_default="queued", nullable=False),
+        sa.Column("filename", sa.String(), nullable=False),
+        sa.Column("total_items", sa.Integer(), nullable=True),
+        sa.Column("successful", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("failed", sa.Integer(), server_default="0", nullable=False),
+        sa.Column(
+            "failed_info",
+            postgresql.JSONB(astext_type=sa.Text()),
+            server_default=sa.text("'[]'::jsonb"),
+            nullable=False,
+        ),
+        sa.Column("chunks_total", sa.Integer(), nullable=True),
+        sa.Column("chunks_applied", postgresql.ARRAY(sa.Integer()), server_default="{}", nullable=False),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("import_jobs")
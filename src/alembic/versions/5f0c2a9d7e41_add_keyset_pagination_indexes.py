@@ -0,0 +1,31 @@
+"""Add keyset pagination indexes
+
+Revision ID: 5f0c2a9d7e41
+Revises: c178f2f678d8
+Create Date: 2026-10-18 10:12:31.204117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5f0c2a9d7e41"
+down_revision: Union[str, None] = "c178f2f678d8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_books_title_id", "books", ["title", "id"], unique=False)
+    op.create_index("ix_books_published_year_id", "books", ["published_year", "id"], unique=False)
+    # the author sort walks `authors.name` (already unique-indexed) and then each author's books by id
+    op.create_index("ix_books_author_id_id", "books", ["author_id", "id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_books_author_id_id", table_name="books")
+    op.drop_index("ix_books_published_year_id", table_name="books")
+    op.drop_index("ix_books_title_id", table_name="books")
@@ -0,0 +1,29 @@
+"""Add book version
+
+Revision ID: 7e5b1c3d9a64
+Revises: 2d7a4c8e1b5f
+Create Date: 2026-10-18 17:42:19.305118
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7e5b1c3d9a64"
+down_revision: Union[str, None] = "2d7a4c8e1b5f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # a constant default, so existing rows are not rewritten
+    op.add_column("books", sa.Column("version", sa.Integer(), server_default="1", nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("books", "version")
@@ -0,0 +1,43 @@
+"""Add search indexes
+
+Revision ID: 9b3e6d1f4a28
+Revises: 5f0c2a9d7e41
+Create Date: 2026-10-18 14:03:52.771940
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9b3e6d1f4a28"
+down_revision: Union[str, None] = "5f0c2a9d7e41"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (name, table, method and expression), see `BooksRepository.search`
+indexes = [
+    ("ix_books_title_tsv", "books", "gin (to_tsvector('simple', title))"),
+    ("ix_authors_name_tsv", "authors", "gin (to_tsvector('simple', name))"),
+    ("ix_books_title_trgm", "books", "gin (title gin_trgm_ops)"),
+    ("ix_authors_name_trgm", "authors", "gin (name gin_trgm_ops)"),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # CONCURRENTLY keeps the tables writable while the indexes build, but cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, definition in indexes:
+            # an interrupted concurrent build leaves an invalid index behind, drop it before retrying
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            op.execute(f"CREATE INDEX CONCURRENTLY {name} ON {table} USING {definition}")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(indexes):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    # the extension is left installed, other objects may depend on it
@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Annotated
 
@@ -6,7 +8,9 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
-from auth.schemas import TokenData
+from auth.schemas import TokenData, UserResponse
+from cache import TwoTierCache
+from exceptions import ServiceUnavailableError
 from repositories.base import AbstractUnitOfWork
 from config import settings
 
@@ -14,12 +18,53 @@ from config import settings
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
+# resolved principals by token subject (username), so authenticated requests do not all query `users`
+principal_cache = TwoTierCache(
+    "principals",
+    local_ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    redis_ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    max_size=settings.PRINCIPAL_CACHE_MAX_SIZE,
+)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+class PasswordHasher:
+    """Runs bcrypt (~250 ms of CPU per call) in a dedicated thread pool instead of on the event loop.
+
+    bcrypt releases the GIL, so `workers` threads hash in parallel. At most `queue_limit` calls may be running or
+    waiting at a time, beyond that `ServiceUnavailableError` (503) is raised instead of letting a login storm queue
+    up unbounded latency.
+    """
+
+    def __init__(self, workers: int, queue_limit: int) -> None:
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hasher")
+        self._pending = 0
+
+    async def _run(self, function, *args):
+        if self._pending >= self.queue_limit:
+            raise ServiceUnavailableError("Too many concurrent authentication requests, retry later.")
+
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+        finally:
+            self._pending -= 1
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+
+password_hasher = PasswordHasher(workers=settings.PASSWORD_HASH_WORKERS, queue_limit=settings.PASSWORD_HASH_QUEUE_LIMIT)
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -30,6 +75,16 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+def get_token_subject(authorization: str | None) -> str | None:
+    """Subject of a valid bearer token in an `Authorization` header, without looking the user up"""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
 async def get_active_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
     uow: AbstractUnitOfWork,
@@ -48,12 +103,15 @@ async def get_active_current_user(
     except JWTError:
         raise credentials_exception
     
-    async with uow:
-        user = await uow.users.retrieve_by_username(token_data.username)
-        if user is None:
-            raise credentials_exception
-        
-        if not user.is_active:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Account is inactive")
-        
-        return user
\ No newline at end of file
+    async def load_principal():
+        async with uow:
+            user = await uow.users.retrieve_by_username(token_data.username)
+            if user is None:
+                raise credentials_exception
+            return UserResponse.model_validate(user).model_dump(mode="json")
+
+    user = UserResponse.model_validate(await principal_cache.get_or_load(token_data.username, load_principal))
+    if not user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Account is inactive")
+
+    return user
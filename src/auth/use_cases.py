@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta, timezone
 from typing import Any
 
-from auth.services import create_access_token, get_password_hash, verify_password
+from auth.services import create_access_token, password_hasher, principal_cache
 from config import settings
 from exceptions import DoesNotExistError, InvalidUserStateError, ValidationError
 from repositories.base import AbstractUnitOfWork
@@ -14,47 +14,80 @@ class BaseAuthUseCase:
 
 class RegisterUserUseCase(BaseAuthUseCase):
     async def __call__(self, user_data: dict) -> dict:
-        async with self.uow:
-            existing_user = await self.uow.users.retrieve_by_username(user_data["username"])
-            if existing_user:
-                raise ValidationError("username", "Username already exists")
-
-            existing_email = await self.uow.users.retrieve_by_email(user_data["email"])
-            if existing_email:
-                raise ValidationError("email", "Email already exists")
-
-            hashed_password = get_password_hash(user_data["password"])
-            user = await self.uow.users.create(
-                {
-                    "username": user_data["username"],
-                    "email": user_data["email"],
-                    "hashed_password": hashed_password,
-                    "is_active": True,
-                }
-            )
-            return {
-                "id": user.id,
-                "username": user.username,
-                "email": user.email,
-                "is_active": user.is_active,
-                "created_at": user.created_at,
-                "last_login": user.last_login,
-            }
+        # hashed before the unit of work, no connection is held while bcrypt runs
+        hashed_password = await password_hasher.hash(user_data["password"])
+        try:
+            async with self.uow:
+                await self._check_unique(user_data)
+                user = await self.uow.users.create(
+                    {
+                        "username": user_data["username"],
+                        "email": user_data["email"],
+                        "hashed_password": hashed_password,
+                        "is_active": True,
+                    }
+                )
+        except self.uow.conflict_errors:
+            # registered concurrently between the check and the insert, reported as if the check had seen it
+            async with self.uow:
+                await self._check_unique(user_data)
+            raise
+
+        return {
+            "id": user.id,
+            "username": user.username,
+            "email": user.email,
+            "is_active": user.is_active,
+            "created_at": user.created_at,
+            "last_login": user.last_login,
+        }
+
+    async def _check_unique(self, user_data: dict) -> None:
+        existing_user = await self.uow.users.retrieve_by_username(user_data["username"])
+        if existing_user:
+            raise ValidationError("username", "Username already exists")
+
+        existing_email = await self.uow.users.retrieve_by_email(user_data["email"])
+        if existing_email:
+            raise ValidationError("email", "Email already exists")
 
 
 class AuthenticateUserUseCase(BaseAuthUseCase):
     async def __call__(self, username: str, password: str) -> dict[str, Any]:
         async with self.uow:
             user = await self.uow.users.retrieve_by_username(username)
-            if not user or not verify_password(password, user.hashed_password):
-                raise DoesNotExistError("Incorrect username or password")
 
-            if not user.is_active:
-                raise InvalidUserStateError()
+        # no connection is held while bcrypt runs, or a login storm would also starve the pool of other requests
+        if not user or not await password_hasher.verify(password, user.hashed_password):
+            raise DoesNotExistError("Incorrect username or password")
 
-            access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-            access_token = create_access_token(data={"sub": user.username}, expires_delta=access_token_expires)
+        if not user.is_active:
+            raise InvalidUserStateError()
 
+        access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        access_token = create_access_token(data={"sub": user.username}, expires_delta=access_token_expires)
+
+        async with self.uow:
             await self.uow.users.update(user.id, {"last_login": datetime.now(timezone.utc)})
 
-            return {"access_token": access_token, "token_type": "bearer"}
+        # evicted after commit, so a concurrent request cannot cache the row from before the update
+        await principal_cache.invalidate(username)
+        return {"access_token": access_token, "token_type": "bearer"}
+
+
+class DeactivateUserUseCase(BaseAuthUseCase):
+    """Deactivates a user with immediate effect, also on the requests of tokens already issued.
+
+    There are no admin users to expose it to yet, so it is for scripts and consoles; deactivating a user any other
+    way takes up to `PRINCIPAL_CACHE_TTL_SECONDS` to apply.
+    """
+
+    async def __call__(self, username: str) -> None:
+        async with self.uow:
+            user = await self.uow.users.retrieve_by_username(username)
+            if not user:
+                raise DoesNotExistError()
+
+            await self.uow.users.update(user.id, {"is_active": False})
+
+        await principal_cache.invalidate(username)
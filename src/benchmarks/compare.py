@@ -0,0 +1,67 @@
+"""Compare two `benchmarks.use_cases` result files, e.g. from the base branch and from a change.
+
+Operations whose statistic (p50 by default) got slower by more than --threshold are reported as regressions and
+make the command exit with status 1:
+
+    PYTHONPATH=src python -m benchmarks.compare base.json head.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+
+
+def _load(path: str) -> tuple[dict, dict[tuple, dict]]:
+    with open(path) as file:
+        report = json.load(file)
+    results = {(result["backend"], result["size"], result["operation"]): result for result in report["results"]}
+    return report["metadata"], results
+
+
+def compare(base: dict[tuple, dict], head: dict[tuple, dict], statistic: str, threshold: float) -> list[dict]:
+    rows = []
+    for key in sorted(base.keys() & head.keys()):
+        before, after = base[key][statistic], head[key][statistic]
+        change = (after - before) / before if before else 0.0
+        rows.append(
+            {
+                "backend": key[0],
+                "size": key[1],
+                "operation": key[2],
+                "base": before,
+                "head": after,
+                "change": change,
+                "regression": change > threshold,
+            }
+        )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--statistic", default="p50_ms", choices=["mean_ms", "p50_ms", "p95_ms", "max_ms"])
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    base_metadata, base = _load(args.base)
+    head_metadata, head = _load(args.head)
+    print(f"base {base_metadata.get('commit')} -> head {head_metadata.get('commit')}, {args.statistic}")
+    for key in sorted(base.keys() ^ head.keys()):
+        print(f"  only in {'base' if key in base else 'head'}: {' '.join(map(str, key))}")
+
+    rows = compare(base, head, args.statistic, args.threshold)
+    for row in rows:
+        marker = "REGRESSION" if row["regression"] else ""
+        print(
+            f"{row['backend']:<9} {row['size']:>8} {row['operation']:<44} "
+            f"{row['base']:>10.3f} {row['head']:>10.3f} {row['change']:>+8.1%} {marker}"
+        )
+
+    regressions = [row for row in rows if row["regression"]]
+    print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import random
+
+from book_management.models import Genre
+
+_WORDS = (
+    "shadow river empire silent garden winter machine quantum dragon ocean history secret city war light "
+    "stone forest crown journey theory island fire letters night storm kingdom glass mountain memory star "
+    "atlas signal harbor iron paper wolf summer echo frontier orbit cipher legacy"
+).split()
+_NAMES = "Ada Boris Clara Dmytro Elena Farid Greta Hiro Ines Jonas Kira Liam Mira Nils Olena Pavel".split()
+_SURNAMES = "Adams Brandt Costa Dubois Evans Fischer Garcia Horvat Ivanova Jensen Kowalski Larsen Moreau".split()
+
+
+def generate_books(count: int, seed: int = 0, authors: int | None = None) -> list[dict]:
+    """Deterministic synthetic catalog in the shape `BookCreateSchema` accepts"""
+    rng = random.Random(seed)
+    authors = authors or max(1, count // 20)
+    author_names = [f"{rng.choice(_NAMES)} {rng.choice(_SURNAMES)} {index}" for index in range(authors)]
+    genres = [genre.value for genre in Genre]
+    return [
+        {
+            "title": " ".join(rng.sample(_WORDS, rng.randint(2, 4))).title(),
+            "author_name": rng.choice(author_names),
+            "genre": rng.choice(genres),
+            "published_year": rng.randint(1800, 2024),
+        }
+        for _ in range(count)
+    ]
@@ -0,0 +1,235 @@
+"""Load test of the full application stack: rate limiter, authentication, use cases and response validation.
+
+Virtual users run a weighted mix of requests concurrently for --duration seconds, each with its own account
+and `X-Forwarded-For` address (the rate limiter counts per address and path, as it would for real clients).
+In-process by default, through the app's own lifespan, so DATABASE_URL and REDIS_URL must be set; with
+--base-url it drives a running server instead. Reports throughput, p50/p95/p99 and error rates per route and
+exits with status 1 when a --budget or --max-error-rate is exceeded:
+
+    PYTHONPATH=src python -m benchmarks.load_test --users 20 --duration 30 \\
+        --mix list=50 get=30 create=10 recommend=8 export=2 --budget list:p95=50 get:p99=100
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import random
+import sys
+import time
+import uuid
+from typing import Any
+
+import numpy as np
+from httpx import ASGITransport, AsyncClient
+
+from benchmarks.data import generate_books
+
+_SORTS = ["title:asc", "title:desc", "published_year:asc", "published_year:desc", "author:asc"]
+
+
+class VirtualUser:
+    """One client: an account, a token and a source address of its own"""
+
+    def __init__(self, client: AsyncClient, index: int, book_ids: list[int], rng: random.Random) -> None:
+        self.client = client
+        self.book_ids = book_ids
+        self.rng = rng
+        self.username = f"load-{uuid.uuid4().hex[:12]}"
+        self.headers = {"X-Forwarded-For": f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"}
+
+    async def sign_in(self) -> None:
+        password = "password123"
+        user_data = {"username": self.username, "email": f"{self.username}@example.com", "password": password}
+        response = await self.client.post("/auth/register", json=user_data, headers=self.headers)
+        response.raise_for_status()
+        response = await self.client.post(
+            "/auth/token", data={"username": self.username, "password": password}, headers=self.headers
+        )
+        response.raise_for_status()
+        self.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+    # one method per scenario, reported under its `_ROUTES` label
+    async def list(self):
+        params = {"page": self.rng.randint(1, 5), "per_page": 20, "sort_by": self.rng.choice(_SORTS)}
+        return await self.client.get("/books/", params=params, headers=self.headers)
+
+    async def get(self):
+        return await self.client.get(f"/books/{self.rng.choice(self.book_ids)}", headers=self.headers)
+
+    async def create(self):
+        book_data = generate_books(1, seed=self.rng.randrange(2**32))[0]
+        response = await self.client.post("/books/", json=book_data, headers=self.headers)
+        if response.status_code == 200:
+            self.book_ids.append(response.json()["id"])
+        return response
+
+    async def recommend(self):
+        book_id = self.rng.choice(self.book_ids)
+        return await self.client.get(f"/books/recommendations/{book_id}", params={"limit": 5}, headers=self.headers)
+
+    async def export(self):
+        # the whole body is read, an export is only done once it has been streamed
+        return await self.client.get("/books/export", params={"format": "csv"}, headers=self.headers)
+
+
+_ROUTES = {
+    "list": "GET /books/",
+    "get": "GET /books/{book_id}",
+    "create": "POST /books/",
+    "recommend": "GET /books/recommendations/{book_id}",
+    "export": "GET /books/export",
+}
+
+
+async def _seed(client: AsyncClient, user: VirtualUser, books: int) -> list[int]:
+    """Imports `books` generated books when the catalog is smaller, returns the ids of (up to 1000) books"""
+    response = await client.get("/books/", params={"per_page": 1, "count": "exact"}, headers=user.headers)
+    response.raise_for_status()
+    missing = books - response.json()["total"]
+    if missing > 0:
+        payload = json.dumps(generate_books(missing, seed=missing))
+        files = {"file": ("books.json", payload, "application/json")}
+        response = await client.post("/books/bulk-import", files=files, headers=user.headers, timeout=None)
+        response.raise_for_status()
+
+    response = await client.get("/books/", params={"per_page": 1000, "sort_by": "title:asc"}, headers=user.headers)
+    response.raise_for_status()
+    return [book["id"] for book in response.json()]
+
+
+async def _run_user(user: VirtualUser, mix: dict[str, int], deadline: float, samples: dict[str, list]) -> None:
+    scenarios, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        scenario = user.rng.choices(scenarios, weights)[0]
+        started = time.perf_counter()
+        try:
+            status = (await getattr(user, scenario)()).status_code
+        except Exception as error:  # transport errors count as failed requests
+            status = type(error).__name__
+        samples.setdefault(_ROUTES[scenario], []).append(((time.perf_counter() - started) * 1000, status))
+
+
+def _report(samples: dict[str, list], duration: float) -> dict[str, dict[str, Any]]:
+    report = {}
+    for route, route_samples in sorted(samples.items()):
+        latencies = np.asarray([latency for latency, _ in route_samples])
+        statuses = {}
+        for _, status in route_samples:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        errors = sum(count for status, count in statuses.items() if not (status.isdigit() and int(status) < 400))
+        report[route] = {
+            "requests": len(route_samples),
+            "throughput_rps": len(route_samples) / duration,
+            "error_rate": errors / len(route_samples),
+            "statuses": statuses,
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "max_ms": float(latencies.max()),
+        }
+    return report
+
+
+def _check(report: dict[str, dict], budgets: list[tuple[str, str, float]], max_error_rate: float) -> list[str]:
+    violations = []
+    for scenario, percentile, limit_ms in budgets:
+        route = report.get(_ROUTES[scenario])
+        if route is None:
+            violations.append(f"{scenario}: no requests were made")
+        elif route[f"{percentile}_ms"] > limit_ms:
+            violations.append(f"{scenario}: {percentile} {route[f'{percentile}_ms']:.1f} ms > {limit_ms:g} ms")
+    for route, stats in report.items():
+        if stats["error_rate"] > max_error_rate:
+            violations.append(f"{route}: error rate {stats['error_rate']:.2%} > {max_error_rate:.2%}")
+    return violations
+
+
+def _parse_mix(values: list[str]) -> dict[str, int]:
+    mix = {}
+    for value in values:
+        scenario, _, weight = value.partition("=")
+        if scenario not in _ROUTES or not weight.isdigit():
+            raise argparse.ArgumentTypeError(f"Invalid mix entry '{value}', use <{'|'.join(_ROUTES)}>=<weight>")
+        mix[scenario] = int(weight)
+    return mix
+
+
+def _parse_budget(value: str) -> tuple[str, str, float]:
+    try:
+        scenario, rest = value.split(":")
+        percentile, limit_ms = rest.split("=")
+        if scenario not in _ROUTES or percentile not in ("p50", "p95", "p99", "max"):
+            raise ValueError
+        return scenario, percentile, float(limit_ms)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid budget '{value}', use <scenario>:<p50|p95|p99|max>=<ms>")
+
+
+@contextlib.asynccontextmanager
+async def _client(base_url: str | None):
+    if base_url:
+        async with AsyncClient(base_url=base_url, timeout=60) as client:
+            yield client
+        return
+
+    from main import application
+
+    # the lifespan connects the rate limiter and the caches to Redis, as when served
+    async with application.router.lifespan_context(application):
+        async with AsyncClient(
+            transport=ASGITransport(app=application), base_url="http://load-test", timeout=60
+        ) as client:
+            yield client
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="drive a running server instead of the in-process app")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--books", type=int, default=10_000, help="catalog size to seed up to")
+    parser.add_argument("--mix", nargs="+", default=["list=50", "get=30", "create=10", "recommend=8", "export=2"])
+    parser.add_argument("--budget", nargs="*", type=_parse_budget, default=[])
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+    try:
+        mix = _parse_mix(args.mix)
+    except argparse.ArgumentTypeError as error:
+        parser.error(str(error))
+
+    rng = random.Random(args.seed)
+    async with _client(args.base_url) as client:
+        book_ids = []
+        users = [VirtualUser(client, index, book_ids, random.Random(rng.random())) for index in range(args.users)]
+        await asyncio.gather(*(user.sign_in() for user in users))
+        book_ids.extend(await _seed(client, users[0], args.books))
+
+        samples = {}
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(_run_user(user, mix, deadline, samples) for user in users))
+        duration = time.perf_counter() - started
+
+    report = _report(samples, duration)
+    total = sum(stats["requests"] for stats in report.values())
+    print(f"{total} requests in {duration:.1f}s ({total / duration:.1f} req/s), {args.users} users")
+    print(f"{'route':<40} {'requests':>8} {'req/s':>8} {'errors':>7} {'p50':>9} {'p95':>9} {'p99':>9}  statuses")
+    for route, stats in report.items():
+        print(
+            f"{route:<40} {stats['requests']:>8} {stats['throughput_rps']:>8.1f} {stats['error_rate']:>7.1%} "
+            f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}  {stats['statuses']}"
+        )
+
+    violations = _check(report, args.budget, args.max_error_rate)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"duration_s": duration, "users": args.users, "routes": report, "violations": violations}, file)
+    for violation in violations:
+        print(f"BUDGET EXCEEDED {violation}")
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
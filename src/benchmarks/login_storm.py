@@ -0,0 +1,124 @@
+"""Latency of `GET /books/` while a storm of logins runs on the same worker.
+
+Runs the app in-process against DATABASE_URL (tables are created if missing), once with bcrypt called inline on
+the event loop, as before, and once through the bounded `password_hasher` pool:
+
+    DATABASE_URL=postgresql+asyncpg://... PYTHONPATH=src python -m benchmarks.login_storm --logins 200
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import numpy as np
+from fastapi_limiter.depends import RateLimiter
+from httpx import ASGITransport, AsyncClient
+
+from auth.services import password_hasher
+from book_management import Base
+from dependencies import engine
+from exceptions import ServiceUnavailableError
+from main import application
+
+
+async def _probe_latencies(client: AsyncClient, stop: asyncio.Event, interval: float) -> list[float]:
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/books/?per_page=20")
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def _login_storm(client: AsyncClient, username: str, password: str, logins: int, concurrency: int) -> dict:
+    statuses = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login():
+        async with semaphore:
+            response = await client.post("/auth/token", data={"username": username, "password": password})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    await asyncio.gather(*(login() for _ in range(logins)))
+    return statuses
+
+
+async def _run(client: AsyncClient, args: argparse.Namespace, username: str, password: str) -> dict:
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe_latencies(client, stop, args.probe_interval))
+
+    started = time.perf_counter()
+    statuses = await _login_storm(client, username, password, args.logins, args.concurrency)
+    storm_seconds = time.perf_counter() - started
+    stop.set()
+
+    latencies = await probe
+    return {
+        "logins_per_second": args.logins / storm_seconds,
+        "statuses": statuses,
+        "probe_requests": len(latencies),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "max_ms": float(max(latencies)),
+    }
+
+
+def _inline_hasher():
+    """Bypasses the pool, reproducing the old blocking behaviour"""
+
+    async def run(function, *args):
+        if password_hasher._pending >= password_hasher.queue_limit:
+            raise ServiceUnavailableError()
+        return function(*args)
+
+    return run
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--probe-interval", type=float, default=0.01)
+    parser.add_argument("--idle-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+    # the app-wide rate limiter would throttle the storm itself
+    for dependency in application.router.dependencies:
+        if isinstance(dependency.dependency, RateLimiter):
+            application.dependency_overrides[dependency.dependency] = lambda: None
+    async with AsyncClient(transport=ASGITransport(app=application), base_url="http://benchmark") as client:
+        username, password = f"storm-{uuid.uuid4().hex[:8]}", "password123"
+        response = await client.post(
+            "/auth/register", json={"username": username, "email": f"{username}@example.com", "password": password}
+        )
+        response.raise_for_status()
+
+        # idle latency, no logins in flight
+        stop = asyncio.Event()
+        probe = asyncio.create_task(_probe_latencies(client, stop, args.probe_interval))
+        await asyncio.sleep(args.idle_seconds)
+        stop.set()
+        idle = await probe
+        print(f"idle GET /books/: p50 {np.percentile(idle, 50):.1f} ms, p99 {np.percentile(idle, 99):.1f} ms")
+
+        pooled_run = password_hasher._run
+        for mode in ("inline", "pool"):
+            password_hasher._run = _inline_hasher() if mode == "inline" else pooled_run
+            result = await _run(client, args, username, password)
+            print(
+                f"{mode:>6}: {result['logins_per_second']:.1f} logins/s {result['statuses']}, "
+                f"GET /books/ during storm p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms, "
+                f"max {result['max_ms']:.1f} ms over {result['probe_requests']} requests"
+            )
+        password_hasher._run = pooled_run
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+"""Recall and latency of the LSH recommendation backend against exact cosine similarity.
+
+Recall@k counts a returned book as a hit when it scores at least as high as the k-th exact result,
+so ties in the exact ranking do not count against the approximation.
+
+Latency is that of `RecommendationService.recommend`, scoring included, and is reported next to recall for both
+backends: an LSH setting is only worth it if it beats exact scoring at the recall it reaches.
+
+    PYTHONPATH=src python -m benchmarks.recommendation_recall --books 1000000 --tables 8 16 --bits 12 16
+"""
+import argparse
+import itertools
+import json
+import random
+import time
+
+import numpy as np
+
+from benchmarks.recommendations import build_service
+from book_management.services.recommendation_backends import ExactBackend, RandomProjectionLSH
+
+
+def _measure(service, book_ids: list[int], limit: int) -> tuple[dict[int, list[int]], np.ndarray]:
+    results, latencies = {}, []
+    for book_id in book_ids:
+        started = time.perf_counter()
+        results[book_id] = service.recommend(book_id, limit)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return results, np.asarray(latencies)
+
+
+def _recall(service, exact: dict[int, list[int]], approximate: dict[int, list[int]]) -> float:
+    hits = total = 0
+    for book_id, exact_ids in exact.items():
+        if not exact_ids:
+            continue
+        query = service._vector(service._rows[book_id])
+        exact_scores = (service._vectors(np.asarray(sorted(service._rows[i] for i in exact_ids))) @ query.T).toarray()
+        threshold = exact_scores.min() - 1e-6
+        found_rows = np.asarray(sorted(service._rows[i] for i in approximate[book_id]), dtype=np.int64)
+        if len(found_rows):
+            found_scores = (service._vectors(found_rows) @ query.T).toarray().ravel()
+            hits += int((found_scores >= threshold).sum())
+        total += len(exact_ids)
+    return hits / total if total else 1.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--tables", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--bits", type=int, nargs="+", default=[12, 16, 20])
+    parser.add_argument("--probe-radius", type=int, nargs="+", default=[0, 1])
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    service = build_service(args.books)
+    print(f"index of {len(service)} books built in {time.perf_counter() - started:.1f}s")
+
+    book_ids = random.Random(0).sample(range(1, args.books + 1), min(args.queries, args.books))
+    exact, latencies = _measure(service, book_ids, args.limit)
+    rows = [
+        {
+            "backend": "exact",
+            "recall": 1.0,
+            "p50_ms": np.percentile(latencies, 50),
+            "p99_ms": np.percentile(latencies, 99),
+        }
+    ]
+
+    for tables, bits, probe_radius in itertools.product(args.tables, args.bits, args.probe_radius):
+        started = time.perf_counter()
+        service.set_backend(RandomProjectionLSH(tables=tables, bits=bits, probe_radius=probe_radius))
+        build_seconds = time.perf_counter() - started
+
+        approximate, latencies = _measure(service, book_ids, args.limit)
+        rows.append(
+            {
+                "backend": f"lsh tables={tables} bits={bits} probe_radius={probe_radius}",
+                "recall": _recall(service, exact, approximate),
+                "p50_ms": np.percentile(latencies, 50),
+                "p99_ms": np.percentile(latencies, 99),
+                "build_s": build_seconds,
+            }
+        )
+    service.set_backend(ExactBackend())
+
+    exact_p99_ms = rows[0]["p99_ms"]
+    print(f"{'backend':<40} {'recall@' + str(args.limit):>9} {'p50 ms':>8} {'p99 ms':>8} {'p99 speedup':>12}")
+    for row in rows:
+        row["p99_speedup"] = exact_p99_ms / row["p99_ms"]
+        print(
+            f"{row['backend']:<40} {row['recall']:>9.3f} {row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f}"
+            f" {row['p99_speedup']:>11.1f}x"
+        )
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"books": args.books, "limit": args.limit, "results": rows}, file, indent=2, default=float)
+
+
+if __name__ == "__main__":
+    main()
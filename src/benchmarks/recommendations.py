@@ -0,0 +1,65 @@
+"""Batch vs sequential recommendation lookups against an in-memory index.
+
+    PYTHONPATH=src python -m benchmarks.recommendations --books 100000 --batch 50
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.data import generate_books
+from book_management.services.recommendation import RecommendationService
+from book_management.services.recommendation_backends import ExactBackend
+
+
+class _CatalogRepository:
+    def __init__(self, books: list[dict]) -> None:
+        self._books = books
+
+    async def stream_all(self, batch_size: int = 1000):
+        for start in range(0, len(self._books), batch_size):
+            yield self._books[start : start + batch_size]  # noqa
+
+
+class _CatalogUnitOfWork:
+    def __init__(self, books: list[dict]) -> None:
+        self.books = _CatalogRepository(books)
+
+
+def build_service(book_count: int, seed: int = 0, backend=None) -> RecommendationService:
+    books = [{"id": book_id, **book} for book_id, book in enumerate(generate_books(book_count, seed), start=1)]
+    service = RecommendationService(backend=backend or ExactBackend())
+    asyncio.run(service.ensure_built(_CatalogUnitOfWork(books)))
+    return service
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    service = build_service(args.books)
+    print(f"index of {len(service)} books built in {time.perf_counter() - started:.2f}s")
+
+    book_ids = list(range(1, args.batch + 1))
+    sequential, batched = [], []
+    for _ in range(args.rounds):
+        started = time.perf_counter()
+        for book_id in book_ids:
+            service.recommend(book_id, args.limit)
+        sequential.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        service.recommend_many(book_ids, args.limit)
+        batched.append(time.perf_counter() - started)
+
+    sequential_ms, batched_ms = min(sequential) * 1000, min(batched) * 1000
+    print(f"{args.batch} sequential calls: {sequential_ms:.1f} ms")
+    print(f"1 batch call:          {batched_ms:.1f} ms ({sequential_ms / batched_ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Per-call cost of `BooksRepository.retrieve` and `get_all` with and without statement reuse.
+
+"rebuilt" is the configuration before statements were reused: the engine's defaults (asyncpg still prepares and
+caches up to 100 statements per connection, and the old f-strings produced the same SQL for each shape, so Postgres
+plans were already reused) with a new `text()` built for every call. "cached" is the current configuration:
+statements kept by `PostgresRepository._statement` and DB_PREPARED_STATEMENT_CACHE_SIZE. The difference is what
+the statement reuse saves on the Python side. Runs against DATABASE_URL and seeds books when there are fewer
+than --books:
+
+    DATABASE_URL=postgresql+asyncpg://... PYTHONPATH=src python -m benchmarks.repository_statements
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmarks.data import generate_books
+from book_management import Base
+from config import settings
+from repositories.postgres.container import PostgresUnitOfWork
+from repositories.postgres.repository import PostgresRepository
+
+_GET_ALL_SORTS = [("title", "asc"), ("published_year", "desc"), ("author", "asc"), ("id", "asc")]
+
+
+async def _seed(engine, book_count: int) -> list[int]:
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+    uow = PostgresUnitOfWork(engine)
+    async with uow:
+        existing = (await uow.session.execute(text("SELECT count(*) FROM books"))).scalar_one()
+        if existing < book_count:
+            books = generate_books(book_count - existing, seed=existing)
+            author_names = {book["author_name"] for book in books}
+            authors = {author.name: author for author in await uow.authors.retrieve_by_names(list(author_names))}
+            new_names = author_names - authors.keys()
+            if new_names:
+                new_authors = await uow.authors.bulk_copy([{"name": name} for name in new_names])
+                authors.update({author.name: author for author in new_authors})
+            await uow.books.bulk_copy(
+                [
+                    {
+                        "title": book["title"],
+                        "author_id": authors[book["author_name"]].id,
+                        "genre": book["genre"],
+                        "published_year": book["published_year"],
+                    }
+                    for book in books
+                ]
+            )
+
+    async with uow:
+        return list((await uow.session.execute(text("SELECT id FROM books"))).scalars())
+
+
+async def _measure(engine, book_ids: list[int], calls: int, rebuild: bool) -> dict[str, float]:
+    rng = random.Random(0)
+    uow = PostgresUnitOfWork(engine)
+    timings = {}
+    async with uow:
+        operations = {
+            "retrieve": lambda: uow.books.retrieve(rng.choice(book_ids)),
+            "get_all": lambda: uow.books.get_all(
+                offset=0, limit=20, sort_field=_GET_ALL_SORTS[rng.randrange(4)][0], sort_direction="asc"
+            ),
+            "get_all keyset": lambda: uow.books.get_all(
+                offset=0,
+                limit=20,
+                sort_field="published_year",
+                sort_direction="desc",
+                after=(2000, rng.choice(book_ids)),
+            ),
+        }
+        for name, operation in operations.items():
+            for _ in range(20):
+                await operation()
+
+            started = time.perf_counter()
+            for _ in range(calls):
+                if rebuild:
+                    PostgresRepository._statements.clear()
+                await operation()
+            timings[name] = (time.perf_counter() - started) / calls * 1_000_000
+    return timings
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    engines = {
+        "rebuilt": create_async_engine(settings.DATABASE_URL),
+        "cached": create_async_engine(
+            settings.DATABASE_URL,
+            connect_args={"prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE},
+        ),
+    }
+    book_ids = await _seed(engines["cached"], args.books)
+    print(f"{len(book_ids)} books, {args.calls} calls per operation, mean µs per call, best of {args.rounds} rounds")
+
+    # the configurations take turns, so drift on the database side does not favour either; the best round of each
+    # is the least disturbed one
+    results = {name: {} for name in engines}
+    for _ in range(args.rounds):
+        for name, engine in engines.items():
+            timings = await _measure(engine, book_ids, args.calls, rebuild=name == "rebuilt")
+            for operation, timing in timings.items():
+                results[name][operation] = min(timing, results[name].get(operation, timing))
+    print(f"{'operation':<16} {'rebuilt':>10} {'cached':>10} {'saved':>8}")
+    for operation in results["cached"]:
+        rebuilt, cached = results["rebuilt"][operation], results["cached"][operation]
+        print(f"{operation:<16} {rebuilt:>10.0f} {cached:>10.0f} {1 - cached / rebuilt:>8.0%}")
+
+    for engine in engines.values():
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
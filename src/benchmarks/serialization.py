@@ -0,0 +1,59 @@
+"""Cost of encoding a `GET /books/` page, as FastAPI does it for a returned dict and through the trusted fast path.
+
+"validated" is FastAPI's path for an endpoint that returns plain data: the rows are validated against the route's
+`response_model`, dumped back to Python objects and encoded with the stdlib json (`JSONResponse`). "trusted" is
+what the read endpoints do now, the use case's rows encoded as they are with orjson (`ORJSONResponse`). Nothing is
+served and no database is needed:
+
+    PYTHONPATH=src python -m benchmarks.serialization --per-page 20 100 500
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+
+from benchmarks.data import generate_books
+from main import application
+
+
+async def _validated(field, books: list[dict]) -> bytes:
+    content = await serialize_response(field=field, response_content=books, is_coroutine=True)
+    return JSONResponse(content).body
+
+
+async def _trusted(field, books: list[dict]) -> bytes:
+    return ORJSONResponse(books).body
+
+
+async def _per_call_us(encode, field, books: list[dict], calls: int) -> float:
+    for _ in range(10):
+        await encode(field, books)
+    started = time.perf_counter()
+    for _ in range(calls):
+        await encode(field, books)
+    return (time.perf_counter() - started) / calls * 1_000_000
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--per-page", type=int, nargs="+", default=[20, 100, 500])
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    route = next(route for route in application.routes if route.path == "/books/" and "GET" in route.methods)
+    print(f"{'per_page':>8} {'validated':>12} {'trusted':>12} {'speedup':>8}")
+    for per_page in args.per_page:
+        # the shape `RetrieveBooksUseCase` returns
+        books = [{"id": index + 1, **book} for index, book in enumerate(generate_books(per_page))]
+        # same document, keys may come in another order
+        assert json.loads(await _validated(route.response_field, books)) == json.loads(await _trusted(None, books))
+        validated = await _per_call_us(_validated, route.response_field, books, args.calls)
+        trusted = await _per_call_us(_trusted, route.response_field, books, args.calls)
+        print(f"{per_page:>8} {validated:>9.1f} us {trusted:>9.1f} us {validated / trusted:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,249 @@
+"""Latency of the book use cases over catalogs of several sizes, on Postgres and on the in-memory backend.
+
+Each catalog is seeded through `BulkImportBooksUseCase` (which is timed as well), then every operation runs
+--runs times. Postgres is a fresh testcontainer unless DATABASE_URL is set (its tables are dropped and recreated).
+Results go to --output as JSON; compare two runs with `benchmarks.compare`:
+
+    PYTHONPATH=src python -m benchmarks.use_cases --sizes 10000 100000 1000000 --output results.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmarks.data import generate_books
+from book_management import Base
+from book_management.services.cache import book_cache, listing_cache
+from book_management.services.counter import book_counter
+from book_management.services.pagination import CursorCodec
+from book_management.services.recommendation import recommendation_service
+from book_management.use_cases.books import (
+    BulkImportBooksUseCase,
+    ExportBooksUseCase,
+    RecommendBooksUseCase,
+    RetrieveBooksUseCase,
+    RetrieveBookUseCase,
+)
+from config import settings
+from repositories.fake.containers import FakeDatabase, FakeUnitOfWork
+from repositories.postgres.container import PostgresUnitOfWork
+
+_SORT_FIELDS = {"title": "title", "published_year": "published_year", "author": "author_name"}
+_PER_PAGE = 20
+
+
+@contextlib.contextmanager
+def _postgres_url():
+    if os.environ.get("DATABASE_URL"):
+        yield os.environ["DATABASE_URL"]
+        return
+
+    from testcontainers.postgres import PostgresContainer
+
+    with PostgresContainer("postgres:15-alpine") as postgres:
+        yield postgres.get_connection_url().replace("psycopg2", "asyncpg")
+
+
+class _Backend:
+    """Creates units of work over one freshly seeded catalog"""
+
+    def __init__(self, name: str, postgres_url: str | None) -> None:
+        self.name = name
+        self.postgres_url = postgres_url
+        self.engine = None
+        self.database = None
+
+    async def reset(self) -> None:
+        if self.name == "memory":
+            self.database = FakeDatabase()
+            return
+
+        if self.engine is None:
+            self.engine = create_async_engine(
+                self.postgres_url,
+                connect_args={"prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE},
+            )
+        async with self.engine.begin() as connection:
+            await connection.run_sync(Base.metadata.drop_all)
+            await connection.run_sync(Base.metadata.create_all)
+
+    def uow(self):
+        if self.name == "memory":
+            return FakeUnitOfWork(self.database)
+        return PostgresUnitOfWork(self.engine)
+
+    async def analyze(self) -> None:
+        if self.engine is not None:
+            async with self.engine.begin() as connection:
+                await connection.execute(text("ANALYZE"))
+
+    async def close(self) -> None:
+        if self.engine is not None:
+            await self.engine.dispose()
+
+
+def _summary(timings_ms: list[float], **extra: Any) -> dict[str, Any]:
+    timings = np.asarray(timings_ms)
+    return {
+        "runs": len(timings),
+        "mean_ms": float(timings.mean()),
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p95_ms": float(np.percentile(timings, 95)),
+        "max_ms": float(timings.max()),
+        **extra,
+    }
+
+
+async def _time(operation: Callable[[], Awaitable[Any]], runs: int, warmup: int = 3) -> list[float]:
+    for _ in range(warmup):
+        await operation()
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await operation()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+async def _seed(backend: _Backend, size: int, batch_size: int) -> dict[str, Any]:
+    books = generate_books(size, seed=size)
+    timings = []
+    for start in range(0, size, batch_size):
+        started = time.perf_counter()
+        await BulkImportBooksUseCase(backend.uow())(books[start : start + batch_size])  # noqa
+        timings.append((time.perf_counter() - started) * 1000)
+    await backend.analyze()
+    return _summary(timings, rows_per_second=size / (sum(timings) / 1000), batch_size=batch_size)
+
+
+async def _drain_export(backend: _Backend) -> int:
+    size = 0
+    async for chunk in await ExportBooksUseCase(backend.uow())(format="json"):
+        size += len(chunk)
+    return size
+
+
+async def _benchmark_catalog(backend: _Backend, size: int, args: argparse.Namespace) -> dict[str, dict[str, Any]]:
+    await backend.reset()
+    recommendation_service.reset()
+    book_counter.reset()
+    results = {"bulk_import": await _seed(backend, size, args.batch_size)}
+
+    rng = random.Random(0)
+    book_ids = [book["id"] async for batch in _iter_ids(backend) for book in batch]
+    deep_page = max(1, size // _PER_PAGE // 2)
+
+    for field, key in _SORT_FIELDS.items():
+        sort_by = f"{field}:asc"
+
+        async def first_page(sort_by=sort_by, cached=False):
+            # uncached unless timing the listing cache itself
+            if not cached:
+                listing_cache.reset()
+            return await RetrieveBooksUseCase(backend.uow())(page=1, per_page=_PER_PAGE, sort_by=sort_by)
+
+        async def deep_offset_page(sort_by=sort_by):
+            listing_cache.reset()
+            return await RetrieveBooksUseCase(backend.uow())(page=deep_page, per_page=_PER_PAGE, sort_by=sort_by)
+
+        # the cursor of the page the offset one starts at, so both read the same rows
+        middle = (await deep_offset_page())["books"][0]
+        cursor = CursorCodec.encode(sort_by, middle[key], middle["id"])
+
+        async def deep_cursor_page(sort_by=sort_by, cursor=cursor):
+            listing_cache.reset()
+            return await RetrieveBooksUseCase(backend.uow())(page=1, per_page=_PER_PAGE, sort_by=sort_by, cursor=cursor)
+
+        results[f"retrieve_books:{field}:first"] = _summary(await _time(first_page, args.runs))
+        results[f"retrieve_books:{field}:first_cached"] = _summary(
+            await _time(lambda: first_page(cached=True), args.runs)
+        )
+        results[f"retrieve_books:{field}:deep_offset"] = _summary(await _time(deep_offset_page, args.runs))
+        results[f"retrieve_books:{field}:deep_cursor"] = _summary(await _time(deep_cursor_page, args.runs))
+
+    async def retrieve_book():
+        # uncached, the book cache would otherwise answer every call after the first
+        book_cache.reset()
+        return await RetrieveBookUseCase(backend.uow())(rng.choice(book_ids))
+
+    results["retrieve_book"] = _summary(await _time(retrieve_book, args.runs))
+
+    export_runs = max(1, args.runs // 20)
+    timings = await _time(lambda: _drain_export(backend), export_runs, warmup=0)
+    results["export_json"] = _summary(timings, rows_per_second=size / (float(np.median(timings)) / 1000))
+
+    started = time.perf_counter()
+    async with backend.uow() as uow:
+        await recommendation_service.ensure_built(uow)
+    results["recommend:build"] = _summary([(time.perf_counter() - started) * 1000])
+    results["recommend"] = _summary(
+        await _time(lambda: RecommendBooksUseCase(backend.uow())(book_id=rng.choice(book_ids), limit=5), args.runs)
+    )
+    return results
+
+
+async def _iter_ids(backend: _Backend):
+    uow = backend.uow()
+    async with uow:
+        async for batch in uow.books.stream_all(batch_size=10_000):
+            yield batch
+
+
+def _metadata() -> dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit.strip() if commit else None,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--backends", nargs="+", choices=["postgres", "memory"], default=["postgres", "memory"])
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=settings.IMPORT_BATCH_SIZE)
+    parser.add_argument("--output", default="benchmark-results.json")
+    args = parser.parse_args()
+
+    report = {"metadata": {**_metadata(), "runs": args.runs, "batch_size": args.batch_size}, "results": []}
+    with _postgres_url() if "postgres" in args.backends else contextlib.nullcontext() as postgres_url:
+        for backend_name in args.backends:
+            backend = _Backend(backend_name, postgres_url)
+            try:
+                for size in args.sizes:
+                    started = time.perf_counter()
+                    results = await _benchmark_catalog(backend, size, args)
+                    print(f"{backend_name} {size} books ({time.perf_counter() - started:.0f}s)")
+                    for operation, summary in results.items():
+                        print(f"  {operation:<44} p50 {summary['p50_ms']:>10.3f} ms  p95 {summary['p95_ms']:>10.3f} ms")
+                        report["results"].append(
+                            {"backend": backend_name, "size": size, "operation": operation, **summary}
+                        )
+            finally:
+                await backend.close()
+
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
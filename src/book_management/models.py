@@ -1,6 +1,7 @@
 import enum
 
-from sqlalchemy import Column, Enum, ForeignKey, Integer, String
+from sqlalchemy import DDL, BigInteger, Column, DateTime, Enum, ForeignKey, Index, Integer, String, event, func, text
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.orm import relationship
 
 from book_management import Base
@@ -13,6 +14,18 @@ class Genre(str, enum.Enum):
     HISTORY = "History"
 
 
+def _trigram_available(ddl, target, bind, **kwargs) -> bool:
+    """Whether pg_trgm can be used; without it search falls back to full-text matching only"""
+    return bool(bind.execute(text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).first())
+
+
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql", callable_=_trigram_available),
+)
+
+
 class Author(Base):
     __tablename__ = "authors"
     id = Column(Integer, primary_key=True)
@@ -20,6 +33,14 @@ class Author(Base):
 
     books = relationship("Book", back_populates="author")
 
+    # search, see `BooksRepository.search`
+    __table_args__ = (
+        Index("ix_authors_name_tsv", text("to_tsvector('simple', name)"), postgresql_using="gin"),
+        Index("ix_authors_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}).ddl_if(
+            callable_=_trigram_available
+        ),
+    )
+
 
 class Book(Base):
     __tablename__ = "books"
@@ -28,5 +49,62 @@ class Book(Base):
     author_id = Column(Integer, ForeignKey("authors.id"), nullable=False)
     genre = Column(Enum(Genre, native_enum=False), nullable=False)
     published_year = Column(Integer, nullable=False)
+    # bumped by every update, the book's ETag is derived from it
+    version = Column(Integer, nullable=False, server_default="1")
 
     author = relationship("Author", back_populates="books")
+
+    # keyset pagination walks these in `(sort_key, id)` order, see `BooksRepository.get_all`
+    __table_args__ = (
+        Index("ix_books_title_id", "title", "id"),
+        Index("ix_books_published_year_id", "published_year", "id"),
+        Index("ix_books_author_id_id", "author_id", "id"),
+        # genre filter, alone or with a year range, see `BooksRepository._filter_conditions`
+        Index("ix_books_genre_published_year_id", "genre", "published_year", "id"),
+        # search, see `BooksRepository.search`
+        Index("ix_books_title_tsv", text("to_tsvector('simple', title)"), postgresql_using="gin"),
+        Index("ix_books_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}).ddl_if(
+            callable_=_trigram_available
+        ),
+    )
+
+
+class ImportJob(Base):
+    """An upload imported in the background, see `book_management.tasks`"""
+
+    __tablename__ = "import_jobs"
+    id = Column(String, primary_key=True)
+    # queued, running, completed or failed
+    status = Column(String, nullable=False, server_default="queued")
+    filename = Column(String, nullable=False)
+    # known once the whole file is parsed
+    total_items = Column(Integer, nullable=True)
+    successful = Column(Integer, nullable=False, server_default="0")
+    failed = Column(Integer, nullable=False, server_default="0")
+    # the first IMPORT_JOB_MAX_FAILURES failed rows and their errors
+    failed_info = Column(JSONB, nullable=False, server_default=text("'[]'::jsonb"))
+    chunks_total = Column(Integer, nullable=True)
+    # indexes of the chunks recorded so far, a chunk delivered again is not applied twice
+    chunks_applied = Column(ARRAY(Integer), nullable=False, server_default="{}")
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class ExportJob(Base):
+    """An export rendered in the background to a file in `EXPORT_DIR`, see `book_management.tasks`"""
+
+    __tablename__ = "export_jobs"
+    id = Column(String, primary_key=True)
+    # queued, running, completed or failed
+    status = Column(String, nullable=False, server_default="queued")
+    format = Column(String, nullable=False)
+    # gzip or zstd, applied to the whole file
+    compression = Column(String, nullable=True)
+    # offered to the client on download, the file itself is named after the job
+    filename = Column(String, nullable=False)
+    # in bytes, once completed
+    size = Column(BigInteger, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
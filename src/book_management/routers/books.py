@@ -1,60 +1,222 @@
-import io
+from typing import Any
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
-from fastapi.responses import StreamingResponse
-from pydantic import ValidationError as PydanticValidationError
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Query, Response, UploadFile, status
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
 
 from auth.schemas import UserResponse
-from book_management.schemas.books import BookBulkImportResponse, BookCreateSchema, BookResponseSchema
-from book_management.services.books import FileParserFactory
+from book_management.schemas.books import (
+    BookBulkImportResponse,
+    BookCreateSchema,
+    BookListResponseSchema,
+    BookRecommendationsBatchRequest,
+    BookRecommendationsSchema,
+    BookResponseSchema,
+    ExportJobResponse,
+    ImportJobResponse,
+)
+from book_management.services.books import FileExporterFactory, FileParserFactory, iter_file_text
+from book_management.services.generation import catalog_generation
+from book_management.tasks import run_export_job, run_import_job
 from book_management.use_cases.books import (
-    BulkImportBooksUseCase,
     CreateBookUseCase,
+    CreateExportJobUseCase,
+    CreateImportJobUseCase,
     DeleteBookUseCase,
     ExportBooksUseCase,
+    ImportBooksFileUseCase,
+    RecommendBooksBatchUseCase,
     RecommendBooksUseCase,
     RetrieveBooksUseCase,
     RetrieveBookUseCase,
+    RetrieveExportFileUseCase,
+    RetrieveExportJobUseCase,
+    RetrieveImportJobUseCase,
+    SearchBooksUseCase,
     UpdateBookUseCase,
 )
-from dependencies import get_current_user, get_unit_of_work
+from config import settings
+from dependencies import get_current_user, get_read_unit_of_work, get_unit_of_work
 from exceptions import ValidationError
 
 router = APIRouter(prefix="/books", tags=["books"])
 
+_not_modified = {status.HTTP_304_NOT_MODIFIED: {"description": "Not modified since the `If-None-Match` ETag"}}
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """`If-None-Match` compares weakly: `W/"x"` matches `"x"`"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+
+
+def _trusted_json(content: Any, headers: dict[str, str] | None = None) -> ORJSONResponse:
+    """`content` built by a use case from repository rows, already in the shape of the endpoint's `response_model`:
+    encoded as it is with orjson, without the revalidation FastAPI would do (the model still documents the endpoint)"""
+    return ORJSONResponse(content, headers=headers)
+
+
+def book_filters(
+    genre: str | None = None,
+    year_from: int | None = None,
+    year_to: int | None = None,
+    author: str | None = None,
+    author_id: int | None = None,
+) -> dict:
+    """Filter query parameters shared by the listing and the export, validated by the use cases"""
+    return {"genre": genre, "year_from": year_from, "year_to": year_to, "author": author, "author_id": author_id}
+
+
+def export_options(format: str = "json", compression: str | None = None) -> dict:
+    """`format` and optional `compression` of the export and the export jobs"""
+    format_lower = format.lower()
+    if format_lower not in FileExporterFactory.formats:
+        formats = ", ".join(f"'{name}'" for name in FileExporterFactory.formats)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Format must be one of {formats}")
+
+    compression_lower = compression.lower() if compression else None
+    if compression_lower is not None and compression_lower not in FileExporterFactory.compressions:
+        compressions = ", ".join(f"'{name}'" for name in FileExporterFactory.compressions)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"Compression must be one of {compressions}"
+        )
+    return {"format": format_lower, "compression": compression_lower}
+
 
 @router.get("/export")
 async def export_books(
-    format: str = "json",
-    uow=Depends(get_unit_of_work),
+    options: dict = Depends(export_options),
+    filters: dict = Depends(book_filters),
+    uow=Depends(get_read_unit_of_work),
     current_user: UserResponse = Depends(get_current_user),
 ):
-    format_lower = format.lower()
-    if format_lower not in ["json", "csv"]:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Format must be 'json' or 'csv'")
-
+    exporter = FileExporterFactory.get_exporter(**options)
     use_case = ExportBooksUseCase(uow)
-    file_content = await use_case(format=format_lower)
-
-    media_type = "application/json" if format_lower == "json" else "text/csv"
-    file_extension = "json" if format_lower == "json" else "csv"
+    file_chunks = await use_case(filters=filters, **options)
 
     return StreamingResponse(
-        io.StringIO(file_content),
-        media_type=media_type,
-        headers={"Content-Disposition": f"attachment; filename=books_export.{file_extension}"},
+        file_chunks,
+        media_type=exporter.media_type,
+        headers={"Content-Disposition": f"attachment; filename=books_export.{exporter.extension}"},
     )
 
 
-@router.get("/", response_model=list[BookResponseSchema])
+@router.post("/export-jobs", response_model=ExportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_export_job(
+    response: Response,
+    options: dict = Depends(export_options),
+    filters: dict = Depends(book_filters),
+    uow=Depends(get_unit_of_work),
+    current_user: UserResponse = Depends(get_current_user),
+):
+    """Queues an export rendered to a file, downloadable from the job's `/download` once completed"""
+    use_case = CreateExportJobUseCase(uow, enqueue=run_export_job.delay)
+    job = await use_case(filters=filters, **options)
+    response.headers["Location"] = router.url_path_for("retrieve_export_job", job_id=job["id"])
+    return job
+
+
+@router.get("/export-jobs/{job_id}", response_model=ExportJobResponse)
+async def retrieve_export_job(
+    job_id: str,
+    uow=Depends(get_unit_of_work),
+    current_user: UserResponse = Depends(get_current_user),
+):
+    use_case = RetrieveExportJobUseCase(uow)
+    return await use_case(job_id)
+
+
+@router.get(
+    "/export-jobs/{job_id}/download",
+    response_class=FileResponse,
+    responses={
+        status.HTTP_206_PARTIAL_CONTENT: {"description": "The byte ranges asked for with `Range`"},
+        status.HTTP_409_CONFLICT: {"description": "The export is not completed"},
+    },
+)
+async def download_export(
+    job_id: str,
+    uow=Depends(get_unit_of_work),
+    current_user: UserResponse = Depends(get_current_user),
+):
+    """The exported file, with `Range` (and `If-Range`) support so an interrupted download can be resumed"""
+    use_case = RetrieveExportFileUseCase(uow)
+    job = await use_case(job_id)
+    media_type = FileExporterFactory.get_exporter(job["format"], job["compression"]).media_type
+    if settings.EXPORT_ACCEL_REDIRECT_LOCATION:
+        # nginx sends the file itself (sendfile, ranges included), the worker is free as soon as it answers
+        return Response(
+            media_type=media_type,
+            headers={
+                "X-Accel-Redirect": f"{settings.EXPORT_ACCEL_REDIRECT_LOCATION.rstrip('/')}/{job_id}",
+                "Content-Disposition": f"attachment; filename={job['filename']}",
+            },
+        )
+    return FileResponse(job["path"], media_type=media_type, filename=job["filename"])
+
+
+@router.get("/search", response_model=list[BookResponseSchema])
+async def search_books(
+    q: str,
+    limit: int = 20,
+    cursor: str | None = None,
+    uow=Depends(get_read_unit_of_work),
+):
+    use_case = SearchBooksUseCase(uow)
+    result = await use_case(query=q, limit=limit, cursor=cursor)
+
+    # pass the value back as `cursor` (with the same `q`) to fetch the next page
+    headers = {"X-Next-Cursor": result["next_cursor"]} if result["next_cursor"] else None
+    return _trusted_json(result["books"], headers=headers)
+
+
+@router.get("/", response_model=list[BookResponseSchema] | BookListResponseSchema, responses=_not_modified)
 async def retrieve_books(
     page: int = 1,
     per_page: int = 10,
     sort_by: str = "title:asc",
-    uow=Depends(get_unit_of_work),
+    cursor: str | None = None,
+    count: str | None = None,
+    filters: dict = Depends(book_filters),
+    if_none_match: str | None = Header(None),
+    uow=Depends(get_read_unit_of_work),
 ):
     use_case = RetrieveBooksUseCase(uow)
-    return await use_case(page=page, per_page=per_page, sort_by=sort_by)
+    # a malformed request is rejected even if the client has the current listing of a well-formed one
+    query = use_case.parse(sort_by=sort_by, cursor=cursor, count=count, filters=filters)
+
+    # read before the page: a write in between changes the generation, so the page is at least as new as its tag
+    generation = await catalog_generation.get()
+    etag = f'"catalog-{generation}"'
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    headers = {}
+    # unless read from a replica that may not have the last write yet
+    if not uow.reads_replicas or catalog_generation.is_settled(generation):
+        headers["ETag"] = etag
+
+    result = await use_case.retrieve(page=page, per_page=per_page, **query)
+
+    # pass the value back as `cursor` to fetch the next page; `page` is ignored in that case
+    if result["next_cursor"]:
+        headers["X-Next-Cursor"] = result["next_cursor"]
+
+    # `count` (exact, estimated or cached) switches to an envelope with the total
+    if count is None:
+        return _trusted_json(result["books"], headers=headers)
+    return _trusted_json(
+        {
+            "items": result["books"],
+            "total": result["total"],
+            "total_is_estimate": result["total_is_estimate"],
+            "page": page,
+            "per_page": per_page,
+            "next_cursor": result["next_cursor"],
+        },
+        headers=headers,
+    )
 
 
 @router.post("/", response_model=BookResponseSchema)
@@ -67,13 +229,25 @@ async def create_book(
     return await use_case(book_data.model_dump())
 
 
-@router.get("/{book_id}", response_model=BookResponseSchema)
+@router.get("/{book_id}", response_model=BookResponseSchema, responses=_not_modified)
 async def retrieve_book(
     book_id: int,
+    if_none_match: str | None = Header(None),
+    # the primary, not a replica: a lagging replica would put stale rows back into the book cache
     uow=Depends(get_unit_of_work),
 ):
     use_case = RetrieveBookUseCase(uow)
-    return await use_case(book_id)
+    # served from the book cache when it holds the book, the database is only queried on a miss
+    book = await use_case(book_id)
+    content = {key: value for key, value in book.items() if key != "version"}
+    # cached before books had a version, such entries expire within BOOK_CACHE_TTL_SECONDS
+    if "version" not in book:
+        return _trusted_json(content)
+
+    etag = f'"{book["id"]}-{book["version"]}"'
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return _trusted_json(content, headers={"ETag": etag})
 
 
 @router.put("/{book_id}", response_model=BookResponseSchema)
@@ -108,43 +282,62 @@ async def bulk_import_books(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Please ensure the file is in JSON or CSV format."
         )
 
-    content = await file.read()
-    file_content = content.decode()
-
     parser = FileParserFactory.get_parser(file.filename)
+    books_data = parser.iter_parse(iter_file_text(file, settings.IMPORT_CHUNK_SIZE))
+
+    # batches are committed as they fill up, a parsing error part way is reported along with what was imported
+    use_case = ImportBooksFileUseCase(uow)
+    return await use_case(books_data, batch_size=settings.IMPORT_BATCH_SIZE)
+
+
+@router.post("/import-jobs", response_model=ImportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_import_job(
+    response: Response,
+    file: UploadFile = File(...),
+    uow=Depends(get_unit_of_work),
+    current_user: UserResponse = Depends(get_current_user),
+):
+    """Queues the import of a JSON or CSV file, its progress is followed at the returned job's location"""
+    if file.content_type not in ["text/csv", "application/json"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Please ensure the file is in JSON or CSV format."
+        )
+
+    use_case = CreateImportJobUseCase(uow, enqueue=run_import_job.delay)
     try:
-        books_data = parser.parse(file_content)
+        job = await use_case(file, chunk_size=settings.IMPORT_CHUNK_SIZE)
     except ValueError as error:
-        raise ValidationError("file", f"File parsing error: {str(error)}")
-    except TypeError:
-        raise ValidationError("file", "Missing required field")
-
-    valid_books = []
-    failed_info = []
-    for book_data in books_data:
-        try:
-            book = BookCreateSchema(**book_data)
-            valid_books.append(book.model_dump())
-        except PydanticValidationError as error:
-            failed_info.append({"data": book_data, "error": str(error)})
-
-    use_case = BulkImportBooksUseCase(uow)
-    result = await use_case(valid_books)
-
-    return {
-        "total_items": len(books_data),
-        "successful": result["successful"],
-        "failed": len(failed_info),
-        "failed_info": failed_info,
-    }
+        raise ValidationError("file", str(error))
+    response.headers["Location"] = router.url_path_for("retrieve_import_job", job_id=job["id"])
+    return job
+
+
+@router.get("/import-jobs/{job_id}", response_model=ImportJobResponse)
+async def retrieve_import_job(
+    job_id: str,
+    uow=Depends(get_unit_of_work),
+    current_user: UserResponse = Depends(get_current_user),
+):
+    use_case = RetrieveImportJobUseCase(uow)
+    return await use_case(job_id)
 
 
 @router.get("/recommendations/{book_id}", response_model=list[BookResponseSchema])
 async def recommend_books(
     book_id: int,
-    limit: int = 5,
-    uow=Depends(get_unit_of_work),
+    limit: int = Query(5, ge=1, le=settings.RECOMMENDATION_MAX_LIMIT),
+    uow=Depends(get_read_unit_of_work),
     current_user: UserResponse = Depends(get_current_user),
 ):
     use_case = RecommendBooksUseCase(uow)
-    return await use_case(book_id=book_id, limit=limit)
+    return _trusted_json(await use_case(book_id=book_id, limit=limit))
+
+
+@router.post("/recommendations:batch", response_model=list[BookRecommendationsSchema])
+async def recommend_books_batch(
+    request_data: BookRecommendationsBatchRequest,
+    uow=Depends(get_read_unit_of_work),
+    current_user: UserResponse = Depends(get_current_user),
+):
+    use_case = RecommendBooksBatchUseCase(uow)
+    return _trusted_json(await use_case(book_ids=request_data.book_ids, limit=request_data.limit))
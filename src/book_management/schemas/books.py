@@ -1,8 +1,9 @@
 from datetime import datetime
 
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator
 
 from book_management.models import Genre
+from config import settings
 
 
 class BaseBookSchema(BaseModel):
@@ -25,8 +26,57 @@ class BookResponseSchema(BaseBookSchema):
     id: int
 
 
+class BookListResponseSchema(BaseModel):
+    items: list[BookResponseSchema]
+    total: int
+    total_is_estimate: bool
+    page: int
+    per_page: int
+    next_cursor: str | None
+
+
 class BookBulkImportResponse(BaseModel):
     total_items: int
     successful: int
     failed: int
     failed_info: list
+    # a file that stopped parsing part way, the counts are of the rows read (and imported) before that
+    error: str | None = None
+
+
+class ImportJobResponse(BaseModel):
+    id: str
+    status: str
+    filename: str
+    # known once the file is parsed
+    total_items: int | None
+    processed: int
+    successful: int
+    failed: int
+    failed_info: list
+    error: str | None
+    created_at: datetime
+    finished_at: datetime | None
+
+
+class ExportJobResponse(BaseModel):
+    id: str
+    status: str
+    format: str
+    compression: str | None
+    filename: str
+    # in bytes, once completed
+    size: int | None
+    error: str | None
+    created_at: datetime
+    finished_at: datetime | None
+
+
+class BookRecommendationsBatchRequest(BaseModel):
+    book_ids: list[int] = Field(min_length=1, max_length=settings.RECOMMENDATION_BATCH_MAX_SIZE)
+    limit: int = Field(5, ge=1, le=settings.RECOMMENDATION_MAX_LIMIT)
+
+
+class BookRecommendationsSchema(BaseModel):
+    book_id: int
+    recommendations: list[BookResponseSchema]
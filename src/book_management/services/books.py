@@ -1,37 +1,151 @@
+import abc
+import codecs
 import csv
+import io
 import json
+import re
+import textwrap
+import zlib
 from io import StringIO
-from typing import Any, Protocol
+from typing import Any, AsyncIterable, AsyncIterator, Protocol
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import zstandard
+
+from config import settings
 
 # Prefer Single Responsibility Principle (keep 2 classes) over DRY in this approach (2 methods in 1 class)
 
 class FileParser(Protocol):
-    def parse(self, content: str) -> list[dict[str, Any]]:
+    def iter_parse(self, chunks: AsyncIterable[str]) -> AsyncIterator[Any]:
         pass
 
 
 class JSONFileParser:
-    def parse(self, content: str) -> list[dict[str, Any]]:
-        data = json.loads(content)
-        if not isinstance(data, list):
+    """Yields the items of a top-level JSON array as soon as each one is complete"""
+
+    _whitespace = re.compile(r"\s*")
+
+    def __init__(self, max_item_size: int | None = None) -> None:
+        # an item that does not decode within this many characters is taken as malformed, not as incomplete
+        self.max_item_size = max_item_size or settings.IMPORT_MAX_ITEM_SIZE
+
+    async def iter_parse(self, chunks: AsyncIterable[str]) -> AsyncIterator[Any]:
+        decoder = json.JSONDecoder()
+        buffer, state = "", "start"
+        async for chunk in chunks:
+            items, buffer, state = self._drain(decoder, buffer + chunk, state, final=False)
+            for item in items:
+                yield item
+
+        items, buffer, state = self._drain(decoder, buffer, state, final=True)
+        for item in items:
+            yield item
+        if state != "end":
             raise ValueError("JSON content must be an array of books")
-        return data
+
+    def _drain(self, decoder: json.JSONDecoder, buffer: str, state: str, final: bool) -> tuple[list, str, str]:
+        items = []
+        position = 0
+        while True:
+            position = self._whitespace.match(buffer, position).end()
+            if position == len(buffer):
+                break
+
+            char = buffer[position]
+            if state == "start":
+                if char != "[":
+                    raise ValueError("JSON content must be an array of books")
+                position, state = position + 1, "first_item"
+            elif state in ("first_item", "item"):
+                if state == "first_item" and char == "]":
+                    position, state = position + 1, "end"
+                    continue
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    if len(buffer) - position > self.max_item_size:
+                        raise ValueError(f"Malformed JSON item or one longer than {self.max_item_size} characters")
+                    break
+                # a value that touches the end of the buffer may still be incomplete (e.g. a number)
+                if end == len(buffer) and not final:
+                    break
+                items.append(item)
+                position, state = end, "separator"
+            elif state == "separator":
+                if char not in ",]":
+                    raise ValueError(f"Expecting ',' delimiter: char {char!r}")
+                position, state = position + 1, "item" if char == "," else "end"
+            else:
+                raise ValueError("Extra data after the JSON array")
+
+        return items, buffer[position:], state
 
 
 class CSVFileParser:
-    def parse(self, content: str) -> list[dict[str, Any]]:
-        books = []
-        csv_file = StringIO(content)
-        reader = csv.DictReader(csv_file)
+    """Yields CSV rows as dicts; values are left as strings for schema validation"""
+
+    required_headers = {"title", "author_name", "genre", "published_year"}
+    _line = re.compile(r"[^\r\n]*(?:\r\n?|\n)")
+
+    async def iter_parse(self, chunks: AsyncIterable[str]) -> AsyncIterator[dict[str, Any]]:
+        fieldnames = None
+        async for values in self._iter_values(chunks):
+            if fieldnames is None:
+                if not self.required_headers.issubset(values):
+                    raise ValueError("CSV must contain title, author_name, genre, and published_year columns")
+                fieldnames = values
+            elif values:
+                yield self._to_row(fieldnames, values)
 
-        required_headers = {"title", "author_name", "genre", "published_year"}
-        if not required_headers.issubset(set(reader.fieldnames)):
+        if fieldnames is None:
             raise ValueError("CSV must contain title, author_name, genre, and published_year columns")
 
-        for row in reader:
-            row["published_year"] = int(row["published_year"])
-            books.append(row)
-        return books
+    async def _iter_values(self, chunks: AsyncIterable[str]) -> AsyncIterator[list[str]]:
+        buffer = ""
+        try:
+            async for chunk in chunks:
+                records, buffer = self._split_records(buffer + chunk)
+                for values in csv.reader(records):
+                    yield values
+            for values in csv.reader([buffer] if buffer else []):
+                yield values
+        except csv.Error as error:
+            raise ValueError(str(error))
+
+    @classmethod
+    def _split_records(cls, buffer: str) -> tuple[list[str], str]:
+        """Split off complete records; a line break inside a quoted field leaves the quote count odd"""
+        records = []
+        record_start = 0
+        quotes = 0
+        for line in cls._line.finditer(buffer):
+            quotes += line.group().count('"')
+            if quotes % 2 == 0:
+                records.append(buffer[record_start : line.end()])  # noqa
+                record_start, quotes = line.end(), 0
+        return records, buffer[record_start:]
+
+    @staticmethod
+    def _to_row(fieldnames: list[str], values: list[str]) -> dict[str, Any]:
+        # the same shape `csv.DictReader` produces for short and long rows
+        row = dict(zip(fieldnames, values))
+        for fieldname in fieldnames[len(values) :]:  # noqa
+            row[fieldname] = None
+        if len(values) > len(fieldnames):
+            row[None] = values[len(fieldnames) :]  # noqa
+        return row
+
+
+async def iter_file_text(file, chunk_size: int) -> AsyncIterator[str]:
+    """Read an (upload) file with an async `read(size)` in chunks and decode it as UTF-8 incrementally"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    while chunk := await file.read(chunk_size):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
 
 
 class FileParserFactory:
@@ -46,33 +160,198 @@ class FileParserFactory:
 
 
 class FileExporter(Protocol):
-    def export(self, data: list[dict]) -> str:
+    media_type: str
+    extension: str
+
+    def export(self, batches: AsyncIterable[list[dict]]) -> AsyncIterator[str | bytes]:
+        """Text formats yield `str`, binary ones `bytes`"""
         pass
 
 class JSONExporter(FileExporter):
-    def export(self, books_data: list[dict]) -> str:
-        return json.dumps(books_data, indent=2)
+    """Encodes a JSON array incrementally, one chunk per batch, with the same layout as `json.dumps(data, indent=2)`"""
+
+    media_type = "application/json"
+    extension = "json"
+
+    async def export(self, batches: AsyncIterable[list[dict]]) -> AsyncIterator[str]:
+        is_empty = True
+        async for books_data in batches:
+            if not books_data:
+                continue
+            items = ",\n".join(textwrap.indent(json.dumps(book, indent=2), "  ") for book in books_data)
+            yield ("[\n" if is_empty else ",\n") + items
+            is_empty = False
+        yield "[]" if is_empty else "\n]"
 
 class CSVExporter(FileExporter):
-    def export(self, data: list[dict]) -> str:
+    media_type = "text/csv"
+    extension = "csv"
+
+    async def export(self, batches: AsyncIterable[list[dict]]) -> AsyncIterator[str]:
         output = StringIO()
         writer = csv.DictWriter(
             output,
             fieldnames=["id", "title", "author_name", "genre", "published_year"],
         )
         writer.writeheader()
-        writer.writerows(data)
-        return output.getvalue()
+        async for data in batches:
+            writer.writerows(data)
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+        if output.tell():
+            yield output.getvalue()
+
+class NDJSONExporter(FileExporter):
+    """One compact JSON object per line, readable (and writable) row by row"""
+
+    media_type = "application/x-ndjson"
+    extension = "ndjson"
+
+    async def export(self, batches: AsyncIterable[list[dict]]) -> AsyncIterator[str]:
+        async for books_data in batches:
+            if books_data:
+                yield "".join(json.dumps(book, separators=(",", ":")) + "\n" for book in books_data)
+
+
+class _DrainedSink(io.RawIOBase):
+    """Write-only file whose content is taken out as it is written; `tell` still counts every byte, the Parquet
+    footer records offsets from it"""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ColumnarExporter(FileExporter, abc.ABC):
+    """Writes each batch as an Arrow record batch, yielding the encoded bytes as soon as they are written"""
+
+    schema = pa.schema(
+        [
+            ("id", pa.int64()),
+            ("title", pa.string()),
+            ("author_name", pa.string()),
+            ("genre", pa.dictionary(pa.int8(), pa.string())),
+            ("published_year", pa.int32()),
+        ]
+    )
+
+    @abc.abstractmethod
+    def _writer(self, sink: _DrainedSink):
+        """Arrow writer encoding the record batches into `sink`"""
+
+    async def export(self, batches: AsyncIterable[list[dict]]) -> AsyncIterator[bytes]:
+        sink = _DrainedSink()
+        writer = self._writer(sink)
+        async for books_data in batches:
+            if not books_data:
+                continue
+            writer.write_batch(pa.RecordBatch.from_pylist(books_data, schema=self.schema))
+            if data := sink.drain():
+                yield data
+        writer.close()
+        yield sink.drain()
+
+
+class ArrowExporter(ColumnarExporter):
+    """Arrow IPC stream format"""
+
+    media_type = "application/vnd.apache.arrow.stream"
+    extension = "arrows"
+
+    def _writer(self, sink: _DrainedSink):
+        return pa.ipc.new_stream(sink, self.schema)
+
+
+class ParquetExporter(ColumnarExporter):
+    """One row group per batch"""
+
+    media_type = "application/vnd.apache.parquet"
+    extension = "parquet"
+
+    def _writer(self, sink: _DrainedSink):
+        return pq.ParquetWriter(sink, self.schema, compression="zstd")
+
+
+class Compression(Protocol):
+    media_type: str
+    extension: str
+
+    def compressobj(self) -> Any:
+        """An object with the `compress(data)` and `flush()` of `zlib.compressobj`"""
+        pass
+
+
+class GzipCompression(Compression):
+    media_type = "application/gzip"
+    extension = "gz"
+
+    def compressobj(self) -> Any:
+        return zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+
+
+class ZstdCompression(Compression):
+    media_type = "application/zstd"
+    extension = "zst"
+
+    def compressobj(self) -> Any:
+        return zstandard.ZstdCompressor().compressobj()
+
+
+class CompressedExporter(FileExporter):
+    """Another exporter's output, compressed as it is produced"""
+
+    def __init__(self, exporter: FileExporter, compression: Compression) -> None:
+        self.exporter = exporter
+        self.compression = compression
+        self.media_type = compression.media_type
+        self.extension = f"{exporter.extension}.{compression.extension}"
+
+    async def export(self, batches: AsyncIterable[list[dict]]) -> AsyncIterator[bytes]:
+        compressor = self.compression.compressobj()
+        async for chunk in self.exporter.export(batches):
+            if data := compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk):
+                yield data
+        yield compressor.flush()
+
 
 class FileExporterFactory:
     _exporters = {
         "json": JSONExporter(),
-        "csv": CSVExporter()
+        "csv": CSVExporter(),
+        "ndjson": NDJSONExporter(),
+        "arrow": ArrowExporter(),
+        "parquet": ParquetExporter(),
     }
+    _compressions = {"gzip": GzipCompression(), "zstd": ZstdCompression()}
+
+    formats = tuple(_exporters)
+    compressions = tuple(_compressions)
 
     @classmethod
-    def get_exporter(cls, format: str) -> FileExporter:
+    def get_exporter(cls, format: str, compression: str | None = None) -> FileExporter:
         exporter = cls._exporters.get(format.lower())
         if not exporter:
-            raise ValueError("Unsupported format. Use JSON or CSV")
-        return exporter
\ No newline at end of file
+            raise ValueError(f"Unsupported format. Use one of {', '.join(cls.formats)}")
+        if compression is None:
+            return exporter
+        compression_method = cls._compressions.get(compression.lower())
+        if not compression_method:
+            raise ValueError(f"Unsupported compression. Use one of {', '.join(cls.compressions)}")
+        return CompressedExporter(exporter, compression_method)
@@ -0,0 +1,17 @@
+from cache import TwoTierCache
+from config import settings
+
+book_cache = TwoTierCache(
+    "books",
+    local_ttl=settings.BOOK_CACHE_LOCAL_TTL_SECONDS,
+    redis_ttl=settings.BOOK_CACHE_TTL_SECONDS,
+    max_size=settings.BOOK_CACHE_MAX_SIZE,
+)
+
+# `RetrieveBooksUseCase` pages, keyed by the catalog generation: never invalidated, superseded keys just expire
+listing_cache = TwoTierCache(
+    "listings",
+    local_ttl=settings.LISTING_CACHE_LOCAL_TTL_SECONDS,
+    redis_ttl=settings.LISTING_CACHE_TTL_SECONDS,
+    max_size=settings.LISTING_CACHE_MAX_SIZE,
+)
@@ -0,0 +1,72 @@
+import logging
+import time
+
+import redis.asyncio as redis
+
+from config import settings
+from repositories.base import AbstractUnitOfWork
+
+logger = logging.getLogger(__name__)
+
+# adjusts the counter only while it exists, an absent counter is recounted on the next read instead
+_INCREMENT_IF_EXISTS = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return redis.call('incrby', KEYS[1], ARGV[1])
+end
+return nil
+"""
+
+
+class BookCounter:
+    """Total number of books, initialised from an exact count and then adjusted by the book write use cases.
+
+    Kept in Redis when connected, so all workers share one counter, and per worker otherwise. The value expires
+    after `max_age` seconds and is recounted, which bounds the drift from writes made outside the application.
+    """
+
+    def __init__(self, max_age: float, key: str = "counters:books") -> None:
+        self.max_age = max_age
+        self.key = key
+        self.redis: redis.Redis | None = None
+        self._local_value = None
+        self._local_expires_at = 0.0
+
+    def connect(self, redis_connection: redis.Redis | None) -> None:
+        self.redis = redis_connection
+
+    async def get(self, uow: AbstractUnitOfWork) -> int:
+        if self.redis is not None:
+            try:
+                value = await self.redis.get(self.key)
+                if value is not None:
+                    return int(value)
+                total = await uow.books.count()
+                await self.redis.set(self.key, total, ex=int(self.max_age), nx=True)
+                return total
+            except redis.RedisError:
+                logger.warning("Could not read the book counter from Redis", exc_info=True)
+
+        if self._local_value is None or self._local_expires_at <= time.monotonic():
+            self._local_value = await uow.books.count()
+            self._local_expires_at = time.monotonic() + self.max_age
+        return self._local_value
+
+    async def add(self, delta: int) -> None:
+        if not delta:
+            return
+        if self._local_value is not None:
+            self._local_value += delta
+        if self.redis is None:
+            return
+
+        try:
+            await self.redis.eval(_INCREMENT_IF_EXISTS, 1, self.key, delta)
+        except redis.RedisError:
+            logger.warning("Could not update the book counter in Redis", exc_info=True)
+
+    def reset(self) -> None:
+        self._local_value = None
+        self._local_expires_at = 0.0
+
+
+book_counter = BookCounter(max_age=settings.BOOK_COUNT_CACHE_SECONDS)
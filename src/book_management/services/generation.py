@@ -0,0 +1,69 @@
+import logging
+import time
+
+import redis.asyncio as redis
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# the time of the write in milliseconds, or one more than the current generation when that is later
+_BUMP = """
+local generation = math.max(tonumber(redis.call('get', KEYS[1]) or '0') + 1, tonumber(ARGV[1]))
+redis.call('set', KEYS[1], string.format('%d', generation))
+return generation
+"""
+
+
+def _now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+class CatalogGeneration:
+    """Number that changes with every write to the catalog, bumped by the book write use cases.
+
+    Anything derived from the whole catalog (listing ETags, cached listing pages) is valid for as long as the
+    generation it was derived from is current. The generation is the time of the last write in milliseconds (kept
+    increasing when writes are closer than that), so it tells how long ago the catalog changed, and a counter that was
+    lost (Redis flushed, worker restarted) starts above any value it handed out before. Kept in Redis when connected,
+    so all workers share it, and per worker otherwise (a worker then does not see the writes made by the others).
+    """
+
+    def __init__(self, settle_seconds: float, key: str = "generations:catalog") -> None:
+        self.settle_seconds = settle_seconds
+        self.key = key
+        self.redis: redis.Redis | None = None
+        self._local_value = _now_ms()
+
+    def connect(self, redis_connection: redis.Redis | None) -> None:
+        self.redis = redis_connection
+
+    async def get(self) -> int:
+        if self.redis is not None:
+            try:
+                value = await self.redis.get(self.key)
+                if value is None:
+                    async with self.redis.pipeline(transaction=True) as pipeline:
+                        _, value = await pipeline.set(self.key, _now_ms(), nx=True).get(self.key).execute()
+                return int(value)
+            except redis.RedisError:
+                logger.warning("Could not read the catalog generation from Redis", exc_info=True)
+        return self._local_value
+
+    async def bump(self) -> None:
+        self._local_value = max(self._local_value + 1, _now_ms())
+        if self.redis is None:
+            return
+
+        try:
+            await self.redis.eval(_BUMP, 1, self.key, _now_ms())
+        except redis.RedisError:
+            logger.warning("Could not bump the catalog generation in Redis", exc_info=True)
+
+    def is_settled(self, generation: int) -> bool:
+        """Whether replicas have most likely caught up with the write that made `generation` current, see
+        `READ_YOUR_WRITES_SECONDS`; compares clocks of different hosts, which must be roughly in sync"""
+        return _now_ms() - generation >= self.settle_seconds * 1000
+
+
+catalog_generation = CatalogGeneration(settle_seconds=settings.READ_YOUR_WRITES_SECONDS)
@@ -0,0 +1,37 @@
+import base64
+import binascii
+import json
+from typing import Any
+
+from exceptions import ValidationError
+
+
+class CursorCodec:
+    """Opaque keyset cursor: the sort it was issued for plus the `(sort_key, id)` of the last row of a page."""
+
+    @staticmethod
+    def encode(sort_by: str, sort_value: Any, book_id: int) -> str:
+        payload = json.dumps({"sort_by": sort_by, "value": sort_value, "id": book_id}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode(cursor: str, sort_by: str, value_type: type) -> tuple[Any, int]:
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            sort_value, book_id = payload["value"], payload["id"]
+            cursor_sort_by = payload["sort_by"]
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError):
+            raise ValidationError("cursor", ["Invalid cursor"])
+
+        if not CursorCodec._is_instance(book_id, int) or not CursorCodec._is_instance(sort_value, value_type):
+            raise ValidationError("cursor", ["Invalid cursor"])
+        if cursor_sort_by != sort_by:
+            raise ValidationError("cursor", [f"Cursor was issued for sort_by '{cursor_sort_by}'"])
+
+        return sort_value, book_id
+
+    @staticmethod
+    def _is_instance(value: Any, value_type: type) -> bool:
+        # JSON `true`/`false` decode to `bool`, which `isinstance` would take for an `int`
+        return isinstance(value, value_type) and not isinstance(value, bool)
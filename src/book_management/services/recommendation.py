@@ -1,20 +1,275 @@
+import asyncio
+import time
+from typing import Any
+
 import numpy as np
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+
+from book_management.models import Genre
+from book_management.services.recommendation_backends import NeighbourBackend, create_backend
+from config import settings
+from repositories.base import AbstractUnitOfWork
 
 
 class RecommendationService:
+    """Long-lived TF-IDF index over the whole catalog.
+
+    The vectorizer is fitted once and every book is kept as an L2-normalised row of a sparse matrix, so a lookup
+    is one sparse dot product plus a top-k selection. Writes are applied incrementally: new and updated books go to a
+    small delta matrix that is merged into the main one in batches, replaced and deleted rows are masked out. Words
+    unseen at fit time are ignored by incremental updates, so the index is refitted from the database once enough
+    changes accumulate or it gets older than `max_age` (other workers' writes only show up then).
+
+    Which rows get scored is up to the `backend`: all of them, or the candidates of an approximate nearest
+    neighbour search (see `recommendation_backends`).
+    """
+
+    def __init__(
+        self,
+        refit_ratio: float = settings.RECOMMENDATION_REFIT_RATIO,
+        refit_min_changes: int = settings.RECOMMENDATION_REFIT_MIN_CHANGES,
+        max_age: float = settings.RECOMMENDATION_INDEX_MAX_AGE_SECONDS,
+        merge_threshold: int = 256,
+        backend: NeighbourBackend | None = None,
+    ) -> None:
+        self.backend = backend or create_backend(
+            settings.RECOMMENDATION_BACKEND,
+            tables=settings.RECOMMENDATION_LSH_TABLES,
+            bits=settings.RECOMMENDATION_LSH_BITS,
+            probe_radius=settings.RECOMMENDATION_LSH_PROBE_RADIUS,
+        )
+        self.refit_ratio = refit_ratio
+        self.refit_min_changes = refit_min_changes
+        self.max_age = max_age
+        self.merge_threshold = merge_threshold
+        self._build_lock = asyncio.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self._vectorizer = None
+        self._matrix = None
+        self._book_ids = np.empty(0, dtype=np.int64)
+        self._active = np.empty(0, dtype=bool)
+        self._rows = {}
+        self._delta_ids = []
+        self._delta_vectors = []
+        self._delta_active = []
+        self._changes = 0
+        self._built_at = None
+        self._replay = None
+        self.backend.build(None)
+
+    @staticmethod
+    def book_text(book: dict[str, Any]) -> str:
+        genre = book["genre"].value if isinstance(book["genre"], Genre) else book["genre"]
+        return f"{book['title']} {genre} {book['author_name']}"
+
+    @property
+    def is_built(self) -> bool:
+        return self._built_at is not None
+
+    @property
+    def is_stale(self) -> bool:
+        if not self.is_built:
+            return True
+        if self._vectorizer is None and self._changes:
+            return True
+        refit_threshold = max(self.refit_min_changes, self.refit_ratio * len(self))
+        return self._changes > refit_threshold or time.monotonic() - self._built_at > self.max_age
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, book_id: int) -> bool:
+        return book_id in self._rows
+
+    async def ensure_built(self, uow: AbstractUnitOfWork) -> None:
+        """(Re)build the index from the catalog if it has not been built yet or went stale"""
+        if not self.is_stale:
+            return
+
+        async with self._build_lock:
+            if not self.is_stale:
+                return
+
+            # writes committed until the new index is built are replayed on top of it
+            replay = self._replay = []
+            try:
+                book_ids, texts = [], []
+                async for books in uow.books.stream_all(batch_size=settings.EXPORT_BATCH_SIZE):
+                    for book in books:
+                        book_ids.append(book["id"])
+                        texts.append(self.book_text(book))
+
+                # fitting is CPU bound, keep it off the event loop
+                vectorizer, matrix = await asyncio.to_thread(self._fit, texts)
+
+                self.reset()
+                self._replay = replay
+                self._vectorizer, self._matrix = vectorizer, matrix
+                self._book_ids = np.asarray(book_ids, dtype=np.int64)
+                self._active = np.ones(len(book_ids), dtype=bool)
+                self._rows = {book_id: row for row, book_id in enumerate(book_ids)}
+                await asyncio.to_thread(self.backend.build, matrix)
+                self._built_at = time.monotonic()
+            finally:
+                self._replay = None
+
+            # no await from here on, so nothing is written between the buffer being closed and replayed
+            for action, payload in replay:
+                if action == "upsert":
+                    self.upsert_many(payload)
+                else:
+                    self.remove(payload)
+
     @staticmethod
-    def get_recommendations(target_text: str, texts: list[str], book_ids: list[int], limit: int) -> list[int]:
-        vectorizer = TfidfVectorizer()
-        tfidf_matrix = vectorizer.fit_transform(texts)
-        target_vector = vectorizer.transform([target_text])
+    def _fit(texts: list[str]) -> tuple[TfidfVectorizer | None, sparse.csr_matrix | None]:
+        if not texts:
+            return None, None
+
+        vectorizer = TfidfVectorizer(dtype=np.float32)
+        try:
+            return vectorizer, vectorizer.fit_transform(texts).tocsr()
+        except ValueError:
+            # nothing but stop words / one-letter tokens in the whole catalog
+            return None, None
+
+    def upsert_many(self, books: list[dict[str, Any]]) -> None:
+        """Add new books or replace the vectors of existing ones"""
+        if self._replay is not None:
+            self._replay.append(("upsert", books))
+        if not self.is_built or not books:
+            return
+
+        for book in books:
+            self._deactivate(book["id"])
+        self._changes += len(books)
+        if self._vectorizer is None:
+            return
+
+        vectors = self._vectorizer.transform([self.book_text(book) for book in books]).tocsr()
+        first_row = self._main_size + len(self._delta_ids)
+        for position, book in enumerate(books):
+            self._rows[book["id"]] = first_row + position
+            self._delta_ids.append(book["id"])
+            self._delta_vectors.append(vectors[position])
+            self._delta_active.append(True)
+        self.backend.add(np.arange(first_row, first_row + len(books)), vectors)
+
+        if len(self._delta_ids) >= self.merge_threshold:
+            self._merge_delta()
+
+    def upsert(self, book: dict[str, Any]) -> None:
+        self.upsert_many([book])
+
+    def remove(self, book_id: int) -> None:
+        if self._replay is not None:
+            self._replay.append(("remove", book_id))
+        if not self.is_built:
+            return
+
+        self._deactivate(book_id)
+        self._changes += 1
+
+    def set_backend(self, backend: NeighbourBackend) -> None:
+        """Switch to another neighbour backend, indexing the current rows with it"""
+        self._merge_delta()
+        backend.build(self._matrix)
+        self.backend = backend
+
+    def recommend(self, book_id: int, limit: int) -> list[int]:
+        """Ids of the `limit` books most similar to `book_id`, best first"""
+        return self.recommend_many([book_id], limit).get(book_id, [])
+
+    def recommend_many(self, book_ids: list[int], limit: int) -> dict[int, list[int]]:
+        """Recommendations for each indexed book of `book_ids`, scored in a single sparse matrix product"""
+        target_rows = {book_id: self._rows[book_id] for book_id in book_ids if book_id in self._rows}
+        if not target_rows or limit <= 0:
+            return {book_id: [] for book_id in target_rows}
+
+        queries = sparse.vstack([self._vector(row) for row in target_rows.values()], format="csr")
+        candidates = self.backend.candidates(queries)
+
+        recommendations = {}
+        if candidates is None:
+            scores = self._score(queries).tocsc()
+            for column, (book_id, row) in enumerate(target_rows.items()):
+                start, end = scores.indptr[column], scores.indptr[column + 1]
+                recommendations[book_id] = self._top_k(scores.indices[start:end], scores.data[start:end], row, limit)
+            return recommendations
+
+        for position, (book_id, row) in enumerate(target_rows.items()):
+            candidate_rows = candidates[position]
+            candidate_scores = (self._vectors(candidate_rows) @ queries[position].T).toarray().ravel()
+            recommendations[book_id] = self._top_k(candidate_rows, candidate_scores, row, limit)
+        return recommendations
+
+    def _top_k(self, candidate_rows: np.ndarray, candidate_scores: np.ndarray, row: int, limit: int) -> list[int]:
+        # the book itself is excluded by its row, so books with identical texts can still recommend each other
+        keep = self._is_active(candidate_rows) & (candidate_rows != row)
+        candidate_rows, candidate_scores = candidate_rows[keep], candidate_scores[keep]
+        if len(candidate_rows) > limit:
+            top = np.argpartition(-candidate_scores, limit - 1)[:limit]
+            candidate_rows, candidate_scores = candidate_rows[top], candidate_scores[top]
+
+        order = np.lexsort((candidate_rows, -candidate_scores))
+        return self._row_book_ids(candidate_rows[order]).tolist()
+
+    def _vector(self, row: int) -> sparse.csr_matrix:
+        if row < self._main_size:
+            return self._matrix[row]
+        return self._delta_vectors[row - self._main_size]
+
+    def _vectors(self, rows: np.ndarray) -> sparse.csr_matrix:
+        """Vectors of sorted `rows`"""
+        main_rows, delta_rows = rows[rows < self._main_size], rows[rows >= self._main_size] - self._main_size
+        return sparse.vstack(
+            [self._matrix[main_rows], *(self._delta_vectors[row] for row in delta_rows.tolist())], format="csr"
+        )
+
+    def _score(self, vectors: sparse.csr_matrix) -> sparse.csr_matrix:
+        """Cosine similarity of every indexed row (main rows first, then delta rows) to each of `vectors`"""
+        scores = self._matrix @ vectors.T
+        if self._delta_vectors:
+            scores = sparse.vstack([scores, sparse.vstack(self._delta_vectors) @ vectors.T])
+        return scores
+
+    def _is_active(self, rows: np.ndarray) -> np.ndarray:
+        is_main = rows < self._main_size
+        active = np.empty(len(rows), dtype=bool)
+        active[is_main] = self._active[rows[is_main]]
+        active[~is_main] = np.asarray(self._delta_active, dtype=bool)[rows[~is_main] - self._main_size]
+        return active
+
+    def _row_book_ids(self, rows: np.ndarray) -> np.ndarray:
+        is_main = rows < self._main_size
+        book_ids = np.empty(len(rows), dtype=np.int64)
+        book_ids[is_main] = self._book_ids[rows[is_main]]
+        book_ids[~is_main] = np.asarray(self._delta_ids, dtype=np.int64)[rows[~is_main] - self._main_size]
+        return book_ids
+
+    @property
+    def _main_size(self) -> int:
+        return len(self._book_ids)
+
+    def _deactivate(self, book_id: int) -> None:
+        row = self._rows.pop(book_id, None)
+        if row is None:
+            return
+        if row < self._main_size:
+            self._active[row] = False
+        else:
+            self._delta_active[row - self._main_size] = False
+
+    def _merge_delta(self) -> None:
+        if not self._delta_ids:
+            return
 
-        similarities = cosine_similarity(target_vector, tfidf_matrix).flatten()
+        self._matrix = sparse.vstack([self._matrix, *self._delta_vectors], format="csr")
+        self._book_ids = np.concatenate([self._book_ids, np.asarray(self._delta_ids, dtype=np.int64)])
+        self._active = np.concatenate([self._active, np.asarray(self._delta_active, dtype=bool)])
+        self._delta_ids, self._delta_vectors, self._delta_active = [], [], []
 
-        similar_indices = np.argsort(similarities)[::-1]
-        similar_indices = [index for index in similar_indices if book_ids[index] != book_ids[texts.index(target_text)]][
-            :limit
-        ]
 
-        return [book_ids[index] for index in similar_indices]
+recommendation_service = RecommendationService()
@@ -0,0 +1,164 @@
+from typing import Protocol
+
+import numpy as np
+from scipy import sparse
+
+
+# never a `(table, code)` key: codes have at most 32 bits and there are far fewer than 2 ** 32 tables
+_NO_KEY = np.iinfo(np.uint64).max
+
+
+class NeighbourBackend(Protocol):
+    """Narrows down which rows of the recommendation index are scored for a query"""
+
+    def build(self, matrix: sparse.csr_matrix | None) -> None:
+        pass
+
+    def add(self, rows: np.ndarray, vectors: sparse.csr_matrix) -> None:
+        pass
+
+    def candidates(self, queries: sparse.csr_matrix) -> list[np.ndarray] | None:
+        pass
+
+
+class ExactBackend:
+    """Scores every row: exact results, cost linear in the catalog size"""
+
+    def build(self, matrix: sparse.csr_matrix | None) -> None:
+        pass
+
+    def add(self, rows: np.ndarray, vectors: sparse.csr_matrix) -> None:
+        pass
+
+    def candidates(self, queries: sparse.csr_matrix) -> list[np.ndarray] | None:
+        return None
+
+
+class RandomProjectionLSH:
+    """Sign random projection (SimHash) LSH over the TF-IDF vectors.
+
+    Each of `tables` hash tables keys a row by the signs of `bits` random projections, rows sharing a key with the
+    query in any table become candidates, and only those are scored exactly. More tables and probing keys within
+    Hamming distance `probe_radius` (0 or 1) raise recall, more bits make buckets smaller and lookups faster.
+    The projection planes are never stored: the ±1 weight of a (feature, plane) pair is derived from a hash of
+    both, so memory does not grow with the vocabulary.
+
+    The buckets of all tables are one CSR-style index: sorted `(table, code)` keys, each with the range of its rows,
+    so the buckets of every probe of every table are found with a single `searchsorted`.
+    """
+
+    _chunk_size = 20_000
+
+    def __init__(self, tables: int = 16, bits: int = 14, probe_radius: int = 1, seed: int = 0) -> None:
+        if not 1 <= bits <= 32:
+            raise ValueError("bits must be between 1 and 32")
+        if probe_radius not in (0, 1):
+            raise ValueError("probe_radius must be 0 or 1")
+
+        self.tables = tables
+        self.bits = bits
+        self.probe_radius = probe_radius
+        self._plane_seeds = (np.arange(tables * bits, dtype=np.uint64) + np.uint64(seed)) * np.uint64(
+            0xD1B54A32D192ED03
+        )
+        self._bit_weights = np.left_shift(np.uint32(1), np.arange(bits, dtype=np.uint32))
+        # XOR-ed into a code to get the keys probed for it: the code itself, then each single bit flipped
+        self._probe_masks = np.append(
+            np.uint64(0), np.left_shift(np.uint64(1), np.arange(bits * probe_radius, dtype=np.uint64))
+        )
+        self._table_keys = np.left_shift(np.arange(tables, dtype=np.uint64), np.uint64(bits))
+        self.build(None)
+
+    def build(self, matrix: sparse.csr_matrix | None) -> None:
+        # an empty bucket past every key, so that `searchsorted` never points beyond the index
+        self._bucket_keys = np.array([_NO_KEY], dtype=np.uint64)
+        self._bucket_starts = np.zeros(2, dtype=np.int64)
+        self._bucket_rows = np.empty(0, dtype=np.int32)
+        self._extra_buckets = {}
+        # scratch space of `candidates`, one slot per row
+        self._seen = np.empty(0 if matrix is None else matrix.shape[0], dtype=np.int64)
+        if matrix is None or not matrix.shape[0]:
+            return
+
+        codes = np.vstack(
+            [
+                self._codes(matrix[start : start + self._chunk_size])  # noqa
+                for start in range(0, matrix.shape[0], self._chunk_size)
+            ]
+        )
+        keys = self._keys(codes).ravel()
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        is_first = np.empty(len(sorted_keys), dtype=bool)
+        is_first[0], is_first[1:] = True, sorted_keys[1:] != sorted_keys[:-1]
+        self._bucket_keys = np.append(sorted_keys[is_first], np.uint64(_NO_KEY))
+        self._bucket_starts = np.append(np.flatnonzero(is_first), [len(sorted_keys), len(sorted_keys)])
+        # every row is in `tables` buckets, so this is by far the biggest array: int32 halves it
+        self._bucket_rows = (order // self.tables).astype(np.int32)
+
+    def add(self, rows: np.ndarray, vectors: sparse.csr_matrix) -> None:
+        """Rows added after `build` go to a small dict of buckets until the next build"""
+        for row, row_keys in zip(rows.tolist(), self._keys(self._codes(vectors))):
+            for key in row_keys.tolist():
+                self._extra_buckets.setdefault(key, []).append(row)
+
+    def candidates(self, queries: sparse.csr_matrix) -> list[np.ndarray] | None:
+        probe_keys = (self._keys(self._codes(queries))[:, :, None] ^ self._probe_masks).reshape(queries.shape[0], -1)
+        buckets = np.searchsorted(self._bucket_keys, probe_keys)
+        found = self._bucket_keys[buckets] == probe_keys
+        return [
+            self._bucket_candidates(query_buckets[query_found], query_keys)
+            for query_buckets, query_found, query_keys in zip(buckets, found, probe_keys)
+        ]
+
+    def _bucket_candidates(self, buckets: np.ndarray, probe_keys: np.ndarray) -> np.ndarray:
+        """Sorted distinct rows of the `buckets` of the index and of the extra buckets of `probe_keys`"""
+        starts = self._bucket_starts[buckets]
+        sizes = self._bucket_starts[buckets + 1] - starts
+        # the positions of all the buckets' rows in `_bucket_rows`, range after range
+        rows = self._bucket_rows[np.arange(sizes.sum()) + np.repeat(starts - np.cumsum(sizes) + sizes, sizes)]
+        if self._extra_buckets:
+            extra = [row for key in probe_keys.tolist() for row in self._extra_buckets.get(key, ())]
+            rows = np.append(rows, np.asarray(extra, dtype=np.int64))
+        if not len(rows):
+            return rows
+
+        # a row found through several tables is kept at one of its positions: whichever position the scratch slot
+        # of the row ends up holding, it matches exactly one of them
+        if rows.max() >= len(self._seen):
+            self._seen = np.empty(max(rows.max() + 1, 2 * len(self._seen)), dtype=np.int64)
+        positions = np.arange(len(rows))
+        self._seen[rows] = positions
+        return np.sort(rows[self._seen[rows] == positions])
+
+    def _keys(self, codes: np.ndarray) -> np.ndarray:
+        """`(table, code)` keys of `codes` as returned by `_codes`"""
+        return codes.astype(np.uint64) | self._table_keys
+
+    def _codes(self, vectors: sparse.csr_matrix) -> np.ndarray:
+        """`tables` codes of `bits` bits for every row of `vectors`"""
+        vectors = sparse.csr_matrix(vectors)
+        features = np.unique(vectors.indices)
+        if not len(features):
+            return np.zeros((vectors.shape[0], self.tables), dtype=np.uint32)
+
+        # splitmix64 finalizer over (feature, plane): its lowest bit is the sign of that plane's weight
+        hashed = features.astype(np.uint64)[:, None] * np.uint64(0x9E3779B97F4A7C15) ^ self._plane_seeds[None, :]
+        hashed ^= hashed >> np.uint64(30)
+        hashed *= np.uint64(0xBF58476D1CE4E5B9)
+        hashed ^= hashed >> np.uint64(27)
+        hashed *= np.uint64(0x94D049BB133111EB)
+        hashed ^= hashed >> np.uint64(31)
+        planes = np.where(hashed & np.uint64(1), np.float32(1), np.float32(-1))
+
+        projections = vectors[:, features] @ planes
+        signs = (projections > 0).reshape(vectors.shape[0], self.tables, self.bits)
+        return (signs * self._bit_weights).sum(axis=2, dtype=np.uint32)
+
+
+def create_backend(name: str, tables: int, bits: int, probe_radius: int) -> NeighbourBackend:
+    if name == "exact":
+        return ExactBackend()
+    if name == "lsh":
+        return RandomProjectionLSH(tables=tables, bits=bits, probe_radius=probe_radius)
+    raise ValueError(f"Unknown recommendation backend '{name}'. Use 'exact' or 'lsh'")
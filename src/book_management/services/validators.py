@@ -1,9 +1,13 @@
-from exceptions import InvalidSortParameterError
+from book_management.models import Genre
+from config import settings
+from exceptions import InvalidSortParameterError, ValidationError
 
 
 class BookQueryValidator:
     _valid_fields = ["title", "published_year", "author"]
     _valid_directions = ["asc", "desc"]
+    _valid_count_strategies = ["exact", "estimated", "cached"]
+    _valid_genres = [genre.value for genre in Genre]
 
     @staticmethod
     def parse_sort_by(sort_by: str) -> tuple[str, str]:
@@ -17,3 +21,46 @@ class BookQueryValidator:
             return field, direction
         except ValueError:
             raise InvalidSortParameterError()
+
+    @staticmethod
+    def validate_count(count: str) -> str:
+        if count not in BookQueryValidator._valid_count_strategies:
+            raise ValidationError(
+                "count",
+                [f"Invalid count '{count}', use one of {', '.join(BookQueryValidator._valid_count_strategies)}"],
+            )
+        return count
+
+    @staticmethod
+    def validate_filters(
+        genre: str | None = None,
+        year_from: int | None = None,
+        year_to: int | None = None,
+        author: str | None = None,
+        author_id: int | None = None,
+    ) -> dict:
+        """The filters that were given, keyed as `BooksRepository.get_all` expects them"""
+        if genre is not None and genre not in BookQueryValidator._valid_genres:
+            raise ValidationError(
+                "genre", [f"Invalid genre '{genre}', use one of {', '.join(BookQueryValidator._valid_genres)}"]
+            )
+        if year_from is not None and year_to is not None and year_from > year_to:
+            raise ValidationError("year_from", [f"year_from {year_from} is after year_to {year_to}"])
+        if author is not None and not author.strip():
+            raise ValidationError("author", ["Author must not be empty"])
+        if author_id is not None and author_id < 1:
+            raise ValidationError("author_id", [f"Invalid author_id {author_id}"])
+
+        filters = {"genre": genre, "year_from": year_from, "year_to": year_to, "author": author, "author_id": author_id}
+        return {key: value for key, value in filters.items() if value is not None}
+
+    @staticmethod
+    def validate_search(query: str, limit: int) -> str:
+        query = query.strip()
+        if not query:
+            raise ValidationError("q", ["Search query must not be empty"])
+        if len(query) > settings.SEARCH_QUERY_MAX_LENGTH:
+            raise ValidationError("q", [f"Search query must be at most {settings.SEARCH_QUERY_MAX_LENGTH} characters"])
+        if not 1 <= limit <= settings.SEARCH_MAX_LIMIT:
+            raise ValidationError("limit", [f"Limit must be between 1 and {settings.SEARCH_MAX_LIMIT}"])
+        return query
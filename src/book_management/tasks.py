@@ -0,0 +1,75 @@
+import asyncio
+import logging
+
+import redis.asyncio as redis
+
+import dependencies
+from book_management.services.counter import book_counter
+from book_management.services.generation import catalog_generation
+from book_management.use_cases.books import ImportBooksChunkUseCase, RunExportJobUseCase, RunImportJobUseCase
+from config import settings
+from repositories.fake.containers import FakeUnitOfWork
+from repositories.postgres.container import PostgresUnitOfWork
+from worker import app
+
+logger = logging.getLogger(__name__)
+
+_loop: asyncio.AbstractEventLoop | None = None
+# eager tasks scheduled on the application's event loop, referenced until they are done
+_background: set[asyncio.Task] = set()
+
+
+def _worker_loop() -> asyncio.AbstractEventLoop:
+    """Event loop of a worker process, kept for its lifetime since the engine's connections are bound to it"""
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+        # the application lifespan does not run in workers
+        redis_connection = redis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
+        book_counter.connect(redis_connection)
+        catalog_generation.connect(redis_connection)
+    return _loop
+
+
+def _forget(task: asyncio.Task) -> None:
+    _background.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Background task failed", exc_info=task.exception())
+
+
+def _run(coroutine) -> None:
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _worker_loop().run_until_complete(coroutine)
+        return
+
+    # eager mode, called from the application's event loop: the request does not wait for the task
+    task = loop.create_task(coroutine)
+    _background.add(task)
+    task.add_done_callback(_forget)
+
+
+def _unit_of_work():
+    if dependencies.memory_database is not None:
+        return FakeUnitOfWork(dependencies.memory_database)
+    return PostgresUnitOfWork(dependencies.engine)
+
+
+@app.task
+def run_import_job(job_id: str, path: str, filename: str) -> None:
+    use_case = RunImportJobUseCase(_unit_of_work(), dispatch=import_books_chunk.delay)
+    _run(use_case(job_id, path, filename, batch_size=settings.IMPORT_BATCH_SIZE))
+
+
+@app.task
+def import_books_chunk(job_id: str, chunk_index: int, rows: list) -> None:
+    use_case = ImportBooksChunkUseCase(_unit_of_work())
+    _run(use_case(job_id, chunk_index, rows, max_failures=settings.IMPORT_JOB_MAX_FAILURES))
+
+
+@app.task
+def run_export_job(job_id: str, format: str, filters: dict, compression: str | None = None) -> None:
+    use_case = RunExportJobUseCase(_unit_of_work())
+    _run(use_case(job_id, format, filters, compression))
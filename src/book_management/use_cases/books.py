@@ -1,12 +1,30 @@
-from typing import Any
+import contextlib
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any, AsyncIterable, AsyncIterator, Callable
+
+import aiofiles
+from pydantic import ValidationError as PydanticValidationError
 
 from book_management.models import Genre
-from book_management.services.books import FileExporterFactory
-from book_management.services.recommendation import RecommendationService
+from book_management.schemas.books import BookCreateSchema
+from book_management.services.books import FileExporterFactory, FileParserFactory, iter_file_text
+from book_management.services.cache import book_cache, listing_cache
+from book_management.services.counter import book_counter
+from book_management.services.generation import catalog_generation
+from book_management.services.pagination import CursorCodec
+from book_management.services.recommendation import recommendation_service
 from book_management.services.validators import BookQueryValidator
-from exceptions import DoesNotExistError
+from config import settings
+from exceptions import DoesNotExistError, NotReadyError
 from repositories.base import AbstractUnitOfWork
 
+logger = logging.getLogger(__name__)
+
 
 class BaseBooksUseCase:
     def __init__(self, uow: AbstractUnitOfWork) -> None:
@@ -14,15 +32,128 @@ class BaseBooksUseCase:
 
 
 class RetrieveBooksUseCase(BaseBooksUseCase):
-    async def __call__(self, page: int, per_page: int, sort_by: str) -> list[dict[str, Any]]:
+    _sort_keys = {"title": ("title", str), "published_year": ("published_year", int), "author": ("author_name", str)}
+
+    async def __call__(
+        self,
+        page: int,
+        per_page: int,
+        sort_by: str,
+        cursor: str | None = None,
+        count: str | None = None,
+        filters: dict | None = None,
+    ) -> dict[str, Any]:
+        return await self.retrieve(page, per_page, **self.parse(sort_by, cursor, count, filters))
+
+    def parse(
+        self, sort_by: str, cursor: str | None = None, count: str | None = None, filters: dict | None = None
+    ) -> dict[str, Any]:
+        """Validated listing parameters, the keyword arguments of `retrieve`"""
+        field, direction = BookQueryValidator.parse_sort_by(sort_by)
+        if count is not None:
+            BookQueryValidator.validate_count(count)
+        filters = BookQueryValidator.validate_filters(**(filters or {}))
+        after = None
+        if cursor:
+            after = CursorCodec.decode(cursor, sort_by=f"{field}:{direction}", value_type=self._sort_keys[field][1])
+        return {
+            "field": field,
+            "direction": direction,
+            "cursor": cursor,
+            "after": after,
+            "count": count,
+            "filters": filters,
+        }
+
+    async def retrieve(
+        self,
+        page: int,
+        per_page: int,
+        field: str,
+        direction: str,
+        cursor: str | None,
+        after: tuple | None,
+        count: str | None,
+        filters: dict,
+    ) -> dict[str, Any]:
+        # pages are cached per catalog generation, a write moves every listing on to new keys. The generation is
+        # read first: a write in between makes the cached page newer than its key, never older
+        generation = await catalog_generation.get()
+        load = partial(self._retrieve, page, per_page, field, direction, after, count, filters)
+        # a replica may not have the last write yet, what it returns must not be cached as the current page
+        if self.uow.reads_replicas and not catalog_generation.is_settled(generation):
+            return await load()
+
+        key = json.dumps(
+            [generation, field, direction, cursor or page, per_page, count, filters], sort_keys=True, default=str
+        )
+        return await listing_cache.get_or_load(key, load)
+
+    async def _retrieve(
+        self,
+        page: int,
+        per_page: int,
+        field: str,
+        direction: str,
+        after: tuple | None,
+        count: str | None,
+        filters: dict,
+    ) -> dict[str, Any]:
         async with self.uow:
-            field, direction = BookQueryValidator.parse_sort_by(sort_by)
-
-            offset = (page - 1) * per_page
+            offset = 0 if after is not None else (page - 1) * per_page
             books_data = await self.uow.books.get_all(
-                offset=offset, limit=per_page, sort_field=field, sort_direction=direction
+                offset=offset, limit=per_page, sort_field=field, sort_direction=direction, after=after, filters=filters
             )
 
+            # `get_all` selects exactly the fields of a listed book
+            book_list = [dict(book) for book in books_data]
+
+            next_cursor = None
+            if book_list and len(book_list) == per_page:
+                last_book = book_list[-1]
+                sort_key = self._sort_keys[field][0]
+                next_cursor = CursorCodec.encode(f"{field}:{direction}", last_book[sort_key], last_book["id"])
+
+            total, total_is_estimate = None, False
+            if count is not None:
+                total, total_is_estimate = await self._count(count, filters)
+
+            return {
+                "books": book_list,
+                "next_cursor": next_cursor,
+                "total": total,
+                "total_is_estimate": total_is_estimate,
+            }
+
+    async def _count(self, strategy: str, filters: dict) -> tuple[int, bool]:
+        # the estimate and the cached counter are for the whole table only
+        if filters:
+            return await self.uow.books.count(filters), False
+
+        if strategy == "estimated":
+            estimate = await self.uow.books.estimate_count()
+            # the estimate is missing (-1) or coarse for small tables, which are cheap to count exactly anyway
+            if estimate >= settings.BOOK_COUNT_EXACT_BELOW:
+                return estimate, True
+        elif strategy == "cached":
+            return await book_counter.get(self.uow), True
+
+        return await self.uow.books.count(), False
+
+
+class SearchBooksUseCase(BaseBooksUseCase):
+    async def __call__(self, query: str, limit: int = 20, cursor: str | None = None) -> dict[str, Any]:
+        async with self.uow:
+            query = BookQueryValidator.validate_search(query, limit)
+            # the cursor is only valid for the query it was issued for
+            after = CursorCodec.decode(cursor, sort_by=f"search:{query}", value_type=float) if cursor else None
+
+            # typo tolerance needs pg_trgm, without it only whole words match
+            fuzzy = await self.uow.books.has_extension("pg_trgm")
+            if fuzzy:
+                await self.uow.books.set_similarity_threshold(settings.SEARCH_SIMILARITY_THRESHOLD)
+            books_data = await self.uow.books.search(query, limit=limit, fuzzy=fuzzy, after=after)
+
             book_list = [
                 {
                     "id": book["id"],
@@ -33,7 +164,13 @@ class RetrieveBooksUseCase(BaseBooksUseCase):
                 }
                 for book in books_data
             ]
-            return book_list
+
+            next_cursor = None
+            if books_data and len(books_data) == limit:
+                last_book = books_data[-1]
+                next_cursor = CursorCodec.encode(f"search:{query}", last_book["rank"], last_book["id"])
+
+            return {"books": book_list, "next_cursor": next_cursor}
 
 
 class CreateBookUseCase(BaseBooksUseCase):
@@ -54,7 +191,7 @@ class CreateBookUseCase(BaseBooksUseCase):
                 }
             )
 
-            return {
+            created_book = {
                 "id": book.id,
                 "title": book.title,
                 "author_name": author.name,
@@ -62,9 +199,17 @@ class CreateBookUseCase(BaseBooksUseCase):
                 "published_year": book.published_year,
             }
 
+        await book_counter.add(1)
+        await catalog_generation.bump()
+        recommendation_service.upsert(created_book)
+        return created_book
+
 
 class RetrieveBookUseCase(BaseBooksUseCase):
     async def __call__(self, book_id: int) -> dict[str, Any] | None:
+        return await book_cache.get_or_load(book_id, lambda: self._retrieve(book_id))
+
+    async def _retrieve(self, book_id: int) -> dict[str, Any]:
         async with self.uow:
             book = await self.uow.books.retrieve(book_id)
 
@@ -77,6 +222,7 @@ class RetrieveBookUseCase(BaseBooksUseCase):
                 "author_name": book.author_name,
                 "genre": book.genre,
                 "published_year": book.published_year,
+                "version": book.version,
             }
 
 
@@ -95,14 +241,20 @@ class UpdateBookUseCase(BaseBooksUseCase):
             if not updated_book:
                 raise DoesNotExistError()
 
-            return {
+            updated_book_data = {
                 "id": updated_book.id,
                 "title": updated_book.title,
                 "author_name": author.name,
                 "genre": updated_book.genre,
                 "published_year": updated_book.published_year,
+                "version": updated_book.version,
             }
 
+        await book_cache.invalidate(book_id)
+        await catalog_generation.bump()
+        recommendation_service.upsert(updated_book_data)
+        return updated_book_data
+
 
 class DeleteBookUseCase(BaseBooksUseCase):
     async def __call__(self, book_id: int) -> None:
@@ -114,88 +266,494 @@ class DeleteBookUseCase(BaseBooksUseCase):
 
             await self.uow.books.delete(book.id)
 
+        await book_cache.invalidate(book_id)
+        await book_counter.add(-1)
+        await catalog_generation.bump()
+        recommendation_service.remove(book_id)
+
 
 class BulkImportBooksUseCase(BaseBooksUseCase):
+    def _bulk_create(self, repository, data: list[dict]):
+        # COPY has a fixed setup cost but no bind parameter limit, so it only pays off for large batches
+        if len(data) >= settings.BULK_COPY_THRESHOLD:
+            return repository.bulk_copy(data)
+        return repository.bulk_create(data)
+
     async def __call__(self, valid_books: list) -> dict[str, Any]:
         async with self.uow:
-            if not valid_books:
-                return {
-                    "successful": 0,
+            imported_books, author_names_by_id = await self._create(valid_books)
+
+        await self._after_commit(imported_books, author_names_by_id)
+        return {
+            "successful": len(imported_books),
+        }
+
+    async def _create(self, valid_books: list) -> tuple[list, dict[int, str]]:
+        """Creates the books and their missing authors, in the open transaction"""
+        if not valid_books:
+            return [], {}
+
+        author_names = {book_data["author_name"] for book_data in valid_books}
+        existing_authors = await self.uow.authors.retrieve_by_names(author_names)
+        author_map = {author.name: author for author in existing_authors}
+
+        new_author_names = author_names - set(author_map.keys())
+        if new_author_names:
+            new_authors = await self._bulk_create(self.uow.authors, [{"name": name} for name in new_author_names])
+            author_map.update({author.name: author for author in new_authors})
+
+        books_to_create = [
+            {
+                "title": book_data["title"],
+                "author_id": author_map[book_data["author_name"]].id,
+                "genre": book_data["genre"],
+                "published_year": book_data["published_year"],
+            }
+            for book_data in valid_books
+        ]
+        imported_books = await self._bulk_create(self.uow.books, books_to_create)
+        return imported_books, {author.id: author.name for author in author_map.values()}
+
+    async def _after_commit(self, imported_books: list, author_names_by_id: dict[int, str]) -> None:
+        if not imported_books:
+            return
+
+        await book_counter.add(len(imported_books))
+        await catalog_generation.bump()
+        recommendation_service.upsert_many(
+            [
+                {
+                    "id": book.id,
+                    "title": book.title,
+                    "author_name": author_names_by_id[book.author_id],
+                    "genre": book.genre,
+                    "published_year": book.published_year,
                 }
+                for book in imported_books
+            ]
+        )
+
+
+class ImportBooksFileUseCase(BaseBooksUseCase):
+    """Validates parsed rows and imports them in batches, each batch in its own transaction.
+
+    A parsing error stops the import but does not undo the batches already committed: the rows read up to it are
+    imported and counted as usual, and the result carries the `error`.
+    """
+
+    async def __call__(self, books_data: AsyncIterable[Any], batch_size: int) -> dict[str, Any]:
+        bulk_import = BulkImportBooksUseCase(self.uow)
+        total_items = successful = 0
+        failed_info = []
+        valid_books = []
+        file_error = None
+
+        rows = aiter(books_data)
+        while True:
+            # only the parsing is guarded, a `ValueError` of the import itself is not a file error
+            try:
+                book_data = await anext(rows)
+            except StopAsyncIteration:
+                break
+            except ValueError as parse_error:
+                file_error = f"File parsing error: {str(parse_error)}"
+                break
+
+            total_items += 1
+            try:
+                valid_books.append(BookCreateSchema.model_validate(book_data).model_dump())
+            except PydanticValidationError as error:
+                failed_info.append({"data": book_data, "error": str(error)})
+
+            if len(valid_books) >= batch_size:
+                result = await bulk_import(valid_books)
+                successful += result["successful"]
+                valid_books = []
+
+        if valid_books:
+            result = await bulk_import(valid_books)
+            successful += result["successful"]
+
+        return {
+            "total_items": total_items,
+            "successful": successful,
+            "failed": len(failed_info),
+            "failed_info": failed_info,
+            "error": file_error,
+        }
+
+
+def _import_job_data(job) -> dict[str, Any]:
+    return {
+        "id": job.id,
+        "status": job.status,
+        "filename": job.filename,
+        "total_items": job.total_items,
+        "processed": job.successful + job.failed,
+        "successful": job.successful,
+        "failed": job.failed,
+        "failed_info": job.failed_info,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+
+
+class CreateImportJobUseCase(BaseBooksUseCase):
+    """Spools an upload to `IMPORT_SPOOL_DIR` and queues it, the file is parsed and imported by the workers"""
+
+    def __init__(self, uow: AbstractUnitOfWork, enqueue: Callable[[str, str, str], Any]) -> None:
+        super().__init__(uow)
+        self.enqueue = enqueue
+
+    async def __call__(self, file, chunk_size: int) -> dict[str, Any]:
+        # an unsupported file is rejected now rather than failing the job later
+        FileParserFactory.get_parser(file.filename)
+
+        job_id = uuid.uuid4().hex
+        os.makedirs(settings.IMPORT_SPOOL_DIR, exist_ok=True)
+        path = os.path.join(settings.IMPORT_SPOOL_DIR, job_id)
+        async with aiofiles.open(path, "wb") as spool:
+            while chunk := await file.read(chunk_size):
+                await spool.write(chunk)
 
-            author_names = {book_data["author_name"] for book_data in valid_books}
-            existing_authors = await self.uow.authors.retrieve_by_names(author_names)
-            author_map = {author.name: author for author in existing_authors}
+        async with self.uow:
+            job = await self.uow.import_jobs.create({"id": job_id, "filename": file.filename})
 
-            new_author_names = author_names - set(author_map.keys())
-            if new_author_names:
-                new_authors = await self.uow.authors.bulk_create([{"name": name} for name in new_author_names])
-                author_map.update({author.name: author for author in new_authors})
+        try:
+            self.enqueue(job_id, path, file.filename)
+        except Exception:
+            async with self.uow:
+                await self.uow.import_jobs.fail(job_id, "The job could not be queued")
+            os.remove(path)
+            raise
+        return _import_job_data(job)
 
-            books_to_create = [
-                {
-                    "title": book_data["title"],
-                    "author_id": author_map[book_data["author_name"]].id,
-                    "genre": book_data["genre"],
-                    "published_year": book_data["published_year"],
-                }
-                for book_data in valid_books
-            ]
-            imported_books = await self.uow.books.bulk_create(books_to_create)
 
-            return {
-                "successful": len(imported_books),
-            }
+class RetrieveImportJobUseCase(BaseBooksUseCase):
+    async def __call__(self, job_id: str) -> dict[str, Any]:
+        async with self.uow:
+            job = await self.uow.import_jobs.retrieve(job_id)
+            if not job:
+                raise DoesNotExistError(f"Import job with id {job_id} does not exist")
+            return _import_job_data(job)
 
 
-class ExportBooksUseCase(BaseBooksUseCase):
-    async def __call__(self, format: str):
+class RunImportJobUseCase(BaseBooksUseCase):
+    """Parses a spooled file and hands its rows to `dispatch` in numbered chunks, which import them in parallel
+
+    The job completes once the file is parsed and every dispatched chunk is recorded, in whichever order that happens.
+    Run again for the same job (its task redelivered after a worker was lost), the file is parsed again and the chunks
+    dispatched again: those already recorded are not applied twice.
+    """
+
+    def __init__(self, uow: AbstractUnitOfWork, dispatch: Callable[[str, int, list], Any]) -> None:
+        super().__init__(uow)
+        self.dispatch = dispatch
+
+    async def __call__(self, job_id: str, path: str, filename: str, batch_size: int) -> None:
+        async with self.uow:
+            job = await self.uow.import_jobs.retrieve(job_id)
+            # parsed, or failed, by an earlier run, the spool file is no longer needed
+            if job is None or job.status == "failed" or job.chunks_total is not None:
+                self._remove_spool(path)
+                return
+            await self.uow.import_jobs.start(job_id)
+
+        total_items = chunks_total = 0
+        try:
+            parser = FileParserFactory.get_parser(filename)
+            async with aiofiles.open(path, "rb") as file:
+                rows = []
+                async for book_data in parser.iter_parse(iter_file_text(file, settings.IMPORT_CHUNK_SIZE)):
+                    total_items += 1
+                    rows.append(book_data)
+                    if len(rows) >= batch_size:
+                        self.dispatch(job_id, chunks_total, rows)
+                        chunks_total += 1
+                        rows = []
+                if rows:
+                    self.dispatch(job_id, chunks_total, rows)
+                    chunks_total += 1
+        except Exception as error:
+            # chunks dispatched before the error are still imported, as with `ImportBooksFileUseCase`
+            if isinstance(error, ValueError):
+                message = f"File parsing error: {str(error)}"
+            else:
+                logger.exception("Import job %s failed", job_id)
+                message = str(error)
+            async with self.uow:
+                await self.uow.import_jobs.fail(job_id, message)
+            self._remove_spool(path)
+            return
+
         async with self.uow:
-            books = await self.uow.books.get_all(offset=0, limit=1000)
+            await self.uow.import_jobs.finish_parsing(job_id, chunks_total=chunks_total, total_items=total_items)
+        # removed only now: a run lost before this point parses the file again
+        self._remove_spool(path)
+
+    @staticmethod
+    def _remove_spool(path: str) -> None:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
+class _ChunkAlreadyRecorded(Exception):
+    """Rolls back a chunk delivered again after it was applied"""
+
+
+class ImportBooksChunkUseCase(BulkImportBooksUseCase):
+    """Validates and imports one chunk of an import job, recorded on the job in the same transaction, so a chunk is
+    applied once however many times it is delivered"""
+
+    attempts = 3
+
+    async def __call__(self, job_id: str, chunk_index: int, rows: list, max_failures: int) -> None:
+        valid_books, failed_info = [], []
+        for book_data in rows:
+            try:
+                valid_books.append(BookCreateSchema.model_validate(book_data).model_dump())
+            except PydanticValidationError as error:
+                failed_info.append({"data": book_data, "error": str(error)})
+
+        try:
+            imported = await self._import(job_id, chunk_index, valid_books, failed_info, max_failures)
+        except Exception as error:
+            logger.exception("Could not import chunk %s of import job %s", chunk_index, job_id)
+            failed_info += [{"data": book_data, "error": str(error)} for book_data in valid_books]
+            async with self.uow:
+                await self.uow.import_jobs.record_chunk(job_id, chunk_index, 0, failed_info, max_failures)
+            return
+
+        if imported is not None:
+            await self._after_commit(*imported)
+
+    async def _import(
+        self, job_id: str, chunk_index: int, valid_books: list, failed_info: list, max_failures: int
+    ) -> tuple[list, dict[int, str]] | None:
+        """The imported books and their authors' names, None when the chunk had already been recorded"""
+        for attempt in range(1, self.attempts + 1):
+            try:
+                async with self.uow:
+                    imported_books, author_names_by_id = await self._create(valid_books)
+                    recorded = await self.uow.import_jobs.record_chunk(
+                        job_id, chunk_index, len(imported_books), failed_info, max_failures
+                    )
+                    if not recorded:
+                        raise _ChunkAlreadyRecorded()
+                return imported_books, author_names_by_id
+            except _ChunkAlreadyRecorded:
+                return None
+            except self.uow.conflict_errors:
+                # chunks running in parallel may create the same new author, the retry finds it
+                if attempt == self.attempts:
+                    raise
 
-            books_data = [
+
+class ExportBooksUseCase(BaseBooksUseCase):
+    async def __call__(
+        self, format: str, filters: dict | None = None, compression: str | None = None
+    ) -> AsyncIterator[str | bytes]:
+        exporter = FileExporterFactory.get_exporter(format, compression)
+        # validated up front, errors must surface before the response starts streaming
+        filters = BookQueryValidator.validate_filters(**(filters or {}))
+        return exporter.export(self._iter_books_data(filters))
+
+    async def _iter_books_data(self, filters: dict) -> AsyncIterator[list[dict[str, Any]]]:
+        # the unit of work stays open while the response is being streamed
+        async with self.uow:
+            async for books in self.uow.books.stream_all(batch_size=settings.EXPORT_BATCH_SIZE, filters=filters):
+                yield [
+                    {
+                        "id": book["id"],
+                        "title": book["title"],
+                        "author_name": book["author_name"],
+                        "genre": book["genre"].value if isinstance(book["genre"], Genre) else book["genre"],
+                        "published_year": book["published_year"],
+                    }
+                    for book in books
+                ]
+
+
+def _export_job_data(job) -> dict[str, Any]:
+    return {
+        "id": job.id,
+        "status": job.status,
+        "format": job.format,
+        "compression": job.compression,
+        "filename": job.filename,
+        "size": job.size,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def export_file_path(job_id: str) -> str:
+    return os.path.join(settings.EXPORT_DIR, job_id)
+
+
+class CreateExportJobUseCase(BaseBooksUseCase):
+    """Queues an export, the workers render it to a file in `EXPORT_DIR`"""
+
+    def __init__(self, uow: AbstractUnitOfWork, enqueue: Callable[[str, str, dict, str | None], Any]) -> None:
+        super().__init__(uow)
+        self.enqueue = enqueue
+
+    async def __call__(
+        self, format: str, filters: dict | None = None, compression: str | None = None
+    ) -> dict[str, Any]:
+        exporter = FileExporterFactory.get_exporter(format, compression)
+        filters = BookQueryValidator.validate_filters(**(filters or {}))
+
+        job_id = uuid.uuid4().hex
+        async with self.uow:
+            job = await self.uow.export_jobs.create(
                 {
-                    "id": book.id,
-                    "title": book.title,
-                    "author_name": book.author_name,
-                    "genre": book.genre.value if isinstance(book.genre, Genre) else book.genre,
-                    "published_year": book.published_year,
+                    "id": job_id,
+                    "format": format,
+                    "compression": compression,
+                    "filename": f"books_export.{exporter.extension}",
                 }
-                for book in books
-            ]
+            )
+
+        try:
+            self.enqueue(job_id, format, filters, compression)
+        except Exception:
+            async with self.uow:
+                await self.uow.export_jobs.update(
+                    job_id,
+                    {
+                        "status": "failed",
+                        "error": "The job could not be queued",
+                        "finished_at": datetime.now(timezone.utc),
+                    },
+                )
+            raise
+        return _export_job_data(job)
+
+
+class RetrieveExportJobUseCase(BaseBooksUseCase):
+    async def __call__(self, job_id: str) -> dict[str, Any]:
+        async with self.uow:
+            job = await self.uow.export_jobs.retrieve(job_id)
+            if not job:
+                raise DoesNotExistError(f"Export job with id {job_id} does not exist")
+            return _export_job_data(job)
+
+
+class RetrieveExportFileUseCase(RetrieveExportJobUseCase):
+    """The job of a completed export, with the `path` of its file"""
+
+    async def __call__(self, job_id: str) -> dict[str, Any]:
+        job = await super().__call__(job_id)
+        if job["status"] == "failed":
+            raise NotReadyError(f"Export job {job_id} failed: {job['error']}")
+        if job["status"] != "completed":
+            raise NotReadyError(f"Export job {job_id} is {job['status']}, retry later")
+        return {**job, "path": export_file_path(job_id)}
 
-            exporter = FileExporterFactory.get_exporter(format)
-            return exporter.export(books_data)
+
+class RunExportJobUseCase(ExportBooksUseCase):
+    """Renders an export to its file, written next to it first and renamed once complete, so a download never sees
+    a partial file"""
+
+    async def __call__(self, job_id: str, format: str, filters: dict, compression: str | None = None) -> None:
+        async with self.uow:
+            await self.uow.export_jobs.update(job_id, {"status": "running"})
+
+        path = export_file_path(job_id)
+        partial_path = f"{path}.part"
+        try:
+            os.makedirs(settings.EXPORT_DIR, exist_ok=True)
+            file_chunks = await super().__call__(format, filters, compression)
+            async with aiofiles.open(partial_path, "wb") as file:
+                async for chunk in file_chunks:
+                    await file.write(chunk.encode() if isinstance(chunk, str) else chunk)
+            os.replace(partial_path, path)
+        except Exception as error:
+            logger.exception("Export job %s failed", job_id)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(partial_path)
+            async with self.uow:
+                await self.uow.export_jobs.update(
+                    job_id, {"status": "failed", "error": str(error), "finished_at": datetime.now(timezone.utc)}
+                )
+            return
+
+        async with self.uow:
+            await self.uow.export_jobs.update(
+                job_id,
+                {"status": "completed", "size": os.path.getsize(path), "finished_at": datetime.now(timezone.utc)},
+            )
 
 
 class RecommendBooksUseCase(BaseBooksUseCase):
     async def __call__(self, book_id: int, limit: int = 5) -> list[dict[str, Any]]:
         async with self.uow:
-            books = await self.uow.books.get_all(offset=0, limit=1000)
-            if not books:
+            await recommendation_service.ensure_built(self.uow)
+            if not len(recommendation_service):
                 raise DoesNotExistError()
 
             target_book = await self.uow.books.retrieve(book_id)
             if not target_book:
                 raise DoesNotExistError(f"Book with id {book_id} does not exist")
 
-            book_texts = [f"{book.title} {book.genre} {book.author_name}" for book in books]
-            target_text = f"{target_book.title} {target_book.genre} {target_book.author_name}"
-            book_ids = [book.id for book in books]
+            # created by another worker since the index was built
+            if book_id not in recommendation_service:
+                recommendation_service.upsert(dict(target_book._mapping))
 
-            recommendation_service = RecommendationService()
-            recommended_ids = recommendation_service.get_recommendations(target_text, book_texts, book_ids, limit)
+            recommended_ids = recommendation_service.recommend(book_id, limit)
+            books = {book["id"]: book for book in await self.uow.books.retrieve_many(recommended_ids)}
 
             recommendations = [
                 {
-                    "id": book.id,
-                    "title": book.title,
-                    "author_name": book.author_name,
-                    "genre": book.genre,
-                    "published_year": book.published_year,
+                    "id": book["id"],
+                    "title": book["title"],
+                    "author_name": book["author_name"],
+                    "genre": book["genre"],
+                    "published_year": book["published_year"],
                 }
-                for book in books
-                if book.id in recommended_ids
+                for book in (books.get(recommended_id) for recommended_id in recommended_ids)
+                if book is not None
             ]
 
             return recommendations
+
+
+class RecommendBooksBatchUseCase(BaseBooksUseCase):
+    async def __call__(self, book_ids: list[int], limit: int = 5) -> list[dict[str, Any]]:
+        async with self.uow:
+            await recommendation_service.ensure_built(self.uow)
+            if not len(recommendation_service):
+                raise DoesNotExistError()
+
+            target_books = {book["id"]: book for book in await self.uow.books.retrieve_many(set(book_ids))}
+            missing_ids = sorted(set(book_ids) - target_books.keys())
+            if missing_ids:
+                raise DoesNotExistError(f"Books with ids {missing_ids} do not exist")
+
+            new_books = [dict(book) for book_id, book in target_books.items() if book_id not in recommendation_service]
+            recommendation_service.upsert_many(new_books)
+
+            recommended_ids = recommendation_service.recommend_many(list(target_books), limit)
+            all_recommended_ids = {book_id for book_ids in recommended_ids.values() for book_id in book_ids}
+            books = {book["id"]: book for book in await self.uow.books.retrieve_many(all_recommended_ids)}
+
+            return [
+                {
+                    "book_id": book_id,
+                    "recommendations": [
+                        {
+                            "id": book["id"],
+                            "title": book["title"],
+                            "author_name": book["author_name"],
+                            "genre": book["genre"],
+                            "published_year": book["published_year"],
+                        }
+                        for book in (books.get(recommended_id) for recommended_id in recommended_ids[book_id])
+                        if book is not None
+                    ],
+                }
+                for book_id in book_ids
+            ]
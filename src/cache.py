@@ -0,0 +1,207 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# stores a loaded value only if neither the key nor the whole cache was invalidated since the load started: the
+# versions read before loading (ARGV[1], ARGV[2], 0 when unset, versions start at 1) must still be current
+_SET_IF_CURRENT = """
+if (redis.call('get', KEYS[2]) or '0') == ARGV[1] and (redis.call('get', KEYS[3]) or '0') == ARGV[2] then
+    redis.call('set', KEYS[1], ARGV[3], 'EX', ARGV[4])
+    return 1
+end
+return 0
+"""
+
+
+class LocalTTLCache:
+    """In-process LRU cache whose entries also expire after `ttl` seconds"""
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return default
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class TwoTierCache:
+    """Read-through cache: a `LocalTTLCache` per worker in front of a Redis cache shared by all workers.
+
+    Values must be JSON serialisable. Invalidations delete the Redis entry and are published on a pub/sub channel
+    that every worker listens to (see `listen`), so local copies are dropped everywhere. They also bump a version
+    per key (and `clear` one for the whole cache), and a loaded value is only stored in Redis while the versions it
+    was loaded under are current: a worker that read a row before another one's update cannot publish it afterwards.
+    Without Redis (not connected, or unavailable) the cache degrades to the local tier and never fails a request;
+    the local TTL bounds how long a worker can serve an entry whose invalidation it missed.
+    """
+
+    def __init__(self, name: str, local_ttl: float, redis_ttl: float, max_size: int) -> None:
+        self.name = name
+        self.redis_ttl = redis_ttl
+        self.local = LocalTTLCache(max_size=max_size, ttl=local_ttl)
+        self.redis: redis.Redis | None = None
+        self._channel = f"cache:{name}:invalidate"
+        # outside the `cache:{name}:*` pattern of the entries, so `clear` does not delete the versions
+        self._version_key = f"cache-version:{name}"
+        # bumped by every invalidation, so a load racing with one does not store what it read before it
+        self._generation = 0
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "invalidations": 0, "errors": 0}
+
+    def connect(self, redis_connection: redis.Redis | None) -> None:
+        self.redis = redis_connection
+
+    def _redis_key(self, key: Hashable) -> str:
+        return f"cache:{self.name}:{key}"
+
+    def _version_keys(self, key: Hashable) -> list[str]:
+        """The version of `key` and the one of the whole cache"""
+        return [f"{self._version_key}:{key}", self._version_key]
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            self.stats["local_hits"] += 1
+            return value
+
+        generation = self._generation
+        versions = None
+        if self.redis is not None:
+            try:
+                cached, *versions = await self.redis.mget(self._redis_key(key), *self._version_keys(key))
+            except redis.RedisError:
+                self._on_error("get")
+                cached = None
+
+            if cached is not None:
+                self.stats["redis_hits"] += 1
+                value = json.loads(cached)
+                if generation == self._generation:
+                    self.local.set(key, value)
+                return value
+
+        self.stats["misses"] += 1
+        value = await loader()
+        if generation == self._generation:
+            self.local.set(key, value)
+            if self.redis is not None and versions is not None:
+                try:
+                    await self.redis.eval(
+                        _SET_IF_CURRENT,
+                        3,
+                        self._redis_key(key),
+                        *self._version_keys(key),
+                        *(version or "0" for version in versions),
+                        json.dumps(value),
+                        int(self.redis_ttl),
+                    )
+                except redis.RedisError:
+                    self._on_error("set")
+        return value
+
+    async def invalidate(self, *keys: Hashable) -> None:
+        self._drop_local(keys)
+        if self.redis is None or not keys:
+            return
+
+        try:
+            async with self.redis.pipeline(transaction=True) as pipeline:
+                for key in keys:
+                    version_key = self._version_keys(key)[0]
+                    # kept as long as a stored value, which is longer than any load
+                    pipeline.incr(version_key).expire(version_key, int(self.redis_ttl))
+                pipeline.delete(*(self._redis_key(key) for key in keys))
+                await pipeline.execute()
+            await self.redis.publish(self._channel, json.dumps([str(key) for key in keys]))
+        except redis.RedisError:
+            self._on_error("invalidate")
+
+    async def clear(self) -> None:
+        """Drop every entry, e.g. after a change that affects more keys than can be listed"""
+        self._drop_local(None)
+        if self.redis is None:
+            return
+
+        try:
+            await self.redis.incr(self._version_key)
+            async for redis_key in self.redis.scan_iter(match=self._redis_key("*"), count=1000):
+                await self.redis.delete(redis_key)
+            await self.redis.publish(self._channel, json.dumps(None))
+        except redis.RedisError:
+            self._on_error("clear")
+
+    async def listen(self) -> None:
+        """Apply invalidations published by other workers; runs until cancelled"""
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self._channel)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._drop_local(json.loads(message["data"]))
+            except redis.RedisError:
+                self._on_error("listen")
+                # entries invalidated while disconnected are unknown, start over from an empty local tier
+                self._drop_local(None)
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    def _drop_local(self, keys) -> None:
+        self._generation += 1
+        self.stats["invalidations"] += 1
+        if keys is None:
+            self.local.clear()
+            return
+
+        for key in keys:
+            # keys come back from pub/sub as strings
+            self.local.delete(key)
+            if isinstance(key, str) and key.isdigit():
+                self.local.delete(int(key))
+
+    def _on_error(self, operation: str) -> None:
+        self.stats["errors"] += 1
+        logger.warning("Redis %s failed for cache '%s'", operation, self.name, exc_info=True)
+
+    def get_stats(self) -> dict[str, Any]:
+        return {**self.stats, "local_size": len(self.local), "redis_enabled": self.redis is not None}
+
+    def reset(self) -> None:
+        self.local.clear()
+        self._generation += 1
+        self.stats = dict.fromkeys(self.stats, 0)
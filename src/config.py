@@ -1,12 +1,71 @@
+import os
+import tempfile
+
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
+    REPOSITORY_BACKEND: str = "postgres"
     DATABASE_URL: str | None = None
     REDIS_URL: str | None = None
+    # REDIS_URL when unset
+    CELERY_BROKER_URL: str | None = None
+    CELERY_TASK_ALWAYS_EAGER: bool = False
     SECRET_KEY: str = "your-secret-key"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 3000000
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 30
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 500
+    READ_DATABASE_URLS: list[str] = []
+    READ_REPLICA_STRATEGY: str = "round_robin"
+    READ_YOUR_WRITES_SECONDS: float = 5
+    SLOW_QUERY_THRESHOLD_MS: float = 500
+    SLOW_QUERY_EXPLAIN: bool = False
+    SLOW_QUERY_HISTORY_SIZE: int = 100
+    EXPORT_BATCH_SIZE: int = 1000
+    IMPORT_BATCH_SIZE: int = 5000
+    IMPORT_CHUNK_SIZE: int = 1024 * 1024
+    # a JSON item still not decodable after this many characters fails the import instead of buffering the rest
+    IMPORT_MAX_ITEM_SIZE: int = 4 * 1024 * 1024
+    # shared by the app and the workers
+    IMPORT_SPOOL_DIR: str = os.path.join(tempfile.gettempdir(), "book-imports")
+    IMPORT_JOB_MAX_FAILURES: int = 1000
+    # shared by the app, which serves the files, and the workers, which write them
+    EXPORT_DIR: str = os.path.join(tempfile.gettempdir(), "book-exports")
+    # behind nginx, downloads are handed to it with `X-Accel-Redirect` to this internal location over EXPORT_DIR
+    EXPORT_ACCEL_REDIRECT_LOCATION: str | None = None
+    BULK_COPY_THRESHOLD: int = 1000
+    RECOMMENDATION_REFIT_RATIO: float = 0.2
+    RECOMMENDATION_REFIT_MIN_CHANGES: int = 1000
+    RECOMMENDATION_INDEX_MAX_AGE_SECONDS: float = 3600
+    RECOMMENDATION_BATCH_MAX_SIZE: int = 100
+    RECOMMENDATION_MAX_LIMIT: int = 50
+    RECOMMENDATION_BACKEND: str = "exact"
+    # recall@5 0.999 at about a 15x lower p99 than "exact" on 500k books (benchmarks/recommendation_recall.py)
+    RECOMMENDATION_LSH_TABLES: int = 16
+    RECOMMENDATION_LSH_BITS: int = 14
+    RECOMMENDATION_LSH_PROBE_RADIUS: int = 1
+    BOOK_CACHE_TTL_SECONDS: int = 300
+    BOOK_CACHE_LOCAL_TTL_SECONDS: float = 30
+    BOOK_CACHE_MAX_SIZE: int = 10000
+    BOOK_COUNT_CACHE_SECONDS: int = 300
+    BOOK_COUNT_EXACT_BELOW: int = 10000
+    LISTING_CACHE_TTL_SECONDS: int = 300
+    LISTING_CACHE_LOCAL_TTL_SECONDS: float = 60
+    LISTING_CACHE_MAX_SIZE: int = 1000
+    SEARCH_MAX_LIMIT: int = 100
+    SEARCH_QUERY_MAX_LENGTH: int = 200
+    SEARCH_SIMILARITY_THRESHOLD: float = 0.5
+    # how stale `is_active` may be: a user deactivated other than through `DeactivateUserUseCase` (which evicts the
+    # cached principal), e.g. by an UPDATE run on `users` directly, keeps being let in until the entry expires
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 30
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE_LIMIT: int = 64
 
 
 settings = Settings()
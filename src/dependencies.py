@@ -1,21 +1,77 @@
-from fastapi import Depends
+from fastapi import Depends, Request
 from sqlalchemy.exc import ArgumentError
 from sqlalchemy.ext.asyncio import create_async_engine
 
-from auth.services import get_active_current_user, oauth2_scheme
+from auth.services import get_active_current_user, get_token_subject, oauth2_scheme
 from config import settings
+from monitoring.database import database_monitor
+from repositories.fake.containers import FakeDatabase, FakeUnitOfWork
 from repositories.postgres.container import PostgresUnitOfWork
+from repositories.postgres.routing import RecentWrites, ReplicaRouter
+
+
+def create_engine(url: str):
+    engine = create_async_engine(
+        url,
+        echo=settings.DB_ECHO,
+        future=True,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        # per connection, keyed by SQL text: repositories reuse their statements, so these are prepared once
+        connect_args={"prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE},
+    )
+    database_monitor.instrument(engine)
+    return engine
+
+
+repository_backends = ("postgres", "memory")
+if settings.REPOSITORY_BACKEND not in repository_backends:
+    raise ValueError(
+        f"Unknown repository backend '{settings.REPOSITORY_BACKEND}'. Use one of {', '.join(repository_backends)}"
+    )
+
+engine = None
+# single process only: every worker would have its own catalog
+memory_database = FakeDatabase() if settings.REPOSITORY_BACKEND == "memory" else None
 
 # In order not to create an engine every time I call get_unit_of_work,
 # I call it this way and catch the error of missing `DATABASE_URL`
-try:
-    engine = create_async_engine(settings.DATABASE_URL, echo=True, future=True)
-except ArgumentError:
-    print("ArgumentError")
+if memory_database is None:
+    try:
+        engine = create_engine(settings.DATABASE_URL)
+    except ArgumentError:
+        print("ArgumentError")
+
+replica_router = None
+if settings.READ_DATABASE_URLS and memory_database is None:
+    replica_router = ReplicaRouter(
+        [create_engine(url) for url in settings.READ_DATABASE_URLS], strategy=settings.READ_REPLICA_STRATEGY
+    )
+
+recent_writes = RecentWrites(window=settings.READ_YOUR_WRITES_SECONDS)
+
+
+async def get_unit_of_work(request: Request):
+    uow = PostgresUnitOfWork(engine) if memory_database is None else FakeUnitOfWork(memory_database)
+    yield uow
+    # reads of whoever just wrote stay on the primary until replicas have most likely caught up
+    if uow.has_written:
+        subject = get_token_subject(request.headers.get("Authorization"))
+        if subject:
+            await recent_writes.mark(subject)
+
 
+async def get_read_unit_of_work(request: Request):
+    """Unit of work for read-only use cases, served by a replica when any are configured"""
+    if memory_database is not None:
+        return FakeUnitOfWork(memory_database, read_only=True)
 
-def get_unit_of_work():
-    return PostgresUnitOfWork(engine)
+    subject = get_token_subject(request.headers.get("Authorization"))
+    if replica_router is None or (subject and await recent_writes.is_recent(subject)):
+        return PostgresUnitOfWork(engine, read_only=True)
+    return PostgresUnitOfWork(engine, read_only=True, replicas=replica_router)
 
 
 async def get_current_user(token: str = Depends(oauth2_scheme), uow=Depends(get_unit_of_work)):
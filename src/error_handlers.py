@@ -1,7 +1,14 @@
 from fastapi import Request, status
 from fastapi.responses import JSONResponse
 
-from exceptions import DoesNotExistError, InvalidSortParameterError, InvalidUserStateError, ValidationError
+from exceptions import (
+    DoesNotExistError,
+    InvalidSortParameterError,
+    InvalidUserStateError,
+    NotReadyError,
+    ServiceUnavailableError,
+    ValidationError,
+)
 
 
 async def not_found_error_handler(request: Request, exception: DoesNotExistError):
@@ -19,5 +26,17 @@ def invalid_sort_parameter_handler(request: Request, exception: InvalidSortParam
     return JSONResponse(content={exception.field: exception.messages}, status_code=status.HTTP_400_BAD_REQUEST)
 
 
+def not_ready_handler(request: Request, exception: NotReadyError):
+    return JSONResponse(content={"detail": exception.detail}, status_code=status.HTTP_409_CONFLICT)
+
+
 def invalid_user_state_handler(request: Request, exception: InvalidUserStateError):
     return JSONResponse(content={"detail": exception.detail}, status_code=status.HTTP_401_UNAUTHORIZED)
+
+
+def service_unavailable_handler(request: Request, exception: ServiceUnavailableError):
+    return JSONResponse(
+        content={"detail": exception.detail},
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": "1"},
+    )
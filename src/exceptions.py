@@ -27,5 +27,13 @@ class InvalidSortParameterError(ValidationError):
         super().__init__(field, message or self.default_message)
 
 
+class NotReadyError(BaseDetailException):
+    default_detail = "Not ready yet, retry later."
+
+
 class InvalidUserStateError(BaseDetailException):
     default_detail = "Invalid user state."
+
+
+class ServiceUnavailableError(BaseDetailException):
+    default_detail = "Service temporarily unavailable, retry later."
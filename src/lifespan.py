@@ -1,15 +1,42 @@
+import asyncio
+import contextlib
 from contextlib import asynccontextmanager
 
 import redis.asyncio as redis
 from fastapi import FastAPI
 from fastapi_limiter import FastAPILimiter
 
+from auth.services import principal_cache
+from book_management.services.cache import book_cache, listing_cache
+from book_management.services.counter import book_counter
+from book_management.services.generation import catalog_generation
 from config import settings
+from dependencies import recent_writes
+
+caches = [book_cache, listing_cache, principal_cache]
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     redis_connection = redis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
     await FastAPILimiter.init(redis_connection)
+
+    cache_listeners = []
+    for cache in caches:
+        cache.connect(redis_connection)
+        cache_listeners.append(asyncio.create_task(cache.listen()))
+    recent_writes.connect(redis_connection)
+    book_counter.connect(redis_connection)
+    catalog_generation.connect(redis_connection)
     yield
+    for cache_listener in cache_listeners:
+        cache_listener.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await asyncio.gather(*cache_listeners)
+    for cache in caches:
+        cache.connect(None)
+    recent_writes.connect(None)
+    book_counter.connect(None)
+    catalog_generation.connect(None)
+
     await redis_connection.close()
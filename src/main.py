@@ -2,14 +2,24 @@ from fastapi import Depends, FastAPI
 from fastapi_limiter.depends import RateLimiter
 
 import auth.routers as auth
+import monitoring.routers as monitoring
 from book_management.routers import books
 from error_handlers import (
     invalid_sort_parameter_handler,
     invalid_user_state_handler,
     not_found_error_handler,
+    not_ready_handler,
+    service_unavailable_handler,
     validation_error_handler,
 )
-from exceptions import DoesNotExistError, InvalidSortParameterError, InvalidUserStateError, ValidationError
+from exceptions import (
+    DoesNotExistError,
+    InvalidSortParameterError,
+    InvalidUserStateError,
+    NotReadyError,
+    ServiceUnavailableError,
+    ValidationError,
+)
 from lifespan import lifespan
 
 application = FastAPI(
@@ -21,8 +31,11 @@ application = FastAPI(
 
 application.include_router(books.router)
 application.include_router(auth.router)
+application.include_router(monitoring.router)
 
 application.add_exception_handler(DoesNotExistError, not_found_error_handler)
 application.add_exception_handler(ValidationError, validation_error_handler)
 application.add_exception_handler(InvalidSortParameterError, invalid_sort_parameter_handler)
+application.add_exception_handler(NotReadyError, not_ready_handler)
 application.add_exception_handler(InvalidUserStateError, invalid_user_state_handler)
+application.add_exception_handler(ServiceUnavailableError, service_unavailable_handler)
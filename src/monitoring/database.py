@@ -0,0 +1,133 @@
+import logging
+import time
+import weakref
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any
+
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseMonitor:
+    """Slow-query log and connection pool statistics for instrumented engines.
+
+    Statements slower than `slow_query_threshold_ms` are logged and kept (most recent `history_size`) with their
+    SQL, the shape of their parameters (types only, never values) and duration. With `explain`, slow SELECTs are
+    re-run under `EXPLAIN (ANALYZE, BUFFERS)` inside a savepoint to capture the plan; that doubles their cost, so
+    it is meant to be switched on while investigating.
+    """
+
+    def __init__(self, slow_query_threshold_ms: float, explain: bool, history_size: int) -> None:
+        self.slow_query_threshold_ms = slow_query_threshold_ms
+        self.explain = explain
+        self.slow_queries = deque(maxlen=history_size)
+        self._engines = weakref.WeakSet()
+        self._acquire_ms = deque(maxlen=1000)
+        self._acquire_count = 0
+        self._acquire_total_ms = 0.0
+
+    def instrument(self, engine: AsyncEngine) -> None:
+        self._engines.add(engine.sync_engine)
+        event.listen(engine.sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine.sync_engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def record_acquire(self, seconds: float) -> None:
+        """Time a unit of work waited for a pooled connection"""
+        self._acquire_count += 1
+        self._acquire_total_ms += seconds * 1000
+        self._acquire_ms.append(seconds * 1000)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        # kept on the execution context rather than the (pooled) connection: a statement that fails never gets
+        # `after_cursor_execute`, and its start time is then dropped along with the context
+        context.query_started_at = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        duration_ms = (time.perf_counter() - context.query_started_at) * 1000
+        if duration_ms < self.slow_query_threshold_ms:
+            return
+
+        slow_query = {
+            "statement": statement,
+            "parameters": self._parameters_shape(parameters, executemany),
+            "duration_ms": round(duration_ms, 3),
+            "at": datetime.now(timezone.utc).isoformat(),
+        }
+        if self.explain and not executemany and statement.lstrip().upper().startswith("SELECT"):
+            slow_query["plan"] = self._explain(conn, statement, parameters)
+
+        self.slow_queries.append(slow_query)
+        logger.warning("Slow query (%.1f ms): %s", duration_ms, statement)
+
+    @staticmethod
+    def _parameters_shape(parameters, executemany: bool) -> Any:
+        def shape(row):
+            if isinstance(row, dict):
+                return {key: type(value).__name__ for key, value in row.items()}
+            if isinstance(row, (list, tuple)):
+                return [type(value).__name__ for value in row]
+            return type(row).__name__
+
+        if executemany:
+            return {"rows": len(parameters), "row": shape(parameters[0]) if parameters else None}
+        return shape(parameters)
+
+    def _explain(self, conn, statement: str, parameters) -> str | None:
+        # the statement is re-run on the same connection, the savepoint keeps a failure from aborting the transaction
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute("SAVEPOINT slow_query_explain")
+            try:
+                cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+                return "\n".join(row[0] for row in cursor.fetchall())
+            finally:
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+        except Exception:
+            logger.warning("Could not explain slow query", exc_info=True)
+            return None
+        finally:
+            cursor.close()
+
+    def pool_stats(self) -> dict[str, Any]:
+        pools = []
+        for engine in list(self._engines):
+            pool = engine.pool
+            stats = {"url": engine.url.render_as_string(hide_password=True), "pool": type(pool).__name__}
+            if hasattr(pool, "checkedout"):
+                stats.update(
+                    size=pool.size(),
+                    checked_out=pool.checkedout(),
+                    idle=pool.checkedin(),
+                    overflow=pool.overflow(),
+                )
+            pools.append(stats)
+
+        acquire_ms = np.asarray(self._acquire_ms)
+        return {
+            "pools": pools,
+            "acquire": {
+                "count": self._acquire_count,
+                "avg_ms": self._acquire_total_ms / self._acquire_count if self._acquire_count else 0.0,
+                "recent_p99_ms": float(np.percentile(acquire_ms, 99)) if len(acquire_ms) else 0.0,
+                "recent_max_ms": float(acquire_ms.max()) if len(acquire_ms) else 0.0,
+            },
+        }
+
+    def reset(self) -> None:
+        self.slow_queries.clear()
+        self._acquire_ms.clear()
+        self._acquire_count = 0
+        self._acquire_total_ms = 0.0
+
+
+database_monitor = DatabaseMonitor(
+    slow_query_threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+    explain=settings.SLOW_QUERY_EXPLAIN,
+    history_size=settings.SLOW_QUERY_HISTORY_SIZE,
+)
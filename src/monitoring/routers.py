@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends
+
+from auth.schemas import UserResponse
+from dependencies import get_current_user
+from lifespan import caches
+from monitoring.database import database_monitor
+
+router = APIRouter(prefix="/internal", tags=["monitoring"])
+
+
+@router.get("/cache-stats")
+async def cache_stats(
+    current_user: UserResponse = Depends(get_current_user),
+):
+    return {cache.name: cache.get_stats() for cache in caches}
+
+
+@router.get("/db-pool")
+async def db_pool_stats(
+    current_user: UserResponse = Depends(get_current_user),
+):
+    return database_monitor.pool_stats()
+
+
+@router.get("/slow-queries")
+async def slow_queries(
+    current_user: UserResponse = Depends(get_current_user),
+):
+    return list(database_monitor.slow_queries)
@@ -22,6 +22,10 @@ class AbstractRepository(abc.ABC):
 class AbstractUnitOfWork(abc.ABC):
     books: AbstractRepository
     authors: AbstractRepository
+    # whether reads may be served by a replica, which can lag behind the writes
+    reads_replicas: bool = False
+    # raised by a write that conflicts with a concurrent one on a unique key, worth retrying
+    conflict_errors: tuple[type[Exception], ...] = ()
 
     @abc.abstractmethod
     async def __aenter__(self):
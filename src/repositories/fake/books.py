@@ -1,28 +1,238 @@
-from types import SimpleNamespace
-from .repository import FakeRepository
+from datetime import datetime, timezone
+from itertools import islice
+from typing import AsyncIterator, Iterable, Iterator
+
+from auth.models import User
+from book_management.models import Author, Book, ExportJob, ImportJob
+from repositories.fake.repository import FakeRepository, Record, tokenize
 
 
 class BooksRepository(FakeRepository):
-    pass
+    model_class = Book
+
+    # the sort keys of the `books` table, see `FakeDatabase`
+    _sort_fields = ("id", "title", "published_year", "author")
+
+    @property
+    def authors(self):
+        return self.uow.database.tables["authors"]
+
+    def _joined(self, row: dict) -> Record:
+        return Record(
+            {
+                "id": row["id"],
+                "title": row["title"],
+                "author_name": self.authors.rows[row["author_id"]]["name"],
+                "genre": row["genre"],
+                "published_year": row["published_year"],
+            }
+        )
+
+    def _check_author(self, data: dict) -> None:
+        if "author_id" in data and data["author_id"] not in self.authors.rows:
+            raise ValueError(f"Author {data['author_id']} does not exist")
+
+    def _insert(self, data: dict) -> dict:
+        self._check_author(data)
+        return super()._insert(data)
+
+    async def retrieve(self, reference: int) -> Record | None:
+        row = self.table.rows.get(reference)
+        return None if row is None else Record({**self._joined(row), "version": row["version"]})
+
+    async def retrieve_many(self, references: Iterable[int]) -> list[Record]:
+        rows = self.table.rows
+        return [self._joined(rows[reference]) for reference in set(references) if reference in rows]
+
+    async def update(self, reference: int, data: dict) -> Record | None:
+        self._check_author(data)
+        row = self.table.rows.get(reference)
+        if row is not None:
+            data = {**data, "version": row["version"] + 1}
+        return await super().update(reference, data)
+
+    async def get_all(
+        self,
+        offset: int,
+        limit: int | None,
+        sort_field: str = "id",
+        sort_direction: str = "asc",
+        after: tuple | None = None,
+        filters: dict | None = None,
+    ) -> list[Record]:
+        """Same contract as the Postgres `BooksRepository.get_all`"""
+        sort_field = sort_field if sort_field in self._sort_fields else "id"
+        rows = self._filtered(sort_field, sort_direction == "desc", after, filters or {})
+        return [self._joined(row) for row in islice(rows, offset, None if limit is None else offset + limit)]
+
+    def _filtered(self, sort_field: str, descending: bool, after: tuple | None, filters: dict) -> Iterator[dict]:
+        matches = self._filter_predicate(filters)
+        candidate_ids = self._candidate_ids(filters)
+        if candidate_ids is None:
+            # walk the sort index, the filters (if any) are checked row by row
+            yield from filter(matches, self.table.iter_sorted(sort_field, descending, after))
+            return
+
+        # the author filters are selective, sort only the author's books
+        entries = sorted(self.table.sort_key(sort_field, self.table.rows[row_id]) for row_id in candidate_ids)
+        if descending:
+            entries.reverse()
+        for entry in entries:
+            if after is not None and (entry >= after if descending else entry <= after):
+                continue
+            row = self.table.rows[entry[1]]
+            if matches(row):
+                yield row
+
+    def _candidate_ids(self, filters: dict) -> set[int] | None:
+        author_ids = set()
+        if "author" in filters:
+            author = self.authors.lookup("name", filters["author"])
+            if author is None:
+                return set()
+            author_ids.add(author["id"])
+        if "author_id" in filters:
+            author_ids.add(filters["author_id"])
+        if not author_ids:
+            return None
+        if len(author_ids) > 1:
+            # both filters given, for different authors
+            return set()
+        return set(self.table.group("author_id", author_ids.pop()))
+
+    @staticmethod
+    def _filter_predicate(filters: dict):
+        def matches(row: dict) -> bool:
+            return (
+                ("genre" not in filters or row["genre"] == filters["genre"])
+                and ("year_from" not in filters or row["published_year"] >= filters["year_from"])
+                and ("year_to" not in filters or row["published_year"] <= filters["year_to"])
+                and ("author_id" not in filters or row["author_id"] == filters["author_id"])
+            )
+
+        return matches
+
+    async def search(
+        self, query: str, limit: int, fuzzy: bool = False, after: tuple[float, int] | None = None
+    ) -> list[Record]:
+        """Whole-word matches only: every word of `query` in the title, or every word in the author name.
+
+        Ranked with the weights of the Postgres `search` (title 1.0, author name 0.4); there is no typo tolerance,
+        `has_extension("pg_trgm")` is false.
+        """
+        words = tokenize(query)
+        title_ids = self.table.matching("title", words)
+        author_ids = self.authors.matching("name", words)
+        by_author_ids = {book_id for author_id in author_ids for book_id in self.table.group("author_id", author_id)}
+
+        ranked = sorted(
+            (-(1.0 * (book_id in title_ids) + 0.4 * (book_id in by_author_ids)), book_id)
+            for book_id in title_ids | by_author_ids
+        )
+        if after is not None:
+            after_rank, after_id = after
+            ranked = [(rank, book_id) for rank, book_id in ranked if (rank, book_id) > (-after_rank, after_id)]
+
+        return [Record({**self._joined(self.table.rows[book_id]), "rank": -rank}) for rank, book_id in ranked[:limit]]
+
+    async def set_similarity_threshold(self, threshold: float) -> None:
+        pass
+
+    async def has_extension(self, name: str) -> bool:
+        return False
+
+    async def count(self, filters: dict | None = None) -> int:
+        if not filters:
+            return len(self.table.rows)
+        return sum(1 for _ in self._filtered("id", False, None, filters))
+
+    async def estimate_count(self) -> int:
+        return len(self.table.rows)
+
+    async def stream_all(self, batch_size: int = 1000, filters: dict | None = None) -> AsyncIterator[list[Record]]:
+        """Every book matching `filters` in id order, `batch_size` at a time"""
+        # rows are never changed in place, collecting them up front gives the snapshot a transaction would
+        rows = list(self._filtered("id", False, None, filters or {}))
+        for start in range(0, len(rows), batch_size):
+            yield [self._joined(row) for row in rows[start : start + batch_size]]  # noqa
 
 
 class AuthorsRepository(FakeRepository):
-    async def retrieve_by_name(self, author_name: str):
-        for item in self._items.values():
-            if item.get("name") == author_name:
-                return SimpleNamespace(**item)
-        return None
+    model_class = Author
+
+    async def retrieve_by_name(self, author_name: str) -> Record | None:
+        row = self.table.lookup("name", author_name)
+        return None if row is None else Record(row)
+
+    async def retrieve_by_names(self, author_names: Iterable[str]) -> list[Record]:
+        rows = (self.table.lookup("name", author_name) for author_name in set(author_names))
+        return [Record(row) for row in rows if row is not None]
+
+    async def update(self, reference: int, data: dict) -> Record | None:
+        if "name" not in data:
+            return await super().update(reference, data)
+
+        # the books' author sort key is the author's name; registered before the update so that a rollback
+        # refreshes the keys once the old name is back
+        books = self.uow.database.tables["books"]
+        self.uow.on_rollback(lambda: books.reindex(set(books.group("author_id", reference))))
+        author = await super().update(reference, data)
+        if author is not None:
+            books.reindex(set(books.group("author_id", reference)))
+        return author
+
 
 class UsersRepository(FakeRepository):
-    async def retrieve_by_username(self, username: str):
-        for item in self._items.values():
-            if item.get("username") == username:
-                return SimpleNamespace(**item)
-        return None
-
-    async def retrieve_by_email(self, email: str):
-        for item in self._items.values():
-            if item.get("email") == email:
-                return SimpleNamespace(**item)
-        return None
-    
\ No newline at end of file
+    model_class = User
+
+    async def retrieve_by_username(self, username: str) -> Record | None:
+        row = self.table.lookup("username", username)
+        return None if row is None else Record(row)
+
+    async def retrieve_by_email(self, email: str) -> Record | None:
+        row = self.table.lookup("email", email)
+        return None if row is None else Record(row)
+
+
+class ExportJobsRepository(FakeRepository):
+    model_class = ExportJob
+
+
+class ImportJobsRepository(FakeRepository):
+    model_class = ImportJob
+
+    async def _update_completing(self, job_id: str, data: dict, chunks_done: int, chunks_total: int | None) -> None:
+        # as the Postgres `_completion`
+        if self.table.rows[job_id]["status"] == "running" and chunks_done == chunks_total:
+            data = {**data, "status": "completed", "finished_at": datetime.now(timezone.utc)}
+        await self.update(job_id, data)
+
+    async def start(self, job_id: str) -> None:
+        job = self.table.rows.get(job_id)
+        if job is not None and job["status"] == "queued":
+            await self.update(job_id, {"status": "running"})
+
+    async def finish_parsing(self, job_id: str, chunks_total: int, total_items: int) -> None:
+        job = self.table.rows.get(job_id)
+        if job is not None:
+            data = {"chunks_total": chunks_total, "total_items": total_items}
+            await self._update_completing(job_id, data, len(job["chunks_applied"]), chunks_total)
+
+    async def record_chunk(
+        self, job_id: str, chunk_index: int, successful: int, failed_info: list[dict], max_failures: int
+    ) -> bool:
+        job = self.table.rows.get(job_id)
+        if job is None or chunk_index in job["chunks_applied"]:
+            return False
+        data = {
+            "successful": job["successful"] + successful,
+            "failed": job["failed"] + len(failed_info),
+            "failed_info": (job["failed_info"] + failed_info)[:max_failures],
+            "chunks_applied": job["chunks_applied"] + [chunk_index],
+        }
+        await self._update_completing(job_id, data, len(job["chunks_applied"]) + 1, job["chunks_total"])
+        return True
+
+    async def fail(self, job_id: str, error: str) -> None:
+        if job_id in self.table.rows:
+            await self.update(job_id, {"status": "failed", "error": error, "finished_at": datetime.now(timezone.utc)})
@@ -1,15 +1,119 @@
+from datetime import datetime, timezone
+from typing import Callable
+
 from repositories.base import AbstractUnitOfWork
-from repositories.fake.books import AuthorsRepository, BooksRepository, UsersRepository
+from repositories.fake.books import (
+    AuthorsRepository,
+    BooksRepository,
+    ExportJobsRepository,
+    ImportJobsRepository,
+    UsersRepository,
+)
+from repositories.fake.repository import FakeTable
 
 
-class FakeUnitOfWork(AbstractUnitOfWork):
+class FakeDatabase:
+    """The tables of the in-memory backend, shared by every `FakeUnitOfWork` of a process"""
+
     def __init__(self) -> None:
-        self.books = BooksRepository()
-        self.authors = AuthorsRepository()
-        self.users = UsersRepository()
+        authors = FakeTable(unique=["name"], tokenized=["name"])
+        books = FakeTable(
+            grouped=["author_id"],
+            tokenized=["title"],
+            defaults={"version": lambda: 1},
+            # `BooksRepository.get_all` sort fields
+            sort_keys={
+                "id": lambda row: row["id"],
+                "title": lambda row: row["title"],
+                "published_year": lambda row: row["published_year"],
+                "author": lambda row: authors.rows[row["author_id"]]["name"],
+            },
+        )
+        users = FakeTable(
+            unique=["username", "email"],
+            # the column defaults of `User`
+            defaults={"is_active": lambda: True, "created_at": datetime.now, "last_login": lambda: None},
+        )
+        import_jobs = FakeTable(
+            # the column defaults of `ImportJob`
+            defaults={
+                "status": lambda: "queued",
+                "total_items": lambda: None,
+                "successful": lambda: 0,
+                "failed": lambda: 0,
+                "failed_info": list,
+                "chunks_total": lambda: None,
+                "chunks_applied": list,
+                "error": lambda: None,
+                "created_at": lambda: datetime.now(timezone.utc),
+                "finished_at": lambda: None,
+            },
+        )
+        export_jobs = FakeTable(
+            # the column defaults of `ExportJob`
+            defaults={
+                "status": lambda: "queued",
+                "compression": lambda: None,
+                "size": lambda: None,
+                "error": lambda: None,
+                "created_at": lambda: datetime.now(timezone.utc),
+                "finished_at": lambda: None,
+            },
+        )
+        self.tables = {
+            "authors": authors,
+            "books": books,
+            "users": users,
+            "import_jobs": import_jobs,
+            "export_jobs": export_jobs,
+        }
+
+    def clear(self) -> None:
+        for table in self.tables.values():
+            table.clear()
+
+
+class FakeUnitOfWork(AbstractUnitOfWork):
+    """In-memory unit of work, same interface as `PostgresUnitOfWork`.
+
+    Writes are visible to other units of work as soon as they are made (there is no isolation) and are undone if the
+    `async with` block raises. With `read_only`, writes raise `PermissionError`.
+    """
+
+    # what `FakeTable` raises on a duplicate key
+    conflict_errors = (ValueError,)
+
+    def __init__(self, database: FakeDatabase | None = None, read_only: bool = False) -> None:
+        self.database = database or FakeDatabase()
+        self.read_only = read_only
+        self._undo: list[Callable[[], object]] | None = None
+        # set by repository writes; `has_written` once such a transaction is committed
+        self.dirty = False
+        self.has_written = False
+
+        self.books = BooksRepository(self)
+        self.authors = AuthorsRepository(self)
+        self.users = UsersRepository(self)
+        self.import_jobs = ImportJobsRepository(self)
+        self.export_jobs = ExportJobsRepository(self)
+
+    def on_rollback(self, undo: Callable[[], object]) -> None:
+        if self._undo is not None:
+            self._undo.append(undo)
 
     async def __aenter__(self):
-        pass
+        if self._undo is None:
+            self._undo = []
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self._undo is None:
+            return
 
-    async def __aexit__(self, *args, **kwargs):
-        pass
+        if exc_type is not None:
+            for undo in reversed(self._undo):
+                undo()
+        else:
+            self.has_written = self.has_written or self.dirty
+        self._undo = None
+        self.dirty = False
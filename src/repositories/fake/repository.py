@@ -1,41 +1,261 @@
-from types import SimpleNamespace
+import enum
+import re
+from collections import defaultdict
+from collections.abc import Mapping
+from functools import partial
+from typing import Any, Callable, Iterable, Iterator
+
+from sortedcontainers import SortedList
 
 from repositories.base import AbstractRepository
 
 
+def tokenize(value: str) -> set[str]:
+    """Lower-cased words of `value`, roughly what `to_tsvector('simple', ...)` keeps"""
+    return set(re.findall(r"\w+", value.lower()))
+
+
+class Record(Mapping):
+    """Read-only row, accessed like the rows the Postgres repositories return (`row.id`, `row["id"]`, `dict(row)`)"""
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data: dict) -> None:
+        self._data = data
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self._data[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getitem__(self, key: str) -> Any:
+        return self._data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def _mapping(self) -> "Record":
+        return self
+
+    def __repr__(self) -> str:
+        return f"Record({self._data!r})"
+
+
+class FakeTable:
+    """Rows of one table by id, plus the indexes kept up to date on every write:
+
+    - `unique`: hash index per column, value -> id, also enforcing uniqueness
+    - `grouped`: hash index per column, value -> ids
+    - `tokenized`: inverted index per column, word -> ids (see `tokenize`)
+    - `sort_keys`: `SortedList` of `(key(row), id)` per named key function
+
+    Rows are never changed in place, writes replace them, so a row handed out stays a consistent snapshot.
+    """
+
+    def __init__(
+        self,
+        unique: Iterable[str] = (),
+        grouped: Iterable[str] = (),
+        tokenized: Iterable[str] = (),
+        sort_keys: dict[str, Callable[[dict], Any]] | None = None,
+        defaults: dict[str, Callable[[], Any]] | None = None,
+    ) -> None:
+        self.rows: dict[int, dict] = {}
+        self.next_id = 1
+        self.unique = {column: {} for column in unique}
+        self.grouped = {column: defaultdict(set) for column in grouped}
+        self.tokenized = {column: defaultdict(set) for column in tokenized}
+        self.sort_keys = sort_keys or {}
+        self.sorted = {name: SortedList() for name in self.sort_keys}
+        # the key each row is indexed under, a key may depend on other tables and change without the row changing
+        self._sort_entries: dict[str, dict[int, tuple]] = {name: {} for name in self.sort_keys}
+        self.defaults = defaults or {}
+
+    def insert(self, data: dict) -> dict:
+        row = {column: default() for column, default in self.defaults.items()}
+        row.update((column, self._normalize(value)) for column, value in data.items())
+        row["id"] = row.get("id") or self.next_id
+        if row["id"] in self.rows:
+            raise ValueError(f"Duplicate key value id={row['id']}")
+        self._check_unique(row)
+
+        self.rows[row["id"]] = row
+        if isinstance(row["id"], int):
+            self.next_id = max(self.next_id, row["id"] + 1)
+        self._index(row)
+        return row
+
+    def update(self, row_id: int, data: dict) -> dict | None:
+        row = self.rows.get(row_id)
+        if row is None:
+            return None
+
+        updated = {**row, **{column: self._normalize(value) for column, value in data.items()}, "id": row_id}
+        self._check_unique(updated)
+        self._unindex(row)
+        self.rows[row_id] = updated
+        self._index(updated)
+        return updated
+
+    def delete(self, row_id: int) -> dict | None:
+        row = self.rows.pop(row_id, None)
+        if row is not None:
+            self._unindex(row)
+        return row
+
+    def lookup(self, column: str, value: Any) -> dict | None:
+        row_id = self.unique[column].get(self._normalize(value))
+        return None if row_id is None else self.rows[row_id]
+
+    def group(self, column: str, value: Any) -> set[int]:
+        return self.grouped[column].get(self._normalize(value), set())
+
+    def matching(self, column: str, words: Iterable[str]) -> set[int]:
+        """Ids of the rows whose `column` contains every one of `words`"""
+        index = self.tokenized[column]
+        # rarest word first, the intersection only shrinks from there
+        postings = sorted((index.get(word, set()) for word in words), key=len)
+        if not postings:
+            return set()
+        return set(postings[0]).intersection(*postings[1:])
+
+    def iter_sorted(self, name: str, descending: bool = False, after: tuple | None = None) -> Iterator[dict]:
+        """Rows in `(key, id)` order, starting past `after` when it is given"""
+        index = self.sorted[name]
+        if after is None:
+            entries = reversed(index) if descending else iter(index)
+        elif descending:
+            entries = index.irange(maximum=after, inclusive=(True, False), reverse=True)
+        else:
+            entries = index.irange(minimum=after, inclusive=(False, True))
+
+        for _, row_id in entries:
+            yield self.rows[row_id]
+
+    def sort_key(self, name: str, row: dict) -> tuple:
+        return self.sort_keys[name](row), row["id"]
+
+    def reindex(self, row_ids: Iterable[int]) -> None:
+        """Refresh the sort keys of `row_ids`, after a change elsewhere that their keys depend on"""
+        for row_id in list(row_ids):
+            for name in self.sort_keys:
+                self.sorted[name].remove(self._sort_entries[name][row_id])
+                entry = self._sort_entries[name][row_id] = self.sort_key(name, self.rows[row_id])
+                self.sorted[name].add(entry)
+
+    def clear(self) -> None:
+        for row_id in list(self.rows):
+            self.delete(row_id)
+        self.next_id = 1
+
+    def _check_unique(self, row: dict) -> None:
+        for column, index in self.unique.items():
+            existing_id = index.get(row.get(column))
+            if existing_id is not None and existing_id != row["id"]:
+                raise ValueError(f"Duplicate key value {column}={row[column]!r}")
+
+    def _index(self, row: dict) -> None:
+        row_id = row["id"]
+        for column, index in self.unique.items():
+            index[row.get(column)] = row_id
+        for column, index in self.grouped.items():
+            index[row.get(column)].add(row_id)
+        for column, index in self.tokenized.items():
+            for word in tokenize(row.get(column) or ""):
+                index[word].add(row_id)
+        for name in self.sort_keys:
+            entry = self._sort_entries[name][row_id] = self.sort_key(name, row)
+            self.sorted[name].add(entry)
+
+    def _unindex(self, row: dict) -> None:
+        row_id = row["id"]
+        for column, index in self.unique.items():
+            index.pop(row.get(column), None)
+        for column, index in self.grouped.items():
+            self._discard(index, row.get(column), row_id)
+        for column, index in self.tokenized.items():
+            for word in tokenize(row.get(column) or ""):
+                self._discard(index, word, row_id)
+        for name in self.sort_keys:
+            self.sorted[name].remove(self._sort_entries[name].pop(row_id))
+
+    @staticmethod
+    def _discard(index: defaultdict, key: Any, row_id: int) -> None:
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(row_id)
+            if not ids:
+                del index[key]
+
+    @staticmethod
+    def _normalize(value: Any) -> Any:
+        # stored as Postgres returns them
+        return value.value if isinstance(value, enum.Enum) else value
+
+
 class FakeRepository(AbstractRepository):
-    def __init__(self) -> None:
-        self._items = {}
-        self._id_counter = 1
-
-    async def create(self, data: dict) -> SimpleNamespace:
-        """Create a new item with auto-incrementing ID"""
-        data["id"] = self._id_counter
-        self._items[self._id_counter] = data.copy()
-        self._id_counter += 1
-        return SimpleNamespace(**data)
-
-    async def retrieve(self, reference: int) -> SimpleNamespace | None:
-        """Retrieve an item by ID"""
-        if reference in self._items:
-            return SimpleNamespace(**self._items[reference])
-        return None
-
-    async def update(self, reference: int, data: dict) -> SimpleNamespace | None:
-        """Update an item by ID"""
-        if reference in self._items:
-            self._items[reference].update(data)
-            return SimpleNamespace(**self._items[reference])
-        return None
+    """In-memory counterpart of `PostgresRepository`, over a table of the unit of work's `FakeDatabase`.
+
+    Writes go straight to the table and register their inverse with the unit of work, which applies them on
+    rollback.
+    """
+
+    model_class = None
+
+    def __init__(self, uow, id_field: str = "id") -> None:
+        self.uow = uow
+        self.id_field = id_field
+        self.table_name = self.model_class.__tablename__
+
+    @property
+    def table(self) -> FakeTable:
+        return self.uow.database.tables[self.table_name]
+
+    def _begin_write(self) -> None:
+        if self.uow.read_only:
+            raise PermissionError(f"Cannot write to '{self.table_name}' in a read-only transaction")
+        self.uow.dirty = True
+
+    def _insert(self, data: dict) -> dict:
+        self._begin_write()
+        row = self.table.insert(data)
+        self.uow.on_rollback(partial(self.table.delete, row["id"]))
+        return row
+
+    async def create(self, data: dict) -> Record:
+        return Record(self._insert(data))
+
+    async def retrieve(self, reference: int) -> Record | None:
+        row = self.table.rows.get(reference)
+        return None if row is None else Record(row)
+
+    async def update(self, reference: int, data: dict) -> Record | None:
+        self._begin_write()
+        previous = self.table.rows.get(reference)
+        if previous is None:
+            return None
+
+        updated = self.table.update(reference, data)
+        self.uow.on_rollback(partial(self.table.update, reference, previous))
+        return Record(updated)
 
     async def delete(self, reference: int) -> None:
-        """Delete an item by ID"""
-        if reference in self._items:
-            del self._items[reference]
-
-    async def get_all(self, offset: int = 0, limit: int = 10, sort_by: str = "id") -> list[SimpleNamespace]:
-        """Get all items with pagination and sorting"""
-        items = list(self._items.values())
-        items.sort(key=lambda x: x.get(sort_by, ""))
-        paginated = items[offset : offset + limit]  # noqa
-        return [SimpleNamespace(**item) for item in paginated]
+        self._begin_write()
+        previous = self.table.delete(reference)
+        if previous is not None:
+            self.uow.on_rollback(partial(self.table.insert, previous))
+
+    async def bulk_create(self, data: list[dict]) -> list[Record]:
+        return [Record(self._insert(item)) for item in data]
+
+    async def bulk_copy(self, data: list[dict]) -> list[Record]:
+        return await self.bulk_create(data)
+
+    async def get_all(self, offset: int, limit: int, sort_by: str = "id") -> list[Record]:
+        rows = sorted(self.table.rows.values(), key=lambda row: (row.get(sort_by), row["id"]))
+        return [Record(row) for row in rows[offset : offset + limit]]  # noqa
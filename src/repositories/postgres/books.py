@@ -1,42 +1,127 @@
-from typing import Iterable
-
-from sqlalchemy import text
+import json
+import time
+import weakref
+from typing import AsyncIterator, Iterable
 
 from auth.models import User
-from book_management.models import Author, Book
+from book_management.models import Author, Book, ExportJob, ImportJob
 from repositories.postgres.repository import PostgresRepository
 
 
 class BooksRepository(PostgresRepository):
     model_class = Book
 
+    _sort_field_mapping = {
+        "id": "b.id",
+        "title": "b.title",
+        "published_year": "b.published_year",
+        "author": "a.name",
+    }
+    # filters on `b`/`a`, bound to parameters of the same name; `ix_books_genre_published_year_id` serves
+    # genre with or without a year range, `ix_books_author_id_id` the author ones
+    _filter_conditions = {
+        "genre": "b.genre = :genre",
+        "year_from": "b.published_year >= :year_from",
+        "year_to": "b.published_year <= :year_to",
+        "author": "a.name = :author",
+        "author_id": "b.author_id = :author_id",
+    }
+    # per engine, extension name -> (installed, when to look it up again if not)
+    _extensions: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+    # a missing extension is looked up again after this long, so installing it needs no restart
+    _missing_extension_recheck_seconds = 60
+
     async def retrieve(self, reference: int) -> dict | None:
-        query = text(
-            f"""
-                SELECT b.id, b.title, a.name AS author_name, b.genre, b.published_year
+        query = self._statement(
+            "retrieve",
+            lambda: f"""
+                SELECT b.id, b.title, a.name AS author_name, b.genre, b.published_year, b.version
                 FROM {self.table_name} b
                 JOIN authors a ON b.author_id = a.id
                 WHERE b.id = :id
-            """
+            """,
         )
         result = await self.uow.session.execute(query, {"id": reference})
         return result.fetchone()
 
+    async def update(self, reference: int, data: dict) -> dict:
+        """`PostgresRepository.update` that also bumps the book's `version`"""
+        fields = tuple(data.keys())
+        query = self._statement(
+            ("update", fields),
+            lambda: f"""
+            UPDATE {self.table_name}
+            SET {", ".join(f"{key} = :{key}" for key in fields)}, version = version + 1
+            WHERE {self.id_field} = :id
+            RETURNING *
+        """,
+        )
+        self.uow.dirty = True
+        result = await self.uow.session.execute(query, {**data, "id": reference})
+        return result.fetchone()
+
+    async def retrieve_many(self, references: Iterable[int]) -> list[dict]:
+        query = self._statement(
+            "retrieve_many",
+            lambda: f"""
+                SELECT b.id, b.title, a.name AS author_name, b.genre, b.published_year
+                FROM {self.table_name} b
+                JOIN authors a ON b.author_id = a.id
+                WHERE b.id = ANY(:ids)
+            """,
+        )
+        result = await self.uow.session.execute(query, {"ids": list(references)})
+        return result.mappings().all()
+
     async def get_all(
-        self, offset: int, limit: int | None, sort_field: str = "id", sort_direction: str = "asc"
+        self,
+        offset: int,
+        limit: int | None,
+        sort_field: str = "id",
+        sort_direction: str = "asc",
+        after: tuple | None = None,
+        filters: dict | None = None,
     ) -> list[dict]:
-        _sort_field_mapping = {
-            "id": "b.id",
-            "title": "b.title",
-            "published_year": "b.published_year",
-            "author": "a.name",
-        }
-
-        order_column = _sort_field_mapping.get(sort_field, "b.id")
-        order_by_clause = f"ORDER BY {order_column} {sort_direction}"
-
-        query = text(
-            f"""
+        """Page through books ordered by `(sort_field, id)`.
+
+        `after` is the `(sort_value, id)` of the last row of the previous page; when it is given
+        the page is resolved with a keyset predicate instead of `OFFSET`, so its cost does not grow with depth.
+        `filters` maps keys of `_filter_conditions` to their values.
+        """
+        order_column = self._sort_field_mapping.get(sort_field, "b.id")
+        sort_direction = "desc" if sort_direction == "desc" else "asc"
+        filters = filters or {}
+        filter_keys = tuple(sorted(filters))
+        query = self._statement(
+            ("get_all", order_column, sort_direction, after is not None, limit is not None, filter_keys),
+            lambda: self._get_all_sql(
+                order_column, sort_direction, keyset=after is not None, limited=limit is not None, filters=filter_keys
+            ),
+        )
+
+        params = {"offset": offset, **filters}
+        if after is not None:
+            params["after_value"], params["after_id"] = after
+        if limit is not None:
+            params["limit"] = limit
+        result = await self.uow.session.execute(query, params)
+        return result.mappings().all()
+
+    def _get_all_sql(
+        self, order_column: str, sort_direction: str, keyset: bool, limited: bool, filters: tuple[str, ...] = ()
+    ) -> str:
+        conditions = [self._filter_conditions[key] for key in filters]
+        if keyset:
+            comparison = ">" if sort_direction == "asc" else "<"
+            # the single-column bound lets the planner use the sort index even when
+            # the row comparison spans both tables (author sort)
+            conditions += [
+                f"{order_column} {comparison}= :after_value",
+                f"({order_column}, b.id) {comparison} (:after_value, :after_id)",
+            ]
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        return f"""
                 SELECT
                     b.id,
                     b.title,
@@ -45,28 +130,160 @@ class BooksRepository(PostgresRepository):
                     b.published_year
                 FROM {self.table_name} b
                 JOIN authors a ON b.author_id = a.id
-                {order_by_clause}
-                OFFSET :offset {'LIMIT :limit' if limit is not None else ''}
+                {where_clause}
+                ORDER BY {order_column} {sort_direction}, b.id {sort_direction}
+                OFFSET :offset {'LIMIT :limit' if limited else ''}
             """
-        )
 
-        params = {"offset": offset}
-        if limit is not None:
-            params["limit"] = limit
-        result = await self.uow.session.execute(query, params)
+    async def search(
+        self, query: str, limit: int, fuzzy: bool = False, after: tuple[float, int] | None = None
+    ) -> list[dict]:
+        """Books whose title or author name match `query`, best match first, ordered by `(rank desc, id)`.
+
+        Words are matched with `websearch_to_tsquery` against the `to_tsvector('simple', ...)` GIN indexes; with
+        `fuzzy` (needs pg_trgm, see `has_extension`) titles and names within the session's
+        `pg_trgm.word_similarity_threshold` of `query` match as well, so typos still find the book. `after` is the
+        `(rank, id)` of the last row of the previous page.
+        """
+        statement = self._statement(
+            ("search", fuzzy, after is not None), lambda: self._search_sql(fuzzy, keyset=after is not None)
+        )
+        params = {"query": query, "limit": limit}
+        if after is not None:
+            params["after_rank"], params["after_id"] = after
+        result = await self.uow.session.execute(statement, params)
         return result.mappings().all()
 
+    def _search_sql(self, fuzzy: bool, keyset: bool) -> str:
+        # each branch can use its own table's index, an OR across the join could not
+        candidates = [
+            f"SELECT b.id FROM {self.table_name} b, q WHERE to_tsvector('simple', b.title) @@ q.tsquery",
+            f"""SELECT b.id FROM {self.table_name} b JOIN authors a ON b.author_id = a.id, q
+                WHERE to_tsvector('simple', a.name) @@ q.tsquery""",
+        ]
+        rank = (
+            "ts_rank(setweight(to_tsvector('simple', b.title), 'A') || setweight(to_tsvector('simple', a.name), 'B'),"
+            " q.tsquery)"
+        )
+        if fuzzy:
+            candidates += [
+                f"SELECT b.id FROM {self.table_name} b WHERE :query <% b.title",
+                f"SELECT b.id FROM {self.table_name} b JOIN authors a ON b.author_id = a.id WHERE :query <% a.name",
+            ]
+            rank += " + greatest(word_similarity(:query, b.title), word_similarity(:query, a.name))"
+
+        where_clause = "WHERE rank < :after_rank OR (rank = :after_rank AND id > :after_id)" if keyset else ""
+        candidates_sql = "\n                UNION\n                ".join(candidates)
+        return f"""
+            WITH q AS (SELECT websearch_to_tsquery('simple', :query) AS tsquery),
+            matches AS (
+                {candidates_sql}
+            ),
+            ranked AS (
+                SELECT
+                    b.id,
+                    b.title,
+                    a.name AS author_name,
+                    b.genre,
+                    b.published_year,
+                    ({rank})::float8 AS rank
+                FROM matches m
+                JOIN {self.table_name} b ON b.id = m.id
+                JOIN authors a ON b.author_id = a.id, q
+            )
+            SELECT * FROM ranked
+            {where_clause}
+            ORDER BY rank DESC, id
+            LIMIT :limit
+        """
+
+    async def set_similarity_threshold(self, threshold: float) -> None:
+        """Word similarity `search(fuzzy=True)` matches from, for the rest of the transaction"""
+        query = self._statement(
+            "set_similarity_threshold",
+            lambda: "SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)",
+        )
+        await self.uow.session.execute(query, {"threshold": str(threshold)})
+
+    async def has_extension(self, name: str) -> bool:
+        """Whether extension `name` is installed in the database of the session's engine.
+
+        Once found, it is not looked up again for that engine; while missing, at most every
+        `_missing_extension_recheck_seconds`.
+        """
+        extensions = self._extensions.setdefault(self.uow.session.bind.sync_engine, {})
+        installed, recheck_at = extensions.get(name, (False, 0.0))
+        if not installed and time.monotonic() >= recheck_at:
+            query = self._statement(
+                "has_extension", lambda: "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = :name)"
+            )
+            result = await self.uow.session.execute(query, {"name": name})
+            installed = result.scalar_one()
+            extensions[name] = (installed, time.monotonic() + self._missing_extension_recheck_seconds)
+        return installed
+
+    async def count(self, filters: dict | None = None) -> int:
+        filters = filters or {}
+        filter_keys = tuple(sorted(filters))
+        query = self._statement(("count", filter_keys), lambda: self._count_sql(filter_keys))
+        result = await self.uow.session.execute(query, filters)
+        return result.scalar_one()
+
+    def _count_sql(self, filters: tuple[str, ...]) -> str:
+        if not filters:
+            return f"SELECT count(*) FROM {self.table_name}"
+
+        # the join is only needed to filter on the author name
+        join = "JOIN authors a ON b.author_id = a.id" if "author" in filters else ""
+        conditions = " AND ".join(self._filter_conditions[key] for key in filters)
+        return f"SELECT count(*) FROM {self.table_name} b {join} WHERE {conditions}"
+
+    async def estimate_count(self) -> int:
+        """Planner estimate kept by ANALYZE/autovacuum, -1 if the table was never analyzed"""
+        query = self._statement(
+            "estimate_count",
+            lambda: f"SELECT reltuples::bigint FROM pg_class WHERE oid = '{self.table_name}'::regclass",
+        )
+        result = await self.uow.session.execute(query)
+        return result.scalar_one()
+
+    async def stream_all(self, batch_size: int = 1000, filters: dict | None = None) -> AsyncIterator[list[dict]]:
+        """Yield every book matching `filters` (see `get_all`) in id order, `batch_size` rows at a time, from a
+        server-side cursor"""
+        filters = filters or {}
+        filter_keys = tuple(sorted(filters))
+        query = self._statement(
+            ("stream_all", filter_keys),
+            lambda: f"""
+                SELECT
+                    b.id,
+                    b.title,
+                    a.name AS author_name,
+                    b.genre,
+                    b.published_year
+                FROM {self.table_name} b
+                JOIN authors a ON b.author_id = a.id
+                {"WHERE " + " AND ".join(self._filter_conditions[key] for key in filter_keys) if filter_keys else ""}
+                ORDER BY b.id
+            """,
+        )
+        result = await self.uow.session.stream(query, filters, execution_options={"yield_per": batch_size})
+        async for books in result.mappings().partitions(batch_size):
+            yield books
+
 
 class AuthorsRepository(PostgresRepository):
     model_class = Author
 
     async def retrieve_by_name(self, author_name: str):
-        query = text(f"SELECT * FROM {self.table_name} WHERE name = :name")
+        query = self._statement("retrieve_by_name", lambda: f"SELECT * FROM {self.table_name} WHERE name = :name")
         result = await self.uow.session.execute(query, {"name": author_name})
         return result.fetchone()
 
     async def retrieve_by_names(self, author_names: Iterable[str]):
-        query = text(f"SELECT * FROM {self.table_name} WHERE name = ANY(:names)")
+        query = self._statement(
+            "retrieve_by_names", lambda: f"SELECT * FROM {self.table_name} WHERE name = ANY(:names)"
+        )
         result = await self.uow.session.execute(query, {"names": author_names})
         return result.fetchall()
 
@@ -75,11 +292,98 @@ class UsersRepository(PostgresRepository):
     model_class = User
 
     async def retrieve_by_username(self, username: str):
-        query = text(f"SELECT * FROM {self.table_name} WHERE username = :username")
+        query = self._statement(
+            "retrieve_by_username", lambda: f"SELECT * FROM {self.table_name} WHERE username = :username"
+        )
         result = await self.uow.session.execute(query, {"username": username})
         return result.fetchone()
 
     async def retrieve_by_email(self, email: str):
-        query = text(f"SELECT * FROM {self.table_name} WHERE email = :email")
+        query = self._statement("retrieve_by_email", lambda: f"SELECT * FROM {self.table_name} WHERE email = :email")
         result = await self.uow.session.execute(query, {"email": email})
         return result.fetchone()
+
+
+class ExportJobsRepository(PostgresRepository):
+    model_class = ExportJob
+
+
+class ImportJobsRepository(PostgresRepository):
+    model_class = ImportJob
+
+    # a running job is done once its file is parsed (`chunks_total` known) and every chunk is recorded
+    _completion = """
+            status = CASE WHEN status = 'running' AND {chunks_done} = {chunks_total} THEN 'completed' ELSE status END,
+            finished_at = CASE
+                WHEN status = 'running' AND {chunks_done} = {chunks_total} THEN now() ELSE finished_at
+            END
+    """
+
+    async def start(self, job_id: str) -> None:
+        query = self._statement(
+            "start", lambda: f"UPDATE {self.table_name} SET status = 'running' WHERE id = :id AND status = 'queued'"
+        )
+        self.uow.dirty = True
+        await self.uow.session.execute(query, {"id": job_id})
+
+    async def finish_parsing(self, job_id: str, chunks_total: int, total_items: int) -> None:
+        query = self._statement(
+            "finish_parsing",
+            lambda: f"""
+            UPDATE {self.table_name}
+            SET chunks_total = :chunks_total, total_items = :total_items,
+            {self._completion.format(chunks_done="cardinality(chunks_applied)", chunks_total=":chunks_total")}
+            WHERE id = :id
+        """,
+        )
+        self.uow.dirty = True
+        await self.uow.session.execute(query, {"id": job_id, "chunks_total": chunks_total, "total_items": total_items})
+
+    async def record_chunk(
+        self, job_id: str, chunk_index: int, successful: int, failed_info: list[dict], max_failures: int
+    ) -> bool:
+        """Counts one processed chunk, unless it was already recorded; its failures are kept while the job has fewer
+        than `max_failures`. False when the chunk was already recorded"""
+        # the right-hand sides all see the row as it was before the update. A concurrent recording of the same chunk
+        # waits for the row lock and then re-checks the condition against the committed row
+        query = self._statement(
+            "record_chunk",
+            lambda: f"""
+            UPDATE {self.table_name}
+            SET successful = successful + :successful,
+                failed = failed + :failed,
+                failed_info = (
+                    SELECT coalesce(jsonb_agg(value ORDER BY ordinality), '[]'::jsonb)
+                    FROM jsonb_array_elements(failed_info || CAST(:failed_info AS jsonb)) WITH ORDINALITY
+                    WHERE ordinality <= :max_failures
+                ),
+                chunks_applied = array_append(chunks_applied, :chunk_index),
+            {self._completion.format(chunks_done="cardinality(chunks_applied) + 1", chunks_total="chunks_total")}
+            WHERE id = :id AND NOT (:chunk_index = ANY(chunks_applied))
+        """,
+        )
+        self.uow.dirty = True
+        result = await self.uow.session.execute(
+            query,
+            {
+                "id": job_id,
+                "chunk_index": chunk_index,
+                "successful": successful,
+                "failed": len(failed_info),
+                "failed_info": json.dumps(failed_info, default=str),
+                "max_failures": max_failures,
+            },
+        )
+        return result.rowcount == 1
+
+    async def fail(self, job_id: str, error: str) -> None:
+        query = self._statement(
+            "fail",
+            lambda: f"""
+                UPDATE {self.table_name}
+                SET status = 'failed', error = :error, finished_at = now()
+                WHERE id = :id
+            """,
+        )
+        self.uow.dirty = True
+        await self.uow.session.execute(query, {"id": job_id, "error": error})
@@ -1,23 +1,58 @@
+import time
+
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
 
+from monitoring.database import database_monitor
 from repositories.base import AbstractUnitOfWork
-from repositories.postgres.books import AuthorsRepository, BooksRepository, UsersRepository
+from repositories.postgres.books import (
+    AuthorsRepository,
+    BooksRepository,
+    ExportJobsRepository,
+    ImportJobsRepository,
+    UsersRepository,
+)
+from repositories.postgres.routing import ReplicaRouter
 
 
 class PostgresUnitOfWork(AbstractUnitOfWork):
-    def __init__(self, engine=None):
+    """Unit of work on the primary `engine`.
+
+    With `read_only`, transactions are opened read-only and run on a replica picked by `replicas` (on the primary
+    when there are no replicas).
+    """
+
+    conflict_errors = (IntegrityError,)
+
+    def __init__(self, engine=None, read_only: bool = False, replicas: ReplicaRouter | None = None):
         self._engine = engine
         self._session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
         self.session = None
+        self.read_only = read_only
+        self._replicas = replicas
+        self.reads_replicas = read_only and replicas is not None
+        # set by repository writes; `has_written` once such a transaction is committed
+        self.dirty = False
+        self.has_written = False
 
         self.books = BooksRepository(self)
         self.authors = AuthorsRepository(self)
         self.users = UsersRepository(self)
+        self.import_jobs = ImportJobsRepository(self)
+        self.export_jobs = ExportJobsRepository(self)
 
     async def __aenter__(self):
         if not hasattr(self, "session") or self.session is None:
-            self.session = self._session_factory()
+            engine = self._engine
+            if self.read_only and self._replicas is not None:
+                engine = self._replicas.choose()
+            self.session = self._session_factory(bind=engine)
+
+            # acquired up front rather than on the first query, to measure how long the pool keeps us waiting
+            started = time.perf_counter()
+            await self.session.connection(execution_options={"postgresql_readonly": True} if self.read_only else None)
+            database_monitor.record_acquire(time.perf_counter() - started)
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -26,5 +61,7 @@ class PostgresUnitOfWork(AbstractUnitOfWork):
                 await self.session.rollback()
             else:
                 await self.session.commit()
+                self.has_written = self.has_written or self.dirty
+            self.dirty = False
             await self.session.close()
             self.session = None
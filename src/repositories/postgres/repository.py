@@ -1,4 +1,7 @@
-from sqlalchemy import text
+import enum
+from typing import Callable, Hashable
+
+from sqlalchemy import TextClause, text
 
 from repositories.base import AbstractRepository
 
@@ -6,44 +9,60 @@ from repositories.base import AbstractRepository
 class PostgresRepository(AbstractRepository):
     model_class = None
 
+    # statements are built once per (repository, operation, shape) and then reused: SQLAlchemy's compiled cache
+    # and the asyncpg prepared statement cache of each connection are hit instead of rebuilding and re-preparing
+    _statements: dict[tuple, TextClause] = {}
+
     def __init__(self, uow, id_field: str = "id"):
         self.uow = uow
         self.id_field = id_field
         self.table_name = self.model_class.__tablename__
 
+    def _statement(self, key: Hashable, build: Callable[[], str]) -> TextClause:
+        """`text(build())`, cached by `key`; the key must capture everything the SQL depends on"""
+        cache_key = (type(self), self.id_field, key)
+        statement = self._statements.get(cache_key)
+        if statement is None:
+            statement = self._statements[cache_key] = text(build())
+        return statement
+
     async def create(self, data: dict) -> dict:
-        fields = ", ".join(data.keys())
-        placeholders = ", ".join(f":{key}" for key in data.keys())
-        query = text(
-            f"""
-            INSERT INTO {self.table_name} ({fields})
-            VALUES ({placeholders})
+        fields = tuple(data.keys())
+        query = self._statement(
+            ("create", fields),
+            lambda: f"""
+            INSERT INTO {self.table_name} ({", ".join(fields)})
+            VALUES ({", ".join(f":{key}" for key in fields)})
             RETURNING *
-        """
+        """,
         )
+        self.uow.dirty = True
         result = await self.uow.session.execute(query, data)
         return result.fetchone()
 
     async def retrieve(self, reference: int) -> dict | None:
-        query = text(f"SELECT * FROM {self.table_name} WHERE {self.id_field} = :id")
+        query = self._statement("retrieve", lambda: f"SELECT * FROM {self.table_name} WHERE {self.id_field} = :id")
         result = await self.uow.session.execute(query, {"id": reference})
         return result.fetchone()
 
     async def update(self, reference: int, data: dict) -> dict:
-        set_clause = ", ".join(f"{key} = :{key}" for key in data.keys())
-        query = text(
-            f"""
+        fields = tuple(data.keys())
+        query = self._statement(
+            ("update", fields),
+            lambda: f"""
             UPDATE {self.table_name}
-            SET {set_clause}
+            SET {", ".join(f"{key} = :{key}" for key in fields)}
             WHERE {self.id_field} = :id
             RETURNING *
-        """
+        """,
         )
+        self.uow.dirty = True
         result = await self.uow.session.execute(query, {**data, "id": reference})
         return result.fetchone()
 
     async def delete(self, reference: int) -> None:
-        query = text(f"DELETE FROM {self.table_name} WHERE {self.id_field} = :id")
+        query = self._statement("delete", lambda: f"DELETE FROM {self.table_name} WHERE {self.id_field} = :id")
+        self.uow.dirty = True
         await self.uow.session.execute(query, {"id": reference})
 
     async def bulk_create(self, data: list[dict]) -> list[dict]:
@@ -71,16 +90,64 @@ class PostgresRepository(AbstractRepository):
         """
         )
 
+        self.uow.dirty = True
         result = await self.uow.session.execute(query, params)
         return result.fetchall()
 
+    async def bulk_copy(self, data: list[dict]) -> list[dict]:
+        """Create multiple rows at once through COPY into a temporary staging table.
+
+        Unlike `bulk_create` it sends no bind parameters, so it is not limited by their number per statement.
+        """
+        if not data:
+            return []
+
+        fields = list(data[0].keys())
+        field_names = ", ".join(fields)
+        staging_table_name = f"staging_{self.table_name}"
+
+        self.uow.dirty = True
+        # runs through the session first, so the COPY below joins the session's transaction
+        await self.uow.session.execute(
+            text(
+                f"""
+            CREATE TEMPORARY TABLE {staging_table_name} ON COMMIT DROP AS
+            SELECT {field_names} FROM {self.table_name} WITH NO DATA
+        """
+            )
+        )
+
+        connection = await self.uow.session.connection()
+        raw_connection = await connection.get_raw_connection()
+        records = [
+            tuple(value.value if isinstance(value, enum.Enum) else value for value in (item[field] for field in fields))
+            for item in data
+        ]
+        await raw_connection.driver_connection.copy_records_to_table(
+            staging_table_name, records=records, columns=fields
+        )
+
+        result = await self.uow.session.execute(
+            text(
+                f"""
+            INSERT INTO {self.table_name} ({field_names})
+            SELECT {field_names} FROM {staging_table_name}
+            RETURNING *;
+        """
+            )
+        )
+        created = result.fetchall()
+        await self.uow.session.execute(text(f"DROP TABLE {staging_table_name}"))
+        return created
+
     async def get_all(self, offset: int, limit: int, sort_by: str = "id") -> list[dict]:
-        query = text(
-            f"""
+        query = self._statement(
+            ("get_all", sort_by),
+            lambda: f"""
             SELECT * FROM {self.table_name}
             ORDER BY {sort_by}
             OFFSET :offset LIMIT :limit
-        """
+        """,
         )
         result = await self.uow.session.execute(query, {"offset": offset, "limit": limit})
         return result.fetchall()
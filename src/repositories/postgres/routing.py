@@ -0,0 +1,84 @@
+import logging
+import time
+
+import redis.asyncio as redis
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from cache import LocalTTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaRouter:
+    """Picks the replica engine a read-only unit of work runs on.
+
+    `round_robin` rotates through the replicas, `least_busy` takes the one with the fewest checked-out connections
+    (ties are broken in round-robin order).
+    """
+
+    strategies = ("round_robin", "least_busy")
+
+    def __init__(self, engines: list[AsyncEngine], strategy: str = "round_robin") -> None:
+        if not engines:
+            raise ValueError("At least one replica engine is required")
+        if strategy not in self.strategies:
+            raise ValueError(f"Unknown replica strategy '{strategy}'. Use one of {', '.join(self.strategies)}")
+
+        self.engines = engines
+        self.strategy = strategy
+        self._next = 0
+
+    def choose(self) -> AsyncEngine:
+        start = self._next % len(self.engines)
+        self._next += 1
+        if self.strategy == "round_robin":
+            return self.engines[start]
+
+        rotated = self.engines[start:] + self.engines[:start]
+        return min(rotated, key=lambda engine: engine.pool.checkedout())
+
+
+class RecentWrites:
+    """Who wrote within the last `window` seconds, so their reads can go to the primary (read-your-writes).
+
+    Kept in Redis when connected, so a follow-up request served by another worker sees the mark too, and in a
+    per-worker `LocalTTLCache` otherwise.
+    """
+
+    def __init__(self, window: float, max_size: int = 10000) -> None:
+        self.window = window
+        self.local = LocalTTLCache(max_size=max_size, ttl=window)
+        self.redis: redis.Redis | None = None
+
+    def connect(self, redis_connection: redis.Redis | None) -> None:
+        self.redis = redis_connection
+
+    @staticmethod
+    def _redis_key(subject: str) -> str:
+        return f"recent-writes:{subject}"
+
+    async def mark(self, subject: str) -> None:
+        self.local.set(subject, time.time())
+        if self.redis is None:
+            return
+
+        try:
+            await self.redis.set(self._redis_key(subject), 1, px=int(self.window * 1000))
+        except redis.RedisError:
+            logger.warning("Could not record a recent write in Redis", exc_info=True)
+
+    async def is_recent(self, subject: str) -> bool:
+        if self.local.get(subject) is not None:
+            return True
+        if self.redis is None:
+            return False
+
+        try:
+            return bool(await self.redis.exists(self._redis_key(subject)))
+        except redis.RedisError:
+            logger.warning("Could not check recent writes in Redis", exc_info=True)
+            # unknown, the primary is always consistent
+            return True
+
+    def reset(self) -> None:
+        self.local.clear()
@@ -1,9 +1,31 @@
+import time
+from types import SimpleNamespace
+
 import pytest
+import pytest_asyncio
+from fastapi_limiter.depends import RateLimiter
 from httpx import AsyncClient
 
+import cache
+from auth.services import password_hasher
+from auth.use_cases import DeactivateUserUseCase, RegisterUserUseCase
+from config import settings
+from dependencies import get_unit_of_work
+from exceptions import ValidationError
+from main import application
+from repositories.fake.containers import FakeDatabase, FakeUnitOfWork
 from tests.base import BaseAPITest
 
 
+@pytest_asyncio.fixture(loop_scope="function", scope="function")
+def override_unit_of_work(uow):
+    """Real unit of work with the real authentication, unlike `override_dependencies`"""
+    application.dependency_overrides[get_unit_of_work] = lambda: uow
+    application.dependency_overrides[RateLimiter] = lambda: None
+    yield
+    application.dependency_overrides.clear()
+
+
 @pytest.mark.asyncio
 class TestAuthAPI(BaseAPITest):
     async def test_register_user_success(
@@ -70,6 +92,13 @@ class TestAuthAPI(BaseAPITest):
         assert response.status_code == 422
         assert "Password must be at least 8 characters" in response.text
 
+    async def test_register_user_hasher_saturated(self, client: AsyncClient, override_dependencies, monkeypatch):
+        monkeypatch.setattr(password_hasher, "queue_limit", 0)
+        user_data = {"username": "busyuser", "email": "busy@example.com", "password": "password123"}
+        response = await client.post("/auth/register", json=user_data)
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
     async def test_login_success(
         self,
         client: AsyncClient,
@@ -142,3 +171,74 @@ class TestAuthAPI(BaseAPITest):
         response = await client.post("/auth/token", data=form_data)
         assert response.status_code == 401
         assert "Incorrect username or password" in response.text
+
+    async def test_deactivated_user_is_rejected(self, client: AsyncClient, uow, override_unit_of_work):
+        await self._create_user(client, username="activeuser", email="active@example.com", password="password123")
+        response = await client.post("/auth/token", data={"username": "activeuser", "password": "password123"})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        for _ in range(2):
+            response = await client.get("/internal/cache-stats", headers=headers)
+            assert response.status_code == 200
+        assert response.json()["principals"]["local_hits"] == 1
+
+        await DeactivateUserUseCase(uow)("activeuser")
+        response = await client.get("/internal/cache-stats", headers=headers)
+        assert response.status_code == 403
+        assert "Account is inactive" in response.text
+
+    async def test_deactivation_bypassing_the_use_case_applies_once_cached_principal_expires(
+        self, client: AsyncClient, uow, override_unit_of_work, monkeypatch
+    ):
+        await self._create_user(client, username="staleuser", email="stale@example.com", password="password123")
+        response = await client.post("/auth/token", data={"username": "staleuser", "password": "password123"})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        assert (await client.get("/internal/cache-stats", headers=headers)).status_code == 200
+
+        # e.g. an UPDATE run on the database directly: nothing evicts the cached principal
+        async with uow:
+            user = await uow.users.retrieve_by_username("staleuser")
+            await uow.users.update(user.id, {"is_active": False})
+        assert (await client.get("/internal/cache-stats", headers=headers)).status_code == 200
+
+        expired_at = time.monotonic() + settings.PRINCIPAL_CACHE_TTL_SECONDS + 1
+        monkeypatch.setattr(cache, "time", SimpleNamespace(monotonic=lambda: expired_at))
+        response = await client.get("/internal/cache-stats", headers=headers)
+        assert response.status_code == 403
+        assert "Account is inactive" in response.text
+
+
+@pytest.mark.asyncio
+async def test_register_hashes_outside_the_unit_of_work(monkeypatch):
+    uow = FakeUnitOfWork(FakeDatabase())
+    hash_password = password_hasher.hash
+    in_transaction = []
+
+    async def hash_outside(password: str) -> str:
+        # a transaction is open while `FakeUnitOfWork` collects its undo log
+        in_transaction.append(uow._undo is not None)
+        return await hash_password(password)
+
+    monkeypatch.setattr(password_hasher, "hash", hash_outside)
+    user_data = {"username": "newuser", "email": "new@example.com", "password": "password123"}
+    await RegisterUserUseCase(uow)(user_data)
+    assert in_transaction == [False]
+
+
+@pytest.mark.asyncio
+async def test_register_concurrent_duplicate_username():
+    database = FakeDatabase()
+    uow = FakeUnitOfWork(database)
+    create = uow.users.create
+
+    async def create_after_concurrent_registration(data: dict):
+        # another request registers the same username between the check and the insert
+        async with FakeUnitOfWork(database) as other_uow:
+            await other_uow.users.create({**data, "email": "other@example.com"})
+        return await create(data)
+
+    uow.users.create = create_after_concurrent_registration
+    user_data = {"username": "raceuser", "email": "race@example.com", "password": "password123"}
+    with pytest.raises(ValidationError) as error:
+        await RegisterUserUseCase(uow)(user_data)
+    assert error.value.field == "username"
@@ -1,13 +1,30 @@
+import asyncio
+import gzip
+import io
 import json
+import time
+from types import SimpleNamespace
 
+import pyarrow
+import pyarrow.parquet as pq
 import pytest
+import zstandard
 from httpx import AsyncClient
+from sqlalchemy import event
 
+import dependencies
 from book_management.models import Genre
+from book_management.services.books import JSONFileParser
+from book_management.services.pagination import CursorCodec
+from book_management.use_cases.books import ImportBooksChunkUseCase, RunImportJobUseCase
+from config import settings
 from dependencies import get_unit_of_work
 from main import application
+from repositories.postgres import books as postgres_books
+from repositories.postgres.books import BooksRepository
 from repositories.postgres.container import PostgresUnitOfWork
 from tests.base import BaseAPITest
+from worker import app as worker_app
 
 
 @pytest.mark.asyncio
@@ -54,6 +71,176 @@ class TestBooksAPI(BaseAPITest):
         assert response.status_code == 400
         assert "Invalid field 'invalid'" in response.text
 
+    async def test_retrieve_books_cursor_pagination(self, client: AsyncClient, override_dependencies):
+        for year in (2001, 2003, 2003, 2002):
+            await self._create_book(client, f"Book {year}", year=year)
+
+        response = await client.get("/books/?per_page=2&sort_by=published_year:desc")
+        assert response.status_code == 200
+        first_page = response.json()
+        assert [book["published_year"] for book in first_page] == [2003, 2003]
+
+        cursor = response.headers["X-Next-Cursor"]
+        response = await client.get(f"/books/?per_page=2&sort_by=published_year:desc&cursor={cursor}")
+        assert response.status_code == 200
+        second_page = response.json()
+        assert [book["published_year"] for book in second_page] == [2002, 2001]
+        assert not {book["id"] for book in first_page} & {book["id"] for book in second_page}
+
+    async def test_retrieve_books_invalid_cursor(self, client: AsyncClient, override_dependencies):
+        await self._create_book(client, "Book A")
+        await self._create_book(client, "Book B")
+        response = await client.get("/books/?per_page=1&sort_by=title:asc")
+        cursor = response.headers["X-Next-Cursor"]
+
+        response = await client.get(f"/books/?sort_by=title:desc&cursor={cursor}")
+        assert response.status_code == 400
+        assert "Cursor was issued for sort_by 'title:asc'" in response.text
+
+        response = await client.get("/books/?cursor=not-a-cursor")
+        assert response.status_code == 400
+        assert "Invalid cursor" in response.text
+
+        for sort_by, cursor in [
+            ("title:asc", CursorCodec.encode("title:asc", "Book A", True)),
+            ("published_year:asc", CursorCodec.encode("published_year:asc", False, 1)),
+        ]:
+            response = await client.get(f"/books/?sort_by={sort_by}&cursor={cursor}")
+            assert response.status_code == 400
+            assert "Invalid cursor" in response.text
+
+    @pytest.mark.parametrize("count", ["exact", "estimated", "cached"])
+    async def test_retrieve_books_with_count(self, client: AsyncClient, override_dependencies, count):
+        await self._create_book(client, "Book A")
+        await client.get(f"/books/?count={count}")
+        await self._create_book(client, "Book B")
+        book = await self._create_book(client, "Book C")
+        await client.delete(f"/books/{book['id']}")
+
+        response = await client.get(f"/books/?per_page=1&count={count}")
+        assert response.status_code == 200
+        data = response.json()
+        assert [item["title"] for item in data["items"]] == ["Book A"]
+        assert data["total"] == 2
+        assert data["total_is_estimate"] is (count == "cached")
+        assert data["next_cursor"] == response.headers["X-Next-Cursor"]
+
+    async def test_retrieve_books_invalid_count(self, client: AsyncClient, override_dependencies):
+        response = await client.get("/books/?count=approximate")
+        assert response.status_code == 400
+        assert "Invalid count 'approximate'" in response.text
+
+    async def test_retrieve_books_filtered(self, client: AsyncClient, override_dependencies):
+        for title, genre, year in [
+            ("Science 1989", "Science", 1989),
+            ("Science 1995", "Science", 1995),
+            ("History 1995", "History", 1995),
+            ("Science 2000", "Science", 2000),
+        ]:
+            await self._create_book(client, title, genre=genre, year=year)
+        book_data = {"title": "Other Author", "author_name": "Someone Else", "genre": "Science", "published_year": 1995}
+        other = (await client.post("/books/", json=book_data)).json()
+
+        response = await client.get("/books/?genre=Science&year_from=1990&year_to=2000&count=estimated")
+        assert response.status_code == 200
+        data = response.json()
+        assert [item["title"] for item in data["items"]] == ["Other Author", "Science 1995", "Science 2000"]
+        # filtered totals are always counted exactly
+        assert data["total"] == 3
+        assert data["total_is_estimate"] is False
+
+        response = await client.get("/books/?author=Someone%20Else")
+        assert [book["id"] for book in response.json()] == [other["id"]]
+
+        response = await client.get("/books/export?format=csv&year_to=1990")
+        assert response.status_code == 200
+        assert response.text.count("\n") == 2
+        assert "Science 1989" in response.text
+
+    @pytest.mark.parametrize(
+        "query, message",
+        [
+            ("genre=Poetry", "Invalid genre 'Poetry'"),
+            ("year_from=2000&year_to=1990", "year_from 2000 is after year_to 1990"),
+            ("author_id=0", "Invalid author_id 0"),
+        ],
+    )
+    async def test_retrieve_books_invalid_filter(self, client: AsyncClient, override_dependencies, query, message):
+        response = await client.get(f"/books/?{query}")
+        assert response.status_code == 400
+        assert message in response.text
+
+    async def test_search_books_ranked(self, client: AsyncClient, override_dependencies):
+        for title, author_name in [
+            ("Gardening", "Monty Python"),
+            ("Python Cookbook", "David Beazley"),
+            ("Cooking Basics", "Jane Doe"),
+        ]:
+            book_data = {"title": title, "author_name": author_name, "genre": "Science", "published_year": 2020}
+            response = await client.post("/books/", json=book_data)
+            assert response.status_code == 200
+
+        response = await client.get("/books/search?q=python")
+        assert response.status_code == 200
+        # title matches rank above author matches
+        assert [book["title"] for book in response.json()] == ["Python Cookbook", "Gardening"]
+
+    async def test_search_books_cursor_pagination(self, client: AsyncClient, override_dependencies):
+        for title in ("Dune", "Dune Messiah", "Children of Dune", "Foundation"):
+            await self._create_book(client, title)
+
+        response = await client.get("/books/search?q=dune&limit=2")
+        assert response.status_code == 200
+        first_page = response.json()
+        assert len(first_page) == 2
+
+        cursor = response.headers["X-Next-Cursor"]
+        response = await client.get(f"/books/search?q=dune&limit=2&cursor={cursor}")
+        assert response.status_code == 200
+        second_page = response.json()
+        assert len(second_page) == 1
+        assert {book["title"] for book in first_page + second_page} == {"Dune", "Dune Messiah", "Children of Dune"}
+
+        response = await client.get(f"/books/search?q=foundation&cursor={cursor}")
+        assert response.status_code == 400
+        assert "Cursor was issued for" in response.text
+
+    async def test_has_extension_looks_a_missing_one_up_again(self, uow: PostgresUnitOfWork, async_engine, monkeypatch):
+        lookups = []
+
+        def record_lookup(conn, cursor, statement, parameters, context, executemany):
+            if "pg_extension" in statement:
+                lookups.append(statement)
+
+        event.listen(async_engine.sync_engine, "before_cursor_execute", record_lookup)
+        for _ in range(2):
+            async with uow:
+                assert await uow.books.has_extension("plpgsql")
+                assert not await uow.books.has_extension("not_installed")
+        assert len(lookups) == 2
+
+        # e.g. installed meanwhile: only the missing one is looked up again
+        recheck_at = time.monotonic() + BooksRepository._missing_extension_recheck_seconds
+        monkeypatch.setattr(postgres_books, "time", SimpleNamespace(monotonic=lambda: recheck_at))
+        async with uow:
+            assert await uow.books.has_extension("plpgsql")
+            assert not await uow.books.has_extension("not_installed")
+        assert len(lookups) == 3
+
+    async def test_search_books_typo(self, client: AsyncClient, override_dependencies, uow: PostgresUnitOfWork):
+        if not await uow.books.has_extension("pg_trgm"):
+            pytest.skip("pg_trgm is not installed")
+        await self._create_book(client, "Python Cookbook")
+
+        response = await client.get("/books/search?q=pythn")
+        assert response.status_code == 200
+        assert [book["title"] for book in response.json()] == ["Python Cookbook"]
+
+    async def test_search_books_empty_query(self, client: AsyncClient, override_dependencies):
+        response = await client.get("/books/search?q=%20")
+        assert response.status_code == 400
+        assert "Search query must not be empty" in response.text
+
     async def test_retrieve_book_success(self, client: AsyncClient, override_dependencies):
         book = await self._create_book(client, "Single Book")
         response = await client.get(f"/books/{book['id']}")
@@ -82,6 +269,78 @@ class TestBooksAPI(BaseAPITest):
         assert data["title"] == "New Title"
         assert data["id"] == book["id"]
 
+    async def test_retrieve_book_cached_until_updated(self, client: AsyncClient, override_dependencies):
+        book = await self._create_book(client, "Cached Title")
+        for _ in range(2):
+            response = await client.get(f"/books/{book['id']}")
+            assert response.json()["title"] == "Cached Title"
+
+        update_data = {**book, "title": "Fresh Title"}
+        await client.put(f"/books/{book['id']}", json=update_data)
+        response = await client.get(f"/books/{book['id']}")
+        assert response.json()["title"] == "Fresh Title"
+
+        response = await client.get("/internal/cache-stats")
+        assert response.status_code == 200
+        stats = response.json()["books"]
+        assert stats["local_hits"] == 1
+        assert stats["misses"] == 2
+
+    async def test_retrieve_book_not_modified(self, client: AsyncClient, override_dependencies):
+        book = await self._create_book(client, "Tagged Title")
+        response = await client.get(f"/books/{book['id']}")
+        etag = response.headers["ETag"]
+
+        response = await client.get(f"/books/{book['id']}", headers={"If-None-Match": f"W/{etag}"})
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+
+        await client.put(f"/books/{book['id']}", json={**book, "title": "Retagged Title"})
+        response = await client.get(f"/books/{book['id']}", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json()["title"] == "Retagged Title"
+        assert response.headers["ETag"] != etag
+
+    async def test_retrieve_books_not_modified(self, client: AsyncClient, override_dependencies):
+        await self._create_book(client, "First Book")
+        response = await client.get("/books/?sort_by=title:asc")
+        etag = response.headers["ETag"]
+
+        response = await client.get("/books/?sort_by=title:asc", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        for query in ("sort_by=invalid:asc", "cursor=garbage", "genre=Unknown", "count=everything"):
+            response = await client.get(f"/books/?{query}", headers={"If-None-Match": etag})
+            assert response.status_code == 400
+
+        await self._create_book(client, "Second Book")
+        response = await client.get("/books/?sort_by=title:asc", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert [book["title"] for book in response.json()] == ["First Book", "Second Book"]
+
+    async def test_retrieve_books_cached_until_written(
+        self, client: AsyncClient, override_dependencies, uow: PostgresUnitOfWork
+    ):
+        book = await self._create_book(client, "Listed Book")
+        for _ in range(2):
+            response = await client.get("/books/?per_page=5")
+            assert [item["title"] for item in response.json()] == ["Listed Book"]
+
+        # written around the use cases, the catalog generation does not change
+        async with uow:
+            await uow.books.update(book["id"], {"title": "Renamed Book"})
+        response = await client.get("/books/?per_page=5")
+        assert [item["title"] for item in response.json()] == ["Listed Book"]
+
+        await self._create_book(client, "Another Book")
+        response = await client.get("/books/?per_page=5")
+        assert [item["title"] for item in response.json()] == ["Another Book", "Renamed Book"]
+
+        response = await client.get("/internal/cache-stats")
+        stats = response.json()["listings"]
+        assert stats["local_hits"] == 2
+        assert stats["misses"] == 2
+
     async def test_update_book_not_found(self, client: AsyncClient, override_dependencies):
         update_data = {
             "id": 9999,
@@ -115,10 +374,51 @@ class TestBooksAPI(BaseAPITest):
         data = json.loads(response.text)
         assert any(book["title"] == "Export Book" for book in data)
 
+    async def test_export_books_csv_success(self, client: AsyncClient, override_dependencies):
+        await self._create_book(client, "Export Book A")
+        await self._create_book(client, "Export Book B")
+        response = await client.get("/books/export?format=csv")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        rows = response.text.strip().splitlines()
+        assert rows[0] == "id,title,author_name,genre,published_year"
+        assert len(rows) == 3
+
     async def test_export_books_invalid_format(self, client: AsyncClient, override_dependencies):
         response = await client.get("/books/export?format=xml")
         assert response.status_code == 400
-        assert "Format must be 'json' or 'csv'" in response.text
+        assert "Format must be one of 'json', 'csv', 'ndjson', 'arrow', 'parquet'" in response.text
+
+    async def test_export_books_ndjson_gzip(self, client: AsyncClient, override_dependencies):
+        await self._create_book(client, "Export Book A")
+        await self._create_book(client, "Export Book B")
+        response = await client.get("/books/export?format=ndjson&compression=gzip")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/gzip"
+        assert "filename=books_export.ndjson.gz" in response.headers["content-disposition"]
+        lines = gzip.decompress(response.content).decode().splitlines()
+        assert [json.loads(line)["title"] for line in lines] == ["Export Book A", "Export Book B"]
+
+    async def test_export_books_parquet(self, client: AsyncClient, override_dependencies, monkeypatch):
+        monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+        for year in (2001, 2002, 2003):
+            await self._create_book(client, f"Book {year}", Genre.HISTORY.value, year=year)
+        response = await client.get("/books/export?format=parquet")
+        assert response.status_code == 200
+        parquet_file = pq.ParquetFile(io.BytesIO(response.content))
+        # a row group per batch
+        assert parquet_file.num_row_groups == 2
+        books = parquet_file.read().to_pylist()
+        assert [(book["published_year"], book["genre"]) for book in books] == [
+            (2001, "History"),
+            (2002, "History"),
+            (2003, "History"),
+        ]
+
+    async def test_export_books_invalid_compression(self, client: AsyncClient, override_dependencies):
+        response = await client.get("/books/export?format=csv&compression=brotli")
+        assert response.status_code == 400
+        assert "Compression must be one of 'gzip', 'zstd'" in response.text
 
     async def test_bulk_import_books_success(self, client: AsyncClient, override_dependencies):
         csv_content = "title,author_name,genre,published_year\nBulk Book,Bulk Author,Fiction,2024"
@@ -131,6 +431,64 @@ class TestBooksAPI(BaseAPITest):
         assert data["successful"] == 1
         assert data["failed"] == 0
 
+    async def test_bulk_import_books_json_in_batches(self, client: AsyncClient, override_dependencies, monkeypatch):
+        monkeypatch.setattr(settings, "IMPORT_BATCH_SIZE", 2)
+        monkeypatch.setattr(settings, "IMPORT_CHUNK_SIZE", 16)
+        books_data = [
+            {"title": f"Batch Book {index}", "author_name": "Batch Author", "genre": "Science", "published_year": 2020}
+            for index in range(5)
+        ]
+        books_data.append(
+            {"title": "Too Old", "author_name": "Batch Author", "genre": "Science", "published_year": 1500}
+        )
+        response = await client.post(
+            "/books/bulk-import",
+            files={"file": ("books.json", json.dumps(books_data), "application/json")},
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total_items"] == 6
+        assert data["successful"] == 5
+        assert data["failed"] == 1
+        assert data["failed_info"][0]["data"]["title"] == "Too Old"
+
+    async def test_bulk_import_books_malformed_tail(self, client: AsyncClient, override_dependencies, monkeypatch):
+        monkeypatch.setattr(settings, "IMPORT_BATCH_SIZE", 2)
+        books_data = [
+            {"title": f"Book {index}", "author_name": "Author", "genre": "Science", "published_year": 2020}
+            for index in range(3)
+        ]
+        content = json.dumps(books_data)[:-1] + ', {"title": "Cut off'
+        response = await client.post("/books/bulk-import", files={"file": ("books.json", content, "application/json")})
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["total_items"], data["successful"], data["failed"]) == (3, 3, 0)
+        assert data["error"].startswith("File parsing error")
+
+        # the rows before the error are imported, the first batch of them already before it was reached
+        response = await client.get("/books/?sort_by=title:asc")
+        assert [book["title"] for book in response.json()] == ["Book 0", "Book 1", "Book 2"]
+
+    async def test_bulk_import_books_copy(self, client: AsyncClient, override_dependencies, monkeypatch):
+        monkeypatch.setattr(settings, "BULK_COPY_THRESHOLD", 1)
+        csv_content = (
+            "title,author_name,genre,published_year\n"
+            "Copy Book,Copy Author,Fiction,2024\n"
+            "Copy Book 2,Other,History,1999"
+        )
+        response = await client.post(
+            "/books/bulk-import",
+            files={"file": ("books.csv", csv_content, "text/csv")},
+        )
+        assert response.status_code == 200
+        assert response.json()["successful"] == 2
+
+        response = await client.get("/books/?sort_by=title:asc")
+        assert [(book["title"], book["author_name"], book["genre"]) for book in response.json()] == [
+            ("Copy Book", "Copy Author", "Fiction"),
+            ("Copy Book 2", "Other", "History"),
+        ]
+
     async def test_bulk_import_books_invalid_file(self, client: AsyncClient, override_dependencies):
         response = await client.post(
             "/books/bulk-import",
@@ -139,6 +497,189 @@ class TestBooksAPI(BaseAPITest):
         assert response.status_code == 400
         assert "Please ensure the file is in JSON or CSV format" in response.text
 
+    @pytest.fixture
+    def eager_jobs(self, async_engine, monkeypatch, tmp_path):
+        # tasks run on the test's event loop, with their own units of work on the test database
+        monkeypatch.setattr(worker_app.conf, "task_always_eager", True)
+        monkeypatch.setattr(dependencies, "engine", async_engine)
+        monkeypatch.setattr(settings, "IMPORT_SPOOL_DIR", str(tmp_path / "imports"))
+        monkeypatch.setattr(settings, "EXPORT_DIR", str(tmp_path / "exports"))
+
+    async def _wait_for_job(self, client: AsyncClient, location: str) -> dict:
+        for _ in range(100):
+            response = await client.get(location)
+            assert response.status_code == 200
+            job = response.json()
+            if job["status"] in ("completed", "failed"):
+                return job
+            await asyncio.sleep(0.05)
+        raise AssertionError(f"Import job did not finish: {job}")
+
+    async def test_import_job_success(
+        self, client: AsyncClient, override_dependencies, eager_jobs, monkeypatch, tmp_path
+    ):
+        monkeypatch.setattr(settings, "IMPORT_BATCH_SIZE", 2)
+        csv_content = "title,author_name,genre,published_year\n" + "".join(
+            f"Job Book {index},Job Author {index % 2},Fiction,2020\n" for index in range(5)
+        )
+        csv_content += "Too Old,Job Author 0,Fiction,1500\n"
+        response = await client.post(
+            "/books/import-jobs",
+            files={"file": ("books.csv", csv_content, "text/csv")},
+        )
+        assert response.status_code == 202
+        assert response.json()["status"] == "queued"
+
+        job = await self._wait_for_job(client, response.headers["Location"])
+        assert job["status"] == "completed"
+        assert job["total_items"] == 6
+        assert job["processed"] == 6
+        assert job["successful"] == 5
+        assert job["failed"] == 1
+        assert job["failed_info"][0]["data"]["title"] == "Too Old"
+        assert job["finished_at"] is not None
+        # the spooled upload is removed once parsed
+        assert list((tmp_path / "imports").iterdir()) == []
+
+        response = await client.get("/books/?sort_by=title:asc&per_page=10")
+        assert [book["title"] for book in response.json()] == [f"Job Book {index}" for index in range(5)]
+
+    async def test_import_job_parsing_error(self, client: AsyncClient, override_dependencies, eager_jobs):
+        response = await client.post(
+            "/books/import-jobs",
+            files={"file": ("books.json", '[{"title": "Broken"', "application/json")},
+        )
+        assert response.status_code == 202
+
+        job = await self._wait_for_job(client, response.headers["Location"])
+        assert job["status"] == "failed"
+        assert job["error"].startswith("File parsing error")
+
+    async def test_import_job_unsupported_file(self, client: AsyncClient, override_dependencies, eager_jobs):
+        response = await client.post(
+            "/books/import-jobs",
+            files={"file": ("books.txt", "invalid content", "text/csv")},
+        )
+        assert response.status_code == 400
+        assert "Unsupported file format" in response.text
+
+    async def test_import_job_not_found(self, client: AsyncClient, override_dependencies):
+        response = await client.get("/books/import-jobs/missing")
+        assert response.status_code == 404
+
+    async def test_import_job_chunk_delivered_twice(
+        self, client: AsyncClient, override_dependencies, async_engine, uow
+    ):
+        async with uow:
+            await uow.import_jobs.create({"id": "job", "filename": "books.csv"})
+            await uow.import_jobs.start("job")
+            await uow.import_jobs.finish_parsing("job", chunks_total=2, total_items=2)
+
+        rows = [{"title": "Once", "author_name": "Author", "genre": "Fiction", "published_year": 2020}]
+        # a worker lost after the commit, the broker delivers the chunk again
+        for _ in range(2):
+            await ImportBooksChunkUseCase(PostgresUnitOfWork(async_engine))("job", 0, rows, max_failures=10)
+
+        job = (await client.get("/books/import-jobs/job")).json()
+        assert (job["status"], job["successful"]) == ("running", 1)
+        response = await client.get("/books/?sort_by=title:asc")
+        assert [book["title"] for book in response.json()] == ["Once"]
+
+        rows = [{"title": "Twice", "author_name": "Author", "genre": "Fiction", "published_year": 2020}]
+        await ImportBooksChunkUseCase(PostgresUnitOfWork(async_engine))("job", 1, rows, max_failures=10)
+        job = (await client.get("/books/import-jobs/job")).json()
+        assert (job["status"], job["successful"]) == ("completed", 2)
+
+    async def test_import_job_run_again(self, client: AsyncClient, override_dependencies, async_engine, uow, tmp_path):
+        async with uow:
+            await uow.import_jobs.create({"id": "job", "filename": "books.csv"})
+        dispatched = []
+        path = tmp_path / "job"
+        path.write_text("title,author_name,genre,published_year\nA,Author,Fiction,2020\n")
+
+        use_case = RunImportJobUseCase(
+            PostgresUnitOfWork(async_engine), dispatch=lambda *chunk: dispatched.append(chunk)
+        )
+        await use_case("job", str(path), "books.csv", batch_size=10)
+        assert len(dispatched) == 1
+        assert not path.exists()
+        # delivered again once parsed: nothing left to do
+        await use_case("job", str(path), "books.csv", batch_size=10)
+        assert len(dispatched) == 1
+        assert (await client.get("/books/import-jobs/job")).json()["status"] == "running"
+
+    async def test_import_job_fails_on_any_error(self, client: AsyncClient, override_dependencies, async_engine, uow):
+        async with uow:
+            await uow.import_jobs.create({"id": "job", "filename": "books.csv"})
+
+        use_case = RunImportJobUseCase(PostgresUnitOfWork(async_engine), dispatch=lambda *chunk: None)
+        await use_case("job", "/nonexistent/spool/job", "books.csv", batch_size=10)
+
+        job = (await client.get("/books/import-jobs/job")).json()
+        assert job["status"] == "failed"
+        assert "No such file" in job["error"]
+
+    async def test_export_job_download(
+        self, client: AsyncClient, override_dependencies, eager_jobs, monkeypatch, tmp_path
+    ):
+        monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+        for title in ("Export A", "Export B", "Export C"):
+            await self._create_book(client, title, Genre.SCIENCE.value)
+        await self._create_book(client, "Not Exported", Genre.FICTION.value)
+
+        response = await client.post("/books/export-jobs?format=csv&genre=Science")
+        assert response.status_code == 202
+        job = await self._wait_for_job(client, response.headers["Location"])
+        assert job["status"] == "completed"
+        # only the finished file is left, under the job's id
+        assert [path.name for path in (tmp_path / "exports").iterdir()] == [job["id"]]
+
+        response = await client.get(f"/books/export-jobs/{job['id']}/download")
+        assert response.status_code == 200
+        assert response.headers["Content-Type"].startswith("text/csv")
+        assert response.headers["Accept-Ranges"] == "bytes"
+        assert int(response.headers["Content-Length"]) == job["size"] == len(response.content)
+        assert 'filename="books_export.csv"' in response.headers["Content-Disposition"]
+        content = response.content
+        assert [line.split(",")[1] for line in content.decode().splitlines()[1:]] == [
+            "Export A",
+            "Export B",
+            "Export C",
+        ]
+
+        # resumed from the 10th byte
+        response = await client.get(f"/books/export-jobs/{job['id']}/download", headers={"Range": "bytes=10-"})
+        assert response.status_code == 206
+        assert response.headers["Content-Range"] == f"bytes 10-{len(content) - 1}/{len(content)}"
+        assert response.content == content[10:]
+
+    async def test_export_job_compressed(self, client: AsyncClient, override_dependencies, eager_jobs):
+        await self._create_book(client, "Compressed")
+        response = await client.post("/books/export-jobs?format=arrow&compression=zstd")
+        job = await self._wait_for_job(client, response.headers["Location"])
+        assert (job["status"], job["compression"], job["filename"]) == ("completed", "zstd", "books_export.arrows.zst")
+
+        response = await client.get(f"/books/export-jobs/{job['id']}/download")
+        assert response.headers["Content-Type"] == "application/zstd"
+        content = zstandard.ZstdDecompressor().decompressobj().decompress(response.content)
+        assert pyarrow.ipc.open_stream(content).read_all().column("title").to_pylist() == ["Compressed"]
+
+    async def test_export_job_not_ready(self, client: AsyncClient, override_dependencies, uow):
+        async with uow:
+            await uow.export_jobs.create({"id": "pending", "format": "json", "filename": "books_export.json"})
+
+        response = await client.get("/books/export-jobs/pending")
+        assert response.json()["status"] == "queued"
+        response = await client.get("/books/export-jobs/pending/download")
+        assert response.status_code == 409
+
+        response = await client.get("/books/export-jobs/missing/download")
+        assert response.status_code == 404
+
+    async def test_export_job_invalid_filters(self, client: AsyncClient, override_dependencies):
+        response = await client.post("/books/export-jobs?genre=Unknown")
+        assert response.status_code == 400
+
     async def test_recommend_books_success(self, client: AsyncClient, override_dependencies):
         book1 = await self._create_book(client, "Book 1", Genre.FICTION.value)
         await self._create_book(client, "Book 2", Genre.SCIENCE.value)
@@ -150,6 +691,52 @@ class TestBooksAPI(BaseAPITest):
         assert len(recommendations) == 1
         assert recommendations[0]["genre"] == Genre.FICTION.value  # Should recommend similar book
 
+    async def test_recommend_books_follows_writes(self, client: AsyncClient, override_dependencies):
+        dragon_tales = await self._create_book(client, "Dragon Tales", Genre.FICTION.value)
+        await self._create_book(client, "Quantum Physics", Genre.SCIENCE.value)
+        response = await client.get(f"/books/recommendations/{dragon_tales['id']}?limit=1")
+        assert response.json()[0]["title"] == "Quantum Physics"
+
+        dragon_saga = await self._create_book(client, "Dragon Saga", Genre.FICTION.value)
+        response = await client.get(f"/books/recommendations/{dragon_tales['id']}?limit=1")
+        assert response.json()[0]["id"] == dragon_saga["id"]
+
+        await client.delete(f"/books/{dragon_saga['id']}")
+        response = await client.get(f"/books/recommendations/{dragon_tales['id']}?limit=5")
+        assert [book["title"] for book in response.json()] == ["Quantum Physics"]
+
+    async def test_recommend_books_batch_success(self, client: AsyncClient, override_dependencies):
+        dragon_tales = await self._create_book(client, "Dragon Tales", Genre.FICTION.value)
+        dragon_saga = await self._create_book(client, "Dragon Saga", Genre.FICTION.value)
+        quantum_physics = await self._create_book(client, "Quantum Physics", Genre.SCIENCE.value)
+        quantum_chemistry = await self._create_book(client, "Quantum Chemistry", Genre.SCIENCE.value)
+
+        response = await client.post(
+            "/books/recommendations:batch",
+            json={"book_ids": [dragon_tales["id"], quantum_physics["id"]], "limit": 1},
+        )
+        assert response.status_code == 200
+        assert response.json() == [
+            {"book_id": dragon_tales["id"], "recommendations": [dragon_saga]},
+            {"book_id": quantum_physics["id"], "recommendations": [quantum_chemistry]},
+        ]
+
+    async def test_recommend_books_batch_not_found(self, client: AsyncClient, override_dependencies):
+        book = await self._create_book(client, "Book 1")
+        response = await client.post("/books/recommendations:batch", json={"book_ids": [book["id"], 9999]})
+        assert response.status_code == 404
+        assert "Books with ids [9999] do not exist" in response.text
+
+    async def test_recommend_books_invalid_limit(self, client: AsyncClient, override_dependencies):
+        book = await self._create_book(client, "Book 1")
+        for limit in (0, -1, settings.RECOMMENDATION_MAX_LIMIT + 1):
+            response = await client.get(f"/books/recommendations/{book['id']}?limit={limit}")
+            assert response.status_code == 422
+            response = await client.post(
+                "/books/recommendations:batch", json={"book_ids": [book["id"]], "limit": limit}
+            )
+            assert response.status_code == 422
+
     async def test_recommend_books_not_found(self, client: AsyncClient, override_dependencies):
         response = await client.get("/books/recommendations/9999")
         assert response.status_code == 404
@@ -167,3 +754,21 @@ class TestBooksAPI(BaseAPITest):
         response = await client.post("/books/", json=book_data)
         assert response.status_code == 401
         application.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_json_parser_fails_early_on_malformed_item():
+    chunks_read = 0
+
+    async def chunks():
+        nonlocal chunks_read
+        yield '[{"title": "Broken" "author_name": "Author"}, '
+        for index in range(1000):
+            chunks_read += 1
+            yield json.dumps({"title": f"Book {index}"}) + ", "
+        yield "{}]"
+
+    with pytest.raises(ValueError, match="Malformed JSON item"):
+        async for _ in JSONFileParser(max_item_size=100).iter_parse(chunks()):
+            pass
+    assert chunks_read < 10
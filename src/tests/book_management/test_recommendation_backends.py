@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+from book_management.services.recommendation_backends import RandomProjectionLSH
+
+
+@pytest.mark.parametrize("probe_radius", [0, 1])
+def test_lsh_candidates_are_the_rows_of_every_probed_bucket(probe_radius):
+    matrix = sparse.random(2000, 300, density=0.03, format="csr", random_state=0, dtype=np.float32)
+    added = sparse.random(20, 300, density=0.03, format="csr", random_state=1, dtype=np.float32)
+    backend = RandomProjectionLSH(tables=4, bits=6, probe_radius=probe_radius)
+    backend.build(matrix)
+    backend.add(np.arange(2000, 2020), added)
+
+    # brute force: rows whose code is within `probe_radius` bits of the query's in at least one table
+    vectors = sparse.vstack([matrix, added], format="csr")
+    codes = backend._codes(vectors)
+    queries = [0, 1999, 2005]
+    for query, candidates in zip(queries, backend.candidates(vectors[queries])):
+        distances = np.bitwise_count(codes ^ codes[query])
+        assert candidates.tolist() == np.flatnonzero((distances <= probe_radius).any(axis=1)).tolist()
+
+
+def test_lsh_candidates_of_an_empty_index():
+    queries = sparse.random(2, 300, density=0.03, format="csr", random_state=0, dtype=np.float32)
+    assert [len(candidates) for candidates in RandomProjectionLSH().candidates(queries)] == [0, 0]
@@ -7,9 +7,14 @@ from sqlalchemy.ext.asyncio import create_async_engine
 from testcontainers.postgres import PostgresContainer
 from testcontainers.redis import RedisContainer
 
+from auth.services import principal_cache
 from book_management import Base
-from dependencies import get_current_user, get_unit_of_work
+from book_management.services.cache import book_cache, listing_cache
+from book_management.services.counter import book_counter
+from book_management.services.recommendation import recommendation_service
+from dependencies import get_current_user, get_read_unit_of_work, get_unit_of_work, recent_writes
 from main import application
+from monitoring.database import database_monitor
 from repositories.postgres.container import PostgresUnitOfWork
 
 
@@ -20,10 +25,32 @@ def postgres_container():
         yield postgres
 
 
+@pytest_asyncio.fixture(scope="session")
+def replica_postgres_container():
+    # a separate instance, not a real replica: tests can tell which one served a read by its data
+    replica = PostgresContainer("postgres:15-alpine")
+    with replica:
+        yield replica
+
+
+@pytest_asyncio.fixture(loop_scope="function", scope="function")
+async def replica_engine(replica_postgres_container):
+    db_url = replica_postgres_container.get_connection_url().replace("psycopg2", "asyncpg")
+    engine = create_async_engine(db_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+
 @pytest_asyncio.fixture(loop_scope="function", scope="function")
 async def async_engine(postgres_container):
     db_url = postgres_container.get_connection_url().replace("psycopg2", "asyncpg")
     engine = create_async_engine(db_url)
+    database_monitor.instrument(engine)
     yield engine
     await engine.dispose()
 
@@ -45,6 +72,44 @@ async def uow(async_engine):
     await uow.__aexit__(None, None, None)
 
 
+@pytest_asyncio.fixture(loop_scope="function", scope="function", autouse=True)
+def reset_recommendation_index():
+    # ids are reused once the tables are recreated, so the index must not outlive a test
+    recommendation_service.reset()
+    yield
+    recommendation_service.reset()
+
+
+@pytest_asyncio.fixture(loop_scope="function", scope="function", autouse=True)
+def reset_caches():
+    for cache in (book_cache, listing_cache, principal_cache):
+        cache.reset()
+    yield
+    for cache in (book_cache, listing_cache, principal_cache):
+        cache.reset()
+
+
+@pytest_asyncio.fixture(loop_scope="function", scope="function", autouse=True)
+def reset_database_monitor():
+    database_monitor.reset()
+    yield
+    database_monitor.reset()
+
+
+@pytest_asyncio.fixture(loop_scope="function", scope="function", autouse=True)
+def reset_recent_writes():
+    recent_writes.reset()
+    yield
+    recent_writes.reset()
+
+
+@pytest_asyncio.fixture(loop_scope="function", scope="function", autouse=True)
+def reset_book_counter():
+    book_counter.reset()
+    yield
+    book_counter.reset()
+
+
 @pytest_asyncio.fixture(scope="session")
 def redis_container():
     with RedisContainer(image="redis:alpine") as redis_container:
@@ -77,6 +142,7 @@ def mock_current_user():
 @pytest_asyncio.fixture(loop_scope="function", scope="function")
 def override_dependencies(mock_current_user, uow):
     application.dependency_overrides[get_unit_of_work] = lambda: uow
+    application.dependency_overrides[get_read_unit_of_work] = lambda: uow
     application.dependency_overrides[get_current_user] = lambda: mock_current_user
     application.dependency_overrides[RateLimiter] = lambda: None
     yield
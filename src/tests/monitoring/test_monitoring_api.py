@@ -0,0 +1,48 @@
+import copy
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from monitoring.database import database_monitor
+from tests.base import BaseAPITest
+
+
+@pytest.mark.asyncio
+class TestMonitoringAPI(BaseAPITest):
+    async def test_db_pool_stats(self, client: AsyncClient, override_dependencies):
+        await self._create_book(client, "Pooled Book")
+
+        response = await client.get("/internal/db-pool")
+        assert response.status_code == 200
+        data = response.json()
+        assert {"size", "checked_out", "idle", "overflow"} <= data["pools"][0].keys()
+        assert data["acquire"]["count"] >= 1
+
+    async def test_slow_queries_logged_with_plan(self, client: AsyncClient, override_dependencies, monkeypatch):
+        monkeypatch.setattr(database_monitor, "slow_query_threshold_ms", 0)
+        monkeypatch.setattr(database_monitor, "explain", True)
+        await self._create_book(client, "Slow Book")
+        response = await client.get("/books/?sort_by=title:asc")
+        assert response.status_code == 200
+        assert response.json()[0]["title"] == "Slow Book"
+
+        response = await client.get("/internal/slow-queries")
+        assert response.status_code == 200
+        selects = [query for query in response.json() if "FROM books" in query["statement"]]
+        assert selects
+        assert "Execution Time" in selects[-1]["plan"]
+        assert all(isinstance(type_name, str) for type_name in selects[-1]["parameters"])
+
+    async def test_failed_statements_leave_no_state_on_the_connection(self, async_engine):
+        async with async_engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+            info = copy.deepcopy(connection.info)
+            for _ in range(3):
+                with pytest.raises(DBAPIError):
+                    await connection.execute(text("SELECT * FROM missing_table"))
+                await connection.rollback()
+
+            assert connection.info == info
+            assert (await connection.execute(text("SELECT 1"))).scalar() == 1
@@ -0,0 +1,169 @@
+import asyncio
+import threading
+
+import pytest
+import pytest_asyncio
+from fastapi_limiter.depends import RateLimiter
+from httpx import AsyncClient
+
+import dependencies
+from book_management.services.recommendation import RecommendationService
+from book_management.services.recommendation_backends import ExactBackend
+from config import settings
+from dependencies import get_current_user, get_read_unit_of_work, get_unit_of_work
+from main import application
+from repositories.fake.containers import FakeDatabase, FakeUnitOfWork
+from tests.base import BaseAPITest
+from worker import app as worker_app
+
+
+@pytest_asyncio.fixture(loop_scope="function", scope="function")
+def database():
+    return FakeDatabase()
+
+
+@pytest_asyncio.fixture(loop_scope="function", scope="function")
+def override_memory_dependencies(database, mock_current_user):
+    application.dependency_overrides[get_unit_of_work] = lambda: FakeUnitOfWork(database)
+    application.dependency_overrides[get_read_unit_of_work] = lambda: FakeUnitOfWork(database, read_only=True)
+    application.dependency_overrides[get_current_user] = lambda: mock_current_user
+    application.dependency_overrides[RateLimiter] = lambda: None
+    yield
+    application.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+class TestFakeRepositoryAPI(BaseAPITest):
+    async def test_books_crud(self, client: AsyncClient, override_memory_dependencies):
+        book = await self._create_book(client, "Dune")
+
+        response = await client.get(f"/books/{book['id']}")
+        assert response.json() == book
+
+        response = await client.put(f"/books/{book['id']}", json={**book, "title": "Dune Messiah"})
+        assert response.json()["title"] == "Dune Messiah"
+
+        response = await client.delete(f"/books/{book['id']}")
+        assert response.status_code == 204
+        response = await client.get(f"/books/{book['id']}")
+        assert response.status_code == 404
+
+    async def test_retrieve_books_sorted_filtered_and_paged(self, client: AsyncClient, override_memory_dependencies):
+        for title, genre, year in [("C", "Science", 2001), ("A", "History", 2003), ("B", "Science", 2003)]:
+            await self._create_book(client, title, genre=genre, year=year)
+
+        response = await client.get("/books/?per_page=2&sort_by=published_year:desc&count=exact")
+        data = response.json()
+        assert [item["title"] for item in data["items"]] == ["B", "A"]
+        assert data["total"] == 3
+
+        response = await client.get(f"/books/?per_page=2&sort_by=published_year:desc&cursor={data['next_cursor']}")
+        assert [book["title"] for book in response.json()] == ["C"]
+
+        response = await client.get("/books/?genre=Science&year_from=2002&author=Test%20Author")
+        assert [book["title"] for book in response.json()] == ["B"]
+
+    async def test_search_and_recommend(self, client: AsyncClient, override_memory_dependencies):
+        book = await self._create_book(client, "Python Cookbook")
+        await self._create_book(client, "Learning Python")
+        await self._create_book(client, "Gardening")
+
+        response = await client.get("/books/search?q=python&limit=1")
+        assert [result["title"] for result in response.json()] == ["Python Cookbook"]
+        response = await client.get(f"/books/search?q=python&cursor={response.headers['X-Next-Cursor']}")
+        assert [result["title"] for result in response.json()] == ["Learning Python"]
+
+        response = await client.get(f"/books/recommendations/{book['id']}?limit=1")
+        assert [result["title"] for result in response.json()] == ["Learning Python"]
+
+    async def test_import_job(self, client: AsyncClient, database, override_memory_dependencies, monkeypatch, tmp_path):
+        monkeypatch.setattr(worker_app.conf, "task_always_eager", True)
+        monkeypatch.setattr(dependencies, "memory_database", database)
+        monkeypatch.setattr(settings, "IMPORT_SPOOL_DIR", str(tmp_path))
+        monkeypatch.setattr(settings, "IMPORT_BATCH_SIZE", 1)
+        csv_content = "title,author_name,genre,published_year\nDune,Frank Herbert,Fiction,1965\nOld,A,Fiction,1500"
+        response = await client.post("/books/import-jobs", files={"file": ("books.csv", csv_content, "text/csv")})
+        assert response.status_code == 202
+
+        for _ in range(100):
+            job = (await client.get(response.headers["Location"])).json()
+            if job["status"] == "completed":
+                break
+            await asyncio.sleep(0.01)
+        assert (job["total_items"], job["successful"], job["failed"]) == (2, 1, 1)
+        response = await client.get("/books/")
+        assert [book["title"] for book in response.json()] == ["Dune"]
+
+    async def test_register_and_login(self, client: AsyncClient, database):
+        application.dependency_overrides[get_unit_of_work] = lambda: FakeUnitOfWork(database)
+        application.dependency_overrides[get_read_unit_of_work] = lambda: FakeUnitOfWork(database, read_only=True)
+        application.dependency_overrides[RateLimiter] = lambda: None
+        try:
+            await self._create_user(client)
+            response = await client.post("/auth/token", data={"username": "testuser", "password": "password123"})
+            assert response.status_code == 200
+
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            book_data = {"title": "Dune", "author_name": "Frank Herbert", "genre": "Fiction", "published_year": 1965}
+            response = await client.post("/books/", json=book_data, headers=headers)
+            assert response.status_code == 200
+        finally:
+            application.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_rollback_restores_rows_and_indexes(database):
+    uow = FakeUnitOfWork(database)
+    async with uow:
+        author = await uow.authors.create({"name": "Author"})
+        book = await uow.books.create(
+            {"title": "Kept", "author_id": author.id, "genre": "Fiction", "published_year": 1}
+        )
+
+    with pytest.raises(RuntimeError):
+        async with uow:
+            await uow.authors.update(author.id, {"name": "Renamed"})
+            await uow.books.update(book.id, {"title": "Changed"})
+            await uow.books.create(
+                {"title": "Dropped", "author_id": author.id, "genre": "Fiction", "published_year": 2}
+            )
+            raise RuntimeError()
+
+    async with uow:
+        assert [dict(row) for row in await uow.books.get_all(offset=0, limit=10, sort_field="author")] == [
+            {"id": book.id, "title": "Kept", "author_name": "Author", "genre": "Fiction", "published_year": 1}
+        ]
+        assert await uow.authors.retrieve_by_name("Renamed") is None
+        assert [row["title"] for row in await uow.books.search("kept", limit=10)] == ["Kept"]
+
+    with pytest.raises(PermissionError):
+        async with FakeUnitOfWork(database, read_only=True) as read_uow:
+            await read_uow.books.delete(book.id)
+
+
+@pytest.mark.asyncio
+async def test_recommendation_writes_during_build_are_replayed(database):
+    build_started, finish_build = threading.Event(), threading.Event()
+
+    class SlowBackend(ExactBackend):
+        def build(self, matrix):
+            if matrix is not None:
+                build_started.set()
+                finish_build.wait(timeout=5)
+
+    uow = FakeUnitOfWork(database)
+    async with uow:
+        author = await uow.authors.create({"name": "Author"})
+        for title in ["Python Cookbook", "Gardening"]:
+            await uow.books.create({"title": title, "author_id": author.id, "genre": "Fiction", "published_year": 1})
+
+    service = RecommendationService(backend=SlowBackend())
+    build = asyncio.create_task(service.ensure_built(FakeUnitOfWork(database, read_only=True)))
+    await asyncio.to_thread(build_started.wait, 5)
+    service.upsert({"id": 100, "title": "Learning Python", "genre": "Fiction", "author_name": "Author"})
+    service.remove(2)
+    finish_build.set()
+    await build
+
+    assert 100 in service and 2 not in service
+    assert service.recommend(1, limit=5) == [100]
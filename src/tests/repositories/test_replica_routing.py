@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from fastapi_limiter.depends import RateLimiter
+from httpx import AsyncClient
+
+import dependencies
+from auth.services import create_access_token
+from book_management.models import Genre
+from dependencies import get_current_user
+from main import application
+from repositories.postgres.container import PostgresUnitOfWork
+from repositories.postgres.routing import ReplicaRouter
+from tests.base import BaseAPITest
+
+
+@pytest_asyncio.fixture(loop_scope="function", scope="function")
+def override_current_user(mock_current_user):
+    """Real units of work, so that reads are routed between the primary and the replica"""
+    application.dependency_overrides[get_current_user] = lambda: mock_current_user
+    application.dependency_overrides[RateLimiter] = lambda: None
+    yield
+    application.dependency_overrides.clear()
+
+
+def _engine(checked_out: int):
+    return SimpleNamespace(pool=SimpleNamespace(checkedout=lambda: checked_out))
+
+
+def test_round_robin_rotates_replicas():
+    engines = [_engine(0), _engine(0)]
+    router = ReplicaRouter(engines, strategy="round_robin")
+    assert [router.choose() for _ in range(4)] == [engines[0], engines[1], engines[0], engines[1]]
+
+
+def test_least_busy_prefers_fewest_checked_out_connections():
+    engines = [_engine(3), _engine(1), _engine(1)]
+    router = ReplicaRouter(engines, strategy="least_busy")
+    assert [router.choose() for _ in range(3)] == [engines[1], engines[1], engines[2]]
+
+
+def test_unknown_strategy_rejected():
+    with pytest.raises(ValueError):
+        ReplicaRouter([_engine(0)], strategy="random")
+
+
+@pytest.mark.asyncio
+class TestReplicaRouting(BaseAPITest):
+    async def test_reads_go_to_replica_except_after_own_writes(
+        self, client: AsyncClient, uow, async_engine, replica_engine, override_current_user, monkeypatch
+    ):
+        replica_uow = PostgresUnitOfWork(replica_engine)
+        async with replica_uow:
+            author = await replica_uow.authors.create({"name": "Replica Author"})
+            await replica_uow.books.create(
+                {"title": "Replica Book", "author_id": author.id, "genre": Genre.FICTION, "published_year": 2000}
+            )
+
+        monkeypatch.setattr(dependencies, "engine", async_engine, raising=False)
+        monkeypatch.setattr(dependencies, "replica_router", ReplicaRouter([replica_engine]))
+        writer = {"Authorization": f"Bearer {create_access_token({'sub': 'writer'})}"}
+        reader = {"Authorization": f"Bearer {create_access_token({'sub': 'reader'})}"}
+
+        response = await client.post(
+            "/books/",
+            json={"title": "Primary Book", "author_name": "Author", "genre": "Science", "published_year": 2024},
+            headers=writer,
+        )
+        assert response.status_code == 200
+
+        response = await client.get("/books/", headers=writer)
+        assert [book["title"] for book in response.json()] == ["Primary Book"]
+
+        for headers in (reader, {}):
+            response = await client.get("/books/", headers=headers)
+            assert [book["title"] for book in response.json()] == ["Replica Book"]
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+import redis.asyncio as redis_async
+
+from cache import TwoTierCache
+
+
+@pytest.mark.asyncio
+async def test_invalidation_reaches_other_workers(redis_container):
+    host = redis_container.get_container_host_ip()
+    port = redis_container.get_exposed_port("6379")
+    redis_client = redis_async.Redis.from_url(f"redis://{host}:{port}", decode_responses=True)
+
+    workers = [TwoTierCache("test", local_ttl=60, redis_ttl=60, max_size=10) for _ in range(2)]
+    for worker in workers:
+        worker.connect(redis_client)
+    listeners = [asyncio.create_task(worker.listen()) for worker in workers]
+    await asyncio.sleep(0.1)
+
+    async def load():
+        return {"title": "Old"}
+
+    try:
+        for worker in workers:
+            assert await worker.get_or_load(1, load) == {"title": "Old"}
+        assert workers[1].stats["redis_hits"] == 1
+
+        await workers[0].invalidate(1)
+        for _ in range(50):
+            if not len(workers[1].local):
+                break
+            await asyncio.sleep(0.02)
+        assert not len(workers[1].local)
+        assert await redis_client.get("cache:test:1") is None
+    finally:
+        for listener in listeners:
+            listener.cancel()
+        await asyncio.gather(*listeners, return_exceptions=True)
+        await redis_client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_load_racing_with_invalidation_is_not_stored(redis_container):
+    host = redis_container.get_container_host_ip()
+    port = redis_container.get_exposed_port("6379")
+    redis_client = redis_async.Redis.from_url(f"redis://{host}:{port}", decode_responses=True)
+    await redis_client.delete("cache:race:1", "cache-version:race:1", "cache-version:race")
+
+    workers = [TwoTierCache("race", local_ttl=60, redis_ttl=60, max_size=10) for _ in range(2)]
+    for worker in workers:
+        worker.connect(redis_client)
+    row = {"title": "Old"}
+    read = asyncio.Event()
+    updated = asyncio.Event()
+
+    async def slow_load():
+        value = dict(row)
+        read.set()
+        await updated.wait()
+        return value
+
+    async def load():
+        return dict(row)
+
+    try:
+        # worker 1 reads the row, worker 0 updates it and invalidates, then worker 1 finishes its load
+        loading = asyncio.create_task(workers[1].get_or_load(1, slow_load))
+        await read.wait()
+        row["title"] = "New"
+        await workers[0].invalidate(1)
+        updated.set()
+        assert await loading == {"title": "Old"}
+
+        assert await redis_client.get("cache:race:1") is None
+        assert await workers[0].get_or_load(1, load) == {"title": "New"}
+        assert await redis_client.get("cache:race:1") is not None
+
+        # the same for a load racing with `clear`
+        read.clear()
+        updated.clear()
+        workers[1].local.clear()
+        await redis_client.delete("cache:race:1")
+        loading = asyncio.create_task(workers[1].get_or_load(1, slow_load))
+        await read.wait()
+        row["title"] = "Newer"
+        await workers[0].clear()
+        updated.set()
+        await loading
+        assert await redis_client.get("cache:race:1") is None
+    finally:
+        await redis_client.aclose()
@@ -0,0 +1,19 @@
+from celery import Celery
+
+from config import settings
+
+# run from `src` with `celery -A worker worker`; with `CELERY_TASK_ALWAYS_EAGER` tasks run in the calling process
+app = Celery(
+    "book_management",
+    broker=settings.CELERY_BROKER_URL or settings.REDIS_URL,
+    include=["book_management.tasks"],
+)
+app.conf.update(
+    task_always_eager=settings.CELERY_TASK_ALWAYS_EAGER,
+    # progress is tracked on the import jobs, not in a result backend
+    task_ignore_result=True,
+    # a task is only acknowledged once done, a worker lost midway leaves it to another one. Import jobs and their
+    # chunks are idempotent, see `RunImportJobUseCase`
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+)